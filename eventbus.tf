@@ -123,12 +123,23 @@ module "eventbus_handlers" {
 
   application_name = var.application_name
 
+  allowed_channels    = var.webhook_config.allowed_channels
+  allowed_event_types = var.webhook_config.allowed_event_types
+  batch_ingestion     = var.webhook_config.batch_ingestion
+  denied_channels     = var.webhook_config.denied_channels
+  denied_event_types  = var.webhook_config.denied_event_types
+  idempotency_ttl     = var.webhook_config.idempotency_ttl
+
+  claim_check_bucket = module.s3["data"].bucket_name
+
   eventbus_name = module.eventbus_zendesk.bus.name
 
   kms_key_arn = aws_kms_key.this.arn
 
   lambda_powertools_arn = local.lambda_powertools_arn
 
+  log_event_sample_rate = var.log_event_sample_rate
+
   python_version = local.python_version
 
   role_namespace            = var.role_namespace
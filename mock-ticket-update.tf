@@ -7,6 +7,8 @@ module "mock_router" {
 
   lambda_powertools_arn = local.lambda_powertools_arn
 
+  log_event_sample_rate = var.log_event_sample_rate
+
   python_version = local.python_version
 
   role_namespace            = var.role_namespace
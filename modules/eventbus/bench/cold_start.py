@@ -0,0 +1,143 @@
+"""
+Benchmark the cold start of the webhook handler.
+
+Each sample runs in a fresh interpreter so nothing is cached between runs. Run it
+from the module directory with `uv run python bench/cold_start.py`.
+"""
+
+__author__ = "Dave Hall <me@davehall.com.au>"
+__copyright__ = "Copyright 2026, Skwashd Services Pty Ltd https://gata.works"
+__license__ = "MIT"
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+MODULE_DIR = Path(__file__).resolve().parent.parent
+
+# Runs inside the child interpreter. Mirrors the Lambda init phase: import the
+# handler, then prime it.
+SAMPLE = """
+import json, time
+start = time.perf_counter()
+import handler.handler as h
+imported = time.perf_counter()
+h.eventbridge_client()
+h.ZendeskWebhook.validate_json(h.PRIMING_PAYLOAD)
+primed = time.perf_counter()
+print(json.dumps({"import_ms": (imported - start) * 1000, "init_ms": (primed - start) * 1000}))
+"""
+
+
+def percentile(samples: list[float], pct: int) -> float:
+    """
+    Calculate a percentile using the nearest rank method.
+
+    Args:
+    ----
+        samples: The measurements.
+        pct: The percentile to calculate.
+
+    Returns:
+    -------
+        The value at the percentile.
+
+    """
+    ordered = sorted(samples)
+    rank = max(0, round(pct / 100 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+def run_sample() -> dict[str, float]:
+    """
+    Measure a single cold start.
+
+    Returns
+    -------
+        The import and init durations in milliseconds.
+
+    """
+    env = {
+        **os.environ,
+        "AWS_DEFAULT_REGION": os.environ.get("AWS_REGION", "us-east-1"),
+    }
+    result = subprocess.run(  # noqa: S603 Trusted input
+        [sys.executable, "-c", SAMPLE],
+        capture_output=True,
+        check=True,
+        cwd=MODULE_DIR,
+        env=env,
+        text=True,
+    )
+    return json.loads(result.stdout)
+
+
+def slowest_imports(count: int) -> list[tuple[int, str]]:
+    """
+    Find the modules that take the longest to import.
+
+    Args:
+    ----
+        count: The number of modules to return.
+
+    Returns:
+    -------
+        The cumulative import time in microseconds and name of each module.
+
+    """
+    result = subprocess.run(  # noqa: S603 Trusted input
+        [sys.executable, "-X", "importtime", "-c", "import handler.handler"],
+        capture_output=True,
+        check=True,
+        cwd=MODULE_DIR,
+        text=True,
+    )
+    top_level = []
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        cumulative, name = parts[1], parts[2][1:]
+        # Only count modules imported directly by the handler.
+        if name.startswith("  ") and not name.startswith("   "):
+            top_level.append((int(cumulative), name.strip()))
+    return sorted(top_level, reverse=True)[:count]
+
+
+def main() -> None:
+    """Run the benchmark and print a report."""
+    parser = argparse.ArgumentParser(description="Benchmark the handler cold start.")
+    parser.add_argument("--runs", type=int, default=20, help="number of cold starts")
+    parser.add_argument("--json", action="store_true", help="print JSON output")
+    args = parser.parse_args()
+
+    samples = [run_sample() for _ in range(args.runs)]
+    report = {
+        metric: {
+            "p50": percentile([s[metric] for s in samples], 50),
+            "p99": percentile([s[metric] for s in samples], 99),
+            "mean": statistics.fmean(s[metric] for s in samples),
+        }
+        for metric in ("import_ms", "init_ms")
+    }
+
+    if args.json:
+        print(json.dumps(report))
+        return
+
+    print(f"{args.runs} cold starts")
+    for metric, stats in report.items():
+        print(
+            f"{metric:>10}: p50 {stats['p50']:7.1f}  p99 {stats['p99']:7.1f}  mean {stats['mean']:7.1f}"
+        )
+    print("\nSlowest imports (cumulative ms)")
+    for micros, name in slowest_imports(10):
+        print(f"{micros / 1000:8.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Benchmark building the EventBridge Detail for a comment event.
+
+Compares serialising the validated model, which is what the handler does, with
+forwarding the original body after patching in the coerced fields. Run it from
+the module directory with `uv run python bench/detail.py`.
+"""
+
+__author__ = "Dave Hall <me@davehall.com.au>"
+__copyright__ = "Copyright 2026, Skwashd Services Pty Ltd https://gata.works"
+__license__ = "MIT"
+
+import argparse
+import json
+import os
+import sys
+import timeit
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+from handler.handler import PRIMING_PAYLOAD, ZendeskEvent, parse_webhook_data
+
+# Free text fields copied from the original body rather than the model.
+FREE_TEXT = {"detail": {"description"}, "event": {"comment": {"body"}}}
+
+
+def payload(size: int) -> str:
+    """
+    Build a comment event with a comment and description of the given size.
+
+    Args:
+    ----
+        size: The length of the comment body and ticket description.
+
+    Returns:
+    -------
+        The JSON payload.
+
+    """
+    data = json.loads(PRIMING_PAYLOAD)
+    data["type"] = "zen:event-type:ticket.comment_added"
+    data["detail"]["description"] = ("Lorem ipsum dolor sit amet. " * size)[:size]
+    data["event"] = {
+        "comment": {
+            "id": "1001",
+            "body": ("Ça marche pas.\nMerci, Zoë. " * size)[:size],
+            "is_public": True,
+            "author": {"id": "2002", "is_staff": False, "name": "Zoë"},
+        }
+    }
+    # Round trip so the body is already in the form the handler publishes.
+    return parse_webhook_data(json.dumps(data)).model_dump_json()
+
+
+def overlay(raw: dict[str, Any], coerced: dict[str, Any]) -> dict[str, Any]:
+    """
+    Copy the coerced values over the original ones.
+
+    Args:
+    ----
+        raw: The decoded original body.
+        coerced: The values produced by the model.
+
+    Returns:
+    -------
+        The patched body.
+
+    """
+    for key, value in coerced.items():
+        if isinstance(value, dict) and isinstance(raw.get(key), dict):
+            overlay(raw[key], value)
+        else:
+            raw[key] = value
+    return raw
+
+
+def serialise(body: str, event: ZendeskEvent) -> str:
+    """
+    Build the Detail from the model.
+
+    Args:
+    ----
+        body: The original body.
+        event: The validated event.
+
+    Returns:
+    -------
+        The Detail.
+
+    """
+    return event.model_dump_json()
+
+
+def passthrough(body: str, event: ZendeskEvent) -> str:
+    """
+    Build the Detail from the original body with the coerced fields patched in.
+
+    Args:
+    ----
+        body: The original body.
+        event: The validated event.
+
+    Returns:
+    -------
+        The Detail.
+
+    """
+    coerced = event.model_dump(mode="json", exclude=FREE_TEXT)
+    return json.dumps(
+        overlay(json.loads(body), coerced), ensure_ascii=False, separators=(",", ":")
+    )
+
+
+def measure(build: Callable[[str, ZendeskEvent], str], body: str, runs: int) -> float:
+    """
+    Measure how long it takes to build the Detail.
+
+    Args:
+    ----
+        build: The function that builds the Detail.
+        body: The original body.
+        runs: The number of times to build the Detail per repeat.
+
+    Returns:
+    -------
+        Microseconds per Detail, using the fastest of 5 repeats.
+
+    """
+    event = parse_webhook_data(body)
+    best = min(timeit.repeat(lambda: build(body, event), number=runs, repeat=5))
+    return best / runs * 1_000_000
+
+
+def main() -> None:
+    """Run the benchmark and print a report."""
+    parser = argparse.ArgumentParser(description="Benchmark building the Detail.")
+    parser.add_argument("--runs", type=int, default=1000, help="builds per repeat")
+    parser.add_argument("--json", action="store_true", help="print JSON output")
+    args = parser.parse_args()
+
+    report = {}
+    for size in (1_000, 10_000, 100_000):
+        body = payload(size)
+        event = parse_webhook_data(body)
+        if serialise(body, event) != passthrough(body, event):
+            print(f"Detail differs for a {size} character body", file=sys.stderr)
+            raise SystemExit(1)
+        report[size] = {
+            "serialise_us": measure(serialise, body, args.runs),
+            "passthrough_us": measure(passthrough, body, args.runs),
+        }
+
+    if args.json:
+        print(json.dumps(report))
+        return
+
+    print(f"{'body chars':>10}  {'serialise us':>12}  {'passthrough us':>14}")
+    for size, stats in report.items():
+        print(
+            f"{size:>10}  {stats['serialise_us']:12.1f}  {stats['passthrough_us']:14.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
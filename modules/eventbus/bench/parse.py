@@ -0,0 +1,156 @@
+"""
+Benchmark webhook payload validation.
+
+Compares decoding the payload with `json.loads` and validating it against the
+untagged event union with the tagged union used by the handler. Run it from the
+module directory with `uv run python bench/parse.py`.
+"""
+
+__author__ = "Dave Hall <me@davehall.com.au>"
+__copyright__ = "Copyright 2026, Skwashd Services Pty Ltd https://gata.works"
+__license__ = "MIT"
+
+import argparse
+import json
+import os
+import sys
+import timeit
+from collections.abc import Callable
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+from handler.handler import PRIMING_PAYLOAD, ZendeskEvent, ZendeskWebhook
+
+# Event data for the event types seen most often in production.
+EVENTS = {
+    "ticket.created": {},
+    "ticket.comment_added": {
+        "comment": {
+            "id": "1001",
+            "body": "Hi, I can't log in to my account since this morning.",
+            "is_public": True,
+            "author": {"id": "2002", "is_staff": False, "name": "Jane Citizen"},
+        }
+    },
+    "ticket.status_changed": {"current": "open", "previous": "new"},
+    "ticket.priority_changed": {"current": "high", "previous": "normal"},
+    "ticket.group_assignment_changed": {"current": "3003", "previous": ""},
+    "ticket.agent_assignment_changed": {"current": "4004", "previous": ""},
+    "ticket.tags_changed": {"tags_added": ["login", "vip"], "tags_removed": []},
+    "ticket.custom_field_changed": {
+        "current": {"value": "billing"},
+        "previous": {"value": None},
+        "custom_field": {"id": "5005", "title": "Category", "type": "tagger"},
+    },
+    "ticket.followers_changed": {"users_added": ["6006"], "users_removed": []},
+    "ticket.merged": {"target_ticket_id": "7007"},
+}
+
+
+def corpus() -> list[str]:
+    """
+    Build a payload for each event type.
+
+    Returns
+    -------
+        The JSON payloads.
+
+    """
+    base = json.loads(PRIMING_PAYLOAD)
+    return [
+        json.dumps({**base, "type": f"zen:event-type:{event_type}", "event": event})
+        for event_type, event in EVENTS.items()
+    ]
+
+
+def untagged(payload: str) -> ZendeskEvent:
+    """
+    Validate a payload the way the handler used to.
+
+    Args:
+    ----
+        payload: The JSON payload.
+
+    Returns:
+    -------
+        The validated event.
+
+    """
+    return ZendeskEvent(**json.loads(payload))
+
+
+def tagged(payload: str) -> ZendeskEvent:
+    """
+    Validate a payload using the tagged union.
+
+    Args:
+    ----
+        payload: The JSON payload.
+
+    Returns:
+    -------
+        The validated event.
+
+    """
+    return ZendeskWebhook.validate_json(payload)
+
+
+def measure(
+    parse: Callable[[str], ZendeskEvent], payloads: list[str], runs: int
+) -> float:
+    """
+    Measure validation throughput.
+
+    Args:
+    ----
+        parse: The function used to validate a payload.
+        payloads: The payloads to validate.
+        runs: The number of passes over the payloads.
+
+    Returns:
+    -------
+        The number of payloads validated per second, using the fastest of 5 repeats.
+
+    """
+    best = min(
+        timeit.repeat(
+            lambda: [parse(payload) for payload in payloads], number=runs, repeat=5
+        )
+    )
+    return len(payloads) * runs / best
+
+
+def main() -> None:
+    """Run the benchmark and print a report."""
+    parser = argparse.ArgumentParser(description="Benchmark payload validation.")
+    parser.add_argument("--runs", type=int, default=2000, help="passes over the corpus")
+    parser.add_argument("--json", action="store_true", help="print JSON output")
+    args = parser.parse_args()
+
+    payloads = corpus()
+    for payload in payloads:
+        # Both approaches must produce the same event detail.
+        if untagged(payload).model_dump_json() != tagged(payload).model_dump_json():
+            print(f"Validation results differ for {payload}", file=sys.stderr)
+            raise SystemExit(1)
+
+    report = {
+        "untagged_per_sec": measure(untagged, payloads, args.runs),
+        "tagged_per_sec": measure(tagged, payloads, args.runs),
+    }
+    report["speedup"] = report["tagged_per_sec"] / report["untagged_per_sec"]
+
+    if args.json:
+        print(json.dumps(report))
+        return
+
+    print(f"{len(payloads)} event types, {args.runs} passes")
+    print(f"  untagged: {report['untagged_per_sec']:10.0f} payloads/s")
+    print(f"    tagged: {report['tagged_per_sec']:10.0f} payloads/s")
+    print(f"   speedup: {report['speedup']:10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+# Copyright 2026 Dave Hall, Skwashd Services https://gata.works, MIT License
+
+# trivy:ignore:AVD-AWS-0024 Records are only kept until Zendesk stops redelivering, so backups aren't needed
+resource "aws_dynamodb_table" "idempotency" {
+  name = "${local.function_name}-idempotency"
+
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "id"
+
+  attribute {
+    name = "id"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+
+  server_side_encryption {
+    enabled     = true
+    kms_key_arn = var.kms_key_arn
+  }
+
+  tags = var.tags
+}
@@ -6,24 +6,52 @@ __license__ = "MIT"
 
 import base64
 import datetime
+import itertools
 import json
 import os
-from collections.abc import Sequence
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Generator, Sequence
+from contextlib import contextmanager
 from enum import StrEnum, auto
-from typing import Annotated, Any, Literal, NotRequired, TypedDict
+from functools import cache
+from typing import (
+    TYPE_CHECKING,
+    Annotated,
+    Any,
+    Literal,
+    NotRequired,
+    Protocol,
+    TypedDict,
+)
 
 import boto3
-from aws_lambda_powertools import Logger
-from aws_lambda_powertools.utilities import parameters
-from aws_lambda_powertools.utilities.parameters.exceptions import GetParameterError
+from aws_lambda_powertools import Logger, Metrics
+from aws_lambda_powertools.metrics import MetricUnit
 from aws_lambda_powertools.utilities.typing import LambdaContext
-from botocore.exceptions import ClientError
-from pydantic import UUID4, BaseModel, BeforeValidator, ValidationError, constr
+from botocore.exceptions import BotoCoreError, ClientError
+from pydantic import (
+    UUID4,
+    BaseModel,
+    BeforeValidator,
+    Field,
+    TypeAdapter,
+    ValidationError,
+    constr,
+)
 
-try:
+if TYPE_CHECKING:
+    from types_boto3_dynamodb.client import DynamoDBClient
+    from types_boto3_events.client import EventBridgeClient
     from types_boto3_events.type_defs import PutEventsRequestEntryTypeDef
-except ImportError:
-    # Avoid needing to build a layer with the stubs
+    from types_boto3_s3.client import S3Client
+    from types_boto3_sqs.client import SQSClient
+else:
+    # Avoid needing to build a layer with the stubs, or paying to look for them on
+    # every cold start.
     class PutEventsRequestEntryTypeDef(TypedDict):  # Fallback for run time.
         """Type definition for PutEventsRequestEntry."""
 
@@ -37,8 +65,84 @@ except ImportError:
 
 
 logger = Logger()
+metrics = Metrics(namespace="Gata", service="zendesk-webhook")
+
+# Used to flag the first invocation of the container in the metrics.
+INVOCATIONS = itertools.count()
 
 SSM_PARAMS: dict[str, Any] = {}
+SSM_PARAMS_FETCHED_AT: dict[str, float] = {}
+SSM_PARAMS_REFRESHING: set[str] = set()
+SSM_PARAMS_LOCK = threading.Lock()
+
+# Cached parameters are refreshed in the background once they are older than the
+# TTL. If the refresh fails, the old value is served until the grace period ends.
+SSM_CACHE_TTL = int(os.environ.get("SSM_CACHE_TTL", "300"))
+SSM_CACHE_GRACE_PERIOD = int(os.environ.get("SSM_CACHE_GRACE_PERIOD", "3600"))
+
+# PutEvents limits, see https://docs.aws.amazon.com/eventbridge/latest/APIReference/API_PutEvents.html
+MAX_PUT_EVENTS_ENTRIES = 10
+MAX_PUT_EVENTS_BYTES = 256 * 1024
+
+# Entries rejected with these error codes are worth sending again.
+RETRYABLE_ERROR_CODES = frozenset({"InternalFailure", "ThrottlingException"})
+PUT_EVENTS_MAX_ATTEMPTS = int(os.environ.get("PUT_EVENTS_MAX_ATTEMPTS", "5"))
+PUT_EVENTS_RETRY_BASE_DELAY_MS = 50
+PUT_EVENTS_RETRY_MAX_DELAY_MS = 1000
+# Time kept in reserve so we can still respond once we give up on retrying.
+PUT_EVENTS_RETRY_RESERVE_MS = 500
+
+# Events larger than this have their free text moved to S3. EventBridge accepts
+# up to 256KB, which leaves room for the pointer and previews.
+CLAIM_CHECK_THRESHOLD = int(os.environ.get("CLAIM_CHECK_THRESHOLD", str(200 * 1024)))
+CLAIM_CHECK_PREVIEW_LENGTH = 1000
+CLAIM_CHECK_PREFIX = "claim-check/"
+# The ingestion queue accepts messages up to 1MB, including the trace header
+# attribute. Larger payloads are queued as a pointer to a copy in S3.
+QUEUE_CLAIM_CHECK_THRESHOLD = 1000 * 1024
+QUEUE_CLAIM_CHECK_PREFIX = f"{CLAIM_CHECK_PREFIX}queue/"
+
+# Zendesk redelivers webhooks that time out, so remember the events we've seen.
+# Events are only remembered for the length of an invocation until they have been
+# published, so an event isn't lost if the function fails or times out first.
+IDEMPOTENCY_TTL = int(os.environ.get("IDEMPOTENCY_TTL", "3600"))
+IDEMPOTENCY_IN_PROGRESS_TTL = int(os.environ.get("IDEMPOTENCY_IN_PROGRESS_TTL", "30"))
+IDEMPOTENCY_CACHE_SIZE = 1024
+SEEN_EVENTS: OrderedDict[str, float] = OrderedDict()
+
+# Logging every webhook costs more than processing it, so the full event is only
+# logged for a sample of invocations and when processing fails.
+LOG_EVENT_SAMPLE_RATE = float(os.environ.get("LOG_EVENT_SAMPLE_RATE", "0.01"))
+LOG_FIELD_LENGTH = int(os.environ.get("LOG_FIELD_LENGTH", "1000"))
+
+
+def _env_list(name: str) -> frozenset[str]:
+    """
+    Read a comma separated list from an environment variable.
+
+    Args:
+    ----
+    name: The name of the environment variable.
+
+    Returns:
+    -------
+    The values in the list.
+
+    """
+    return frozenset(
+        value.strip() for value in os.environ.get(name, "").split(",") if value.strip()
+    )
+
+
+# Events that aren't used by any workflow can be dropped before they are published.
+ALLOWED_EVENT_TYPES = _env_list("ALLOWED_EVENT_TYPES")
+DENIED_EVENT_TYPES = _env_list("DENIED_EVENT_TYPES")
+ALLOWED_CHANNELS = _env_list("ALLOWED_CHANNELS")
+DENIED_CHANNELS = _env_list("DENIED_CHANNELS")
+
+# Quotes inside JSON strings are escaped, so these only match the real fields.
+EVENT_TYPE_PATTERN = re.compile(r'"type"\s*:\s*"zen:event-type:([^"]+)"')
+CHANNEL_PATTERN = re.compile(r'"channel"\s*:\s*"([^"]+)"')
 
 type Channel = Literal[
     "admin_setting",
@@ -392,6 +496,154 @@ class ZendeskEvent(BaseModel):
     zendesk_event_version: datetime.datetime
 
 
+class ZendeskCommentEvent(ZendeskEvent):
+    """Zendesk event carrying a comment."""
+
+    type: Literal[
+        "zen:event-type:ticket.comment_added",
+        "zen:event-type:ticket.comment_made_private",
+        "zen:event-type:ticket.comment_redacted",
+    ]
+    event: CommentEvent
+
+
+class ZendeskCustomFieldEvent(ZendeskEvent):
+    """Zendesk event for a custom field change."""
+
+    type: Literal["zen:event-type:ticket.custom_field_changed"]
+    event: CustomFieldEvent
+
+
+class ZendeskDiffEvent(ZendeskEvent):
+    """Zendesk event for a change to a single ticket property."""
+
+    type: Literal[
+        "zen:event-type:ticket.agent_assignment_changed",
+        "zen:event-type:ticket.brand_changed",
+        "zen:event-type:ticket.custom_status_changed",
+        "zen:event-type:ticket.description_changed",
+        "zen:event-type:ticket.external_id_changed",
+        "zen:event-type:ticket.form_changed",
+        "zen:event-type:ticket.group_assignment_changed",
+        "zen:event-type:ticket.organization_changed",
+        "zen:event-type:ticket.priority_changed",
+        "zen:event-type:ticket.problem_link_changed",
+        "zen:event-type:ticket.requester_changed",
+        "zen:event-type:ticket.status_changed",
+        "zen:event-type:ticket.subject_changed",
+        "zen:event-type:ticket.submitter_changed",
+        "zen:event-type:ticket.task_due_at_changed",
+        "zen:event-type:ticket.type_changed",
+    ]
+    event: EventDiff
+
+
+class ZendeskUserListEvent(ZendeskEvent):
+    """Zendesk event for follower or email CC changes."""
+
+    type: Literal[
+        "zen:event-type:ticket.email_ccs_changed",
+        "zen:event-type:ticket.followers_changed",
+    ]
+    event: UserListEvent
+
+
+class ZendeskTagsEvent(ZendeskEvent):
+    """Zendesk event for tag changes."""
+
+    type: Literal["zen:event-type:ticket.tags_changed"]
+    event: TagsEvent
+
+
+class ZendeskMergedEvent(ZendeskEvent):
+    """Zendesk event for a ticket merge."""
+
+    type: Literal["zen:event-type:ticket.merged"]
+    event: MergedEvent
+
+
+class ZendeskEmptyEvent(ZendeskEvent):
+    """Zendesk event without any event data."""
+
+    type: Literal[
+        "zen:event-type:ticket.created",
+        "zen:event-type:ticket.marked_as_spam",
+        "zen:event-type:ticket.permanently_deleted",
+        "zen:event-type:ticket.soft_deleted",
+    ]
+    event: EmptyEvent
+
+
+class ZendeskOtherEvent(ZendeskEvent):
+    """
+    Zendesk event where the shape of the event data varies.
+
+    These events are still validated against every event data model.
+    """
+
+    type: Literal[
+        "zen:event-type:ticket.attachment_linked_to_comment",
+        "zen:event-type:ticket.attachment_redacted_from_comment",
+        "zen:event-type:ticket.ola_policy_changed",
+        "zen:event-type:ticket.schedule_changed",
+        "zen:event-type:ticket.sla_policy_changed",
+    ]
+
+
+# Tagged union keyed on the event type, so pydantic goes straight to the matching
+# event data model instead of trying each one in turn.
+ZendeskWebhook = TypeAdapter(
+    Annotated[
+        ZendeskCommentEvent
+        | ZendeskCustomFieldEvent
+        | ZendeskDiffEvent
+        | ZendeskUserListEvent
+        | ZendeskTagsEvent
+        | ZendeskMergedEvent
+        | ZendeskEmptyEvent
+        | ZendeskOtherEvent,
+        Field(discriminator="type"),
+    ]
+)
+
+
+# Representative payload used to warm up the validator.
+PRIMING_PAYLOAD = json.dumps(
+    {
+        "account_id": 1,
+        "detail": {
+            "actor_id": "1",
+            "assignee_id": "",
+            "brand_id": "1",
+            "created_at": "2025-01-01T00:00:00Z",
+            "custom_status": "1",
+            "description": "Priming",
+            "external_id": None,
+            "form_id": "1",
+            "group_id": "",
+            "id": "1",
+            "is_public": True,
+            "organization_id": "",
+            "priority": "normal",
+            "requester_id": 1,
+            "status": "new",
+            "subject": "Priming",
+            "submitter_id": "1",
+            "tags": "priming",
+            "type": None,
+            "updated_at": "2025-01-01T00:00:00Z",
+            "via": {"channel": "web_form"},
+        },
+        "event": {},
+        "id": "00000000-0000-4000-8000-000000000000",
+        "subject": "zen:ticket:1",
+        "time": "2025-01-01T00:00:00Z",
+        "type": "zen:event-type:ticket.created",
+        "zendesk_event_version": "2022-11-17",
+    }
+)
+
+
 class ProcessingError(Exception):
     """Exception raised for processing errors."""
 
@@ -417,9 +669,161 @@ class Credentials(TypedDict):
     password: str
 
 
-def get_ssm_parameter(parameter_name: str) -> dict[str, str]:
+@contextmanager
+def timed(stage: str) -> Generator[None]:
+    """
+    Record how long a stage of processing takes as a metric.
+
+    The duration is published as <stage>Duration in milliseconds, even if the
+    stage fails.
+
+    Args:
+    ----
+    stage: The name of the stage.
+
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add_metric(
+            name=f"{stage}Duration",
+            unit=MetricUnit.Milliseconds,
+            value=(time.perf_counter() - start) * 1000,
+        )
+
+
+def record_invocation() -> None:
+    """Add the metadata shared by every invocation to the metrics."""
+    metrics.add_metadata(key="ColdStart", value=next(INVOCATIONS) == 0)
+
+
+def truncate_for_log(value: object) -> object:
+    """
+    Shorten the long strings in a value before it is logged.
+
+    Args:
+    ----
+    value: The value to shorten. Dicts and lists are shortened recursively.
+
+    Returns:
+    -------
+    The shortened value.
+
+    """
+    if isinstance(value, str) and len(value) > LOG_FIELD_LENGTH:
+        return f"{value[:LOG_FIELD_LENGTH]}... ({len(value)} characters)"
+    if isinstance(value, dict):
+        return {key: truncate_for_log(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [truncate_for_log(item) for item in value]
+    return value
+
+
+def event_for_log(event: dict[str, Any]) -> object:
+    """
+    Prepare an event so it can be logged in full.
+
+    The Authorization header is removed and long fields are shortened.
+
+    Args:
+    ----
+    event: The event data.
+
+    Returns:
+    -------
+    The event to log.
+
+    """
+    if event.get("headers"):
+        headers = {
+            key: value
+            for key, value in event["headers"].items()
+            if key.lower() != "authorization"
+        }
+        event = {**event, "headers": headers}
+    return truncate_for_log(event)
+
+
+def log_event(event: dict[str, Any], summary: dict[str, Any]) -> None:
+    """
+    Log the event in full for a sample of invocations, otherwise log a summary.
+
+    Args:
+    ----
+    event: The event data.
+    summary: The fields to log when the event isn't sampled.
+
+    """
+    if random.random() < LOG_EVENT_SAMPLE_RATE:  # noqa: S311 Not a cryptographic function
+        logger.info("Event received", extra={"event": event_for_log(event)})
+    else:
+        logger.info("Event received", extra=summary)
+
+
+@cache
+def eventbridge_client() -> "EventBridgeClient":
+    """
+    Get the EventBridge client.
+
+    The client is created on first use and reused for the life of the container.
+
+    Returns
+    -------
+    The EventBridge client.
+
+    """
+    return boto3.client("events")
+
+
+@cache
+def sqs_client() -> "SQSClient":
+    """
+    Get the SQS client.
+
+    The client is created on first use and reused for the life of the container.
+
+    Returns
+    -------
+    The SQS client.
+
+    """
+    return boto3.client("sqs")
+
+
+@cache
+def s3_client() -> "S3Client":
+    """
+    Get the S3 client.
+
+    The client is created on first use and reused for the life of the container.
+
+    Returns
+    -------
+    The S3 client.
+
+    """
+    return boto3.client("s3")
+
+
+@cache
+def dynamodb_client() -> "DynamoDBClient":
     """
-    Fetch a parameter from AWS Systems Manager Parameter Store.
+    Get the DynamoDB client.
+
+    The client is created on first use and reused for the life of the container.
+
+    Returns
+    -------
+    The DynamoDB client.
+
+    """
+    return boto3.client("dynamodb")
+
+
+def fetch_ssm_parameter(parameter_name: str) -> dict[str, str]:
+    """
+    Fetch a parameter from AWS Systems Manager Parameter Store and cache it.
 
     Args:
     ----
@@ -434,20 +838,111 @@ def get_ssm_parameter(parameter_name: str) -> dict[str, str]:
     ProcessingError: If there's an error retrieving the parameter.
 
     """
-    global SSM_PARAMS  # noqa: PLW0602 We update a key, so ruff is confused
-    if SSM_PARAMS.get(parameter_name) is not None:
-        return SSM_PARAMS[parameter_name]
+    # Only needed when the cache is cold, so keep it off the import path.
+    from aws_lambda_powertools.utilities import parameters
+    from aws_lambda_powertools.utilities.parameters.exceptions import (
+        GetParameterError,
+        TransformParameterError,
+    )
 
     try:
-        SSM_PARAMS[parameter_name] = parameters.get_parameter(
-            parameter_name, transform="json", decrypt=True
+        value = parameters.get_parameter(
+            parameter_name, transform="json", decrypt=True, force_fetch=True
         )
-
-    except GetParameterError as e:
+    except (GetParameterError, TransformParameterError) as e:
         logger.exception("Error retrieving parameter")
         raise ProcessingError("Error retrieving parameter", 500) from e  # noqa: TRY003 ProcessingError is a generic exception that needs a message
 
-    return SSM_PARAMS[parameter_name]
+    with SSM_PARAMS_LOCK:
+        SSM_PARAMS[parameter_name] = value
+        SSM_PARAMS_FETCHED_AT[parameter_name] = time.monotonic()
+
+    return value
+
+
+def _refresh_ssm_parameter(parameter_name: str) -> None:
+    """
+    Refresh a cached parameter, keeping the old value if the refresh fails.
+
+    Args:
+    ----
+    parameter_name: The name of the parameter to refresh.
+
+    """
+    try:
+        fetch_ssm_parameter(parameter_name)
+    except ProcessingError:
+        logger.warning(
+            "Unable to refresh parameter, serving cached value",
+            extra={"parameter_name": parameter_name},
+        )
+    finally:
+        with SSM_PARAMS_LOCK:
+            SSM_PARAMS_REFRESHING.discard(parameter_name)
+
+
+def refresh_ssm_parameter_async(parameter_name: str) -> threading.Thread | None:
+    """
+    Refresh a cached parameter in a background thread.
+
+    Args:
+    ----
+    parameter_name: The name of the parameter to refresh.
+
+    Returns:
+    -------
+    The thread running the refresh, or None if one is already running.
+
+    """
+    with SSM_PARAMS_LOCK:
+        if parameter_name in SSM_PARAMS_REFRESHING:
+            return None
+        SSM_PARAMS_REFRESHING.add(parameter_name)
+
+    thread = threading.Thread(
+        target=_refresh_ssm_parameter, args=(parameter_name,), daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def get_ssm_parameter(parameter_name: str) -> dict[str, str]:
+    """
+    Get a parameter from AWS Systems Manager Parameter Store.
+
+    Values are cached. Once a value is older than SSM_CACHE_TTL seconds, the cached
+    value is served while it is refreshed in the background. If the value can't be
+    refreshed before the grace period ends, it is fetched before returning.
+
+    Args:
+    ----
+    parameter_name: The name of the parameter to retrieve.
+
+    Returns:
+    -------
+    The value of the parameter.
+
+    Raises:
+    ------
+    ProcessingError: If there's an error retrieving the parameter.
+
+    """
+    value = SSM_PARAMS.get(parameter_name)
+    if value is None:
+        return fetch_ssm_parameter(parameter_name)
+
+    age = time.monotonic() - SSM_PARAMS_FETCHED_AT.get(parameter_name, 0)
+    if age < SSM_CACHE_TTL:
+        return value
+
+    if age < SSM_CACHE_TTL + SSM_CACHE_GRACE_PERIOD:
+        refresh_ssm_parameter_async(parameter_name)
+        return value
+
+    logger.warning(
+        "Cached parameter has expired", extra={"parameter_name": parameter_name}
+    )
+    return fetch_ssm_parameter(parameter_name)
 
 
 def verify_basic_auth(header: str, expected_credentials: Credentials) -> bool:
@@ -502,7 +997,8 @@ def validate_auth(headers: dict[str, str]) -> None:
         logger.error("Missing Authorization header")
         raise ProcessingError("Missing Authorization header", 401)  # noqa: TRY003 ProcessingError is a generic exception that needs a message
 
-    param = get_ssm_parameter(os.environ["CREDENTIALS_PARAM_PATH"])
+    with timed("Credentials"):
+        param = get_ssm_parameter(os.environ["CREDENTIALS_PARAM_PATH"])
     creds = Credentials({"username": param["username"], "password": param["password"]})
     if not verify_basic_auth(auth_header, creds):
         logger.error("Invalid credentials")
@@ -527,30 +1023,113 @@ def parse_webhook_data(payload: str) -> ZendeskEvent:
 
     """
     try:
-        data = json.loads(payload)
-        return ZendeskEvent(**data)
-    except json.JSONDecodeError as e:
-        logger.exception("Invalid JSON payload")
-        raise ProcessingError("Invalid JSON payload", 400) from e  # noqa: TRY003 ProcessingError is a generic exception that needs a message
+        return ZendeskWebhook.validate_json(payload)
     except ValidationError as e:
+        if any(error["type"] == "json_invalid" for error in e.errors()):
+            logger.exception("Invalid JSON payload")
+            raise ProcessingError("Invalid JSON payload", 400) from e  # noqa: TRY003 ProcessingError is a generic exception that needs a message
         logger.exception("Invalid webhook data structure")
         raise ProcessingError("Invalid webhook data structure", 400) from e  # noqa: TRY003 ProcessingError is a generic exception that needs a message
 
 
-def prepare_event_data(event_data: ZendeskEvent) -> PutEventsRequestEntryTypeDef:
+def _preview(text: str | None) -> str | None:
+    if text is None or len(text) <= CLAIM_CHECK_PREVIEW_LENGTH:
+        return text
+    return text[:CLAIM_CHECK_PREVIEW_LENGTH]
+
+
+def store_claim_check(bucket: str, key: str, body: str) -> None:
+    """
+    Store a payload that is too large to pass on in S3.
+
+    Args:
+    ----
+    bucket: The claim check bucket.
+    key: The object key.
+    body: The payload as a string.
+
+    Raises:
+    ------
+    ProcessingError: If the payload can't be stored in S3.
+
+    """
+    try:
+        s3_client().put_object(
+            Bucket=bucket,
+            Key=key,
+            Body=body.encode("utf-8"),
+            ContentType="application/json",
+            ServerSideEncryption="aws:kms",
+            SSEKMSKeyId=os.environ["KMS_KEY_ARN"],
+        )
+    except ClientError as e:
+        logger.exception("Error storing event in S3")
+        raise ProcessingError("Error processing event", 500) from e  # noqa: TRY003 ProcessingError is a generic exception that needs a message
+
+
+def claim_check(event_data: ZendeskEvent, detail: str) -> str:
+    """
+    Store the full event in S3 and replace the free text with a preview.
+
+    The ticket description and comment body are truncated, and a claim_check
+    object with the bucket and key of the full event is added.
+
+    Args:
+    ----
+    event_data: The parsed webhook data.
+    detail: The serialised event.
+
+    Returns:
+    -------
+    The serialised event with the free text truncated.
+
+    Raises:
+    ------
+    ProcessingError: If the event can't be stored in S3.
+
+    """
+    bucket = os.environ["CLAIM_CHECK_BUCKET"]
+    key = f"{CLAIM_CHECK_PREFIX}{event_data.id}.json"
+    store_claim_check(bucket, key, detail)
+
+    update: dict[str, Any] = {
+        "detail": event_data.detail.model_copy(
+            update={"description": _preview(event_data.detail.description)}
+        )
+    }
+    if isinstance(event_data.event, CommentEvent):
+        comment = event_data.event.comment
+        update["event"] = CommentEvent(
+            comment=comment.model_copy(update={"body": _preview(comment.body)})
+        )
+
+    metrics.add_metric(name="ClaimCheckedEvents", unit=MetricUnit.Count, value=1)
+    pointer = json.dumps({"bucket": bucket, "key": key}, separators=(",", ":"))
+    # Append the pointer rather than adding it to the webhook model.
+    return f'{event_data.model_copy(update=update).model_dump_json()[:-1]},"claim_check":{pointer}}}'
+
+
+def prepare_event_data(
+    event_data: ZendeskEvent, trace_header: str | None = None
+) -> PutEventsRequestEntryTypeDef:
     """
     Prepare the event data for EventBridge.
 
     Args:
     ----
     event_data: The parsed webhook data.
+    trace_header: The X-Ray trace header, so rules and targets join the trace.
 
     Returns:
     -------
     dict: The prepared event data.
 
+    Raises:
+    ------
+    ProcessingError: If an oversized event can't be stored in S3.
+
     """
-    return PutEventsRequestEntryTypeDef(
+    entry = PutEventsRequestEntryTypeDef(
         {
             "Source": "zendesk.com",
             "Resources": [event_data.subject, event_data.subject.split(":")[1]],
@@ -559,36 +1138,549 @@ def prepare_event_data(event_data: ZendeskEvent) -> PutEventsRequestEntryTypeDef
             "EventBusName": os.environ["EVENT_BUS_NAME"],
         }
     )
+    if trace_header:
+        entry["TraceHeader"] = trace_header
+    if (
+        os.environ.get("CLAIM_CHECK_BUCKET")
+        and entry_size(entry) > CLAIM_CHECK_THRESHOLD
+    ):
+        entry["Detail"] = claim_check(event_data, entry["Detail"])
+    return entry
+
+
+def has_time_for_retry(context: LambdaContext | None, delay_ms: float) -> bool:
+    """
+    Check if there is enough time left in the invocation to retry after a delay.
+
+    Args:
+    ----
+    context: The Lambda context. Without one there is no time budget.
+    delay_ms: How long we plan to wait before retrying.
+
+    Returns:
+    -------
+    True if the retry can be completed before the function times out.
+
+    """
+    if context is None:
+        return True
+    remaining = context.get_remaining_time_in_millis()
+    return remaining - delay_ms > PUT_EVENTS_RETRY_RESERVE_MS
+
+
+def put_events(
+    eventbridge: "EventBridgeClient",
+    entries: Sequence[PutEventsRequestEntryTypeDef],
+    context: LambdaContext | None = None,
+) -> list[int]:
+    """
+    Put entries on the event bus, resending the ones that failed with a transient error.
+
+    EventBridge can accept a request while rejecting some of the entries in it. Only
+    the rejected entries are resent, using capped exponential backoff with full jitter.
+
+    Args:
+    ----
+    eventbridge: The EventBridge client.
+    entries: The prepared event data. Must fit in a single PutEvents request.
+    context: The Lambda context, used to keep retries inside the time budget.
+
+    Returns:
+    -------
+    The indexes of the entries that EventBridge didn't accept.
+
+    Raises:
+    ------
+    ClientError: If the PutEvents request fails.
+    BotoCoreError: If the PutEvents request can't be sent.
+
+    """
+    pending = list(range(len(entries)))
+    failed: list[int] = []
+    retries = 0
+
+    for attempt in range(PUT_EVENTS_MAX_ATTEMPTS):
+        if attempt:
+            cap = min(
+                PUT_EVENTS_RETRY_MAX_DELAY_MS,
+                PUT_EVENTS_RETRY_BASE_DELAY_MS * 2 ** (attempt - 1),
+            )
+            delay = random.uniform(0, cap)  # noqa: S311 Not a cryptographic function
+            if not has_time_for_retry(context, delay):
+                logger.warning("Out of time to retry failed events")
+                break
+            time.sleep(delay / 1000)
+            retries += 1
+
+        response = eventbridge.put_events(Entries=[entries[i] for i in pending])
+        if not response.get("FailedEntryCount"):
+            pending = []
+            break
+
+        retry: list[int] = []
+        for index, result in zip(pending, response["Entries"], strict=True):
+            if "ErrorCode" not in result:
+                continue
+            logger.warning(
+                "EventBridge rejected event",
+                extra={
+                    "attempt": attempt + 1,
+                    "error_code": result["ErrorCode"],
+                    "error_message": result.get("ErrorMessage"),
+                },
+            )
+            if result["ErrorCode"] in RETRYABLE_ERROR_CODES:
+                retry.append(index)
+            else:
+                failed.append(index)
+        pending = retry
+        if not pending:
+            break
+
+    failed.extend(pending)
+    metrics.add_metric(name="PutEventsRetries", unit=MetricUnit.Count, value=retries)
+    metrics.add_metric(
+        name="PutEventsFailedEntries", unit=MetricUnit.Count, value=len(failed)
+    )
+    return sorted(failed)
 
 
-def send_to_eventbridge(event_data: PutEventsRequestEntryTypeDef) -> None:
+def send_to_eventbridge(
+    event_data: PutEventsRequestEntryTypeDef, context: LambdaContext | None = None
+) -> None:
     """
     Send the event data to EventBridge.
 
     Args:
     ----
     event_data: The prepared event data.
+    context: The Lambda context, used to keep retries inside the time budget.
 
     Raises:
     ------
     ProcessingError: If there's an error sending the event to EventBridge.
 
     """
-    eventbridge = boto3.client("events")
+    eventbridge = eventbridge_client()
     try:
-        eventbridge.put_events(Entries=[event_data])
-    except ClientError as e:
+        failed = put_events(eventbridge, [event_data], context)
+    except (BotoCoreError, ClientError) as e:
         logger.exception("Error putting event on EventBridge")
         raise ProcessingError("Error processing event", 500) from e  # noqa: TRY003 ProcessingError is a generic exception that needs a message
 
+    if failed:
+        logger.error("EventBridge did not accept the event")
+        raise ProcessingError("Error processing event", 500)  # noqa: TRY003 ProcessingError is a generic exception that needs a message
+
+
+def entry_size(entry: PutEventsRequestEntryTypeDef) -> int:
+    """
+    Calculate the size of an entry as EventBridge counts it against the request limit.
+
+    Source https://docs.aws.amazon.com/eventbridge/latest/userguide/eb-putevent-size.html
+
+    Args:
+    ----
+    entry: The prepared event data.
+
+    Returns:
+    -------
+    The size of the entry in bytes.
+
+    """
+    size = 14 if "Time" in entry else 0
+    for field in ("Source", "DetailType", "Detail"):
+        size += len(entry.get(field, "").encode("utf-8"))
+    for resource in entry.get("Resources", []):
+        size += len(resource.encode("utf-8"))
+    return size
+
+
+def batch_entries(
+    entries: Sequence[PutEventsRequestEntryTypeDef],
+) -> Generator[list[int]]:
+    """
+    Group entries into batches that fit in a single PutEvents request.
+
+    Args:
+    ----
+    entries: The prepared event data.
+
+    Yields:
+    ------
+    The indexes of the entries in each batch.
+
+    """
+    batch: list[int] = []
+    batch_size = 0
+    for index, entry in enumerate(entries):
+        size = entry_size(entry)
+        if batch and (
+            len(batch) == MAX_PUT_EVENTS_ENTRIES
+            or batch_size + size > MAX_PUT_EVENTS_BYTES
+        ):
+            yield batch
+            batch = []
+            batch_size = 0
+        batch.append(index)
+        batch_size += size
+
+    if batch:
+        yield batch
+
+
+def put_event_batches(
+    entries: Sequence[PutEventsRequestEntryTypeDef],
+    context: LambdaContext | None = None,
+) -> set[int]:
+    """
+    Send entries to EventBridge using as few PutEvents requests as possible.
+
+    Args:
+    ----
+    entries: The prepared event data.
+    context: The Lambda context, used to keep retries inside the time budget.
+
+    Returns:
+    -------
+    The indexes of the entries that EventBridge didn't accept.
+
+    """
+    eventbridge = eventbridge_client()
+    failed: set[int] = set()
+
+    for batch in batch_entries(entries):
+        if entry_size(entries[batch[0]]) > MAX_PUT_EVENTS_BYTES:
+            logger.error("Event too large for EventBridge", extra={"index": batch[0]})
+            failed.update(batch)
+            continue
+
+        try:
+            rejected = put_events(eventbridge, [entries[i] for i in batch], context)
+        except (BotoCoreError, ClientError):
+            logger.exception("Error putting events on EventBridge")
+            failed.update(batch)
+            continue
+
+        failed.update(batch[i] for i in rejected)
+
+    return failed
+
+
+def send_to_queue(payload: str, event_id: str) -> None:
+    """
+    Send the raw webhook payload to the ingestion queue.
+
+    Payloads too large for the queue are stored in the claim check bucket, and a
+    claim_check object with the bucket and key is queued in their place.
+
+    Args:
+    ----
+    payload: The raw webhook payload as a string.
+    event_id: The Zendesk event ID.
+
+    Raises:
+    ------
+    ProcessingError: If there's an error sending the payload to SQS, or it is too
+        large for the queue and there is no claim check bucket.
+
+    """
+    if len(payload.encode("utf-8")) > QUEUE_CLAIM_CHECK_THRESHOLD:
+        bucket = os.environ.get("CLAIM_CHECK_BUCKET")
+        if not bucket:
+            logger.error("Payload too large for the ingestion queue")
+            raise ProcessingError("Payload too large", 413)  # noqa: TRY003 ProcessingError is a generic exception that needs a message
+        key = f"{QUEUE_CLAIM_CHECK_PREFIX}{event_id}.json"
+        store_claim_check(bucket, key, payload)
+        metrics.add_metric(name="ClaimCheckedPayloads", unit=MetricUnit.Count, value=1)
+        pointer = {"bucket": bucket, "key": key}
+        payload = json.dumps({"claim_check": pointer}, separators=(",", ":"))
+
+    attributes: dict[str, Any] = {}
+    if trace_header := os.environ.get("_X_AMZN_TRACE_ID"):
+        attributes["AWSTraceHeader"] = {
+            "DataType": "String",
+            "StringValue": trace_header,
+        }
+    try:
+        sqs_client().send_message(
+            QueueUrl=os.environ["INGEST_QUEUE_URL"],
+            MessageBody=payload,
+            MessageSystemAttributes=attributes,
+        )
+    except ClientError as e:
+        logger.exception("Error sending event to SQS")
+        raise ProcessingError("Error processing event", 500) from e  # noqa: TRY003 ProcessingError is a generic exception that needs a message
+
+
+class IdempotencyStore(Protocol):
+    """Record of processed events shared between containers."""
+
+    def claim(self, event_id: str, expires_at: int) -> bool:
+        """
+        Record an event as in progress, unless it has already been recorded.
+
+        Args:
+        ----
+        event_id: The Zendesk event ID.
+        expires_at: When the record expires, as a Unix timestamp.
+
+        Returns:
+        -------
+        True if the event hasn't been seen before.
+
+        """
+        ...
+
+    def complete(self, event_id: str, expires_at: int) -> None:
+        """
+        Record a claimed event as processed.
+
+        Args:
+        ----
+        event_id: The Zendesk event ID.
+        expires_at: When the record expires, as a Unix timestamp.
+
+        """
+        ...
+
+    def release(self, event_id: str) -> None:
+        """
+        Forget an event so it will be processed when it is redelivered.
+
+        Args:
+        ----
+        event_id: The Zendesk event ID.
+
+        """
+        ...
+
+
+class DynamoDBIdempotencyStore:
+    """Idempotency store backed by a DynamoDB table with TTL enabled."""
+
+    def __init__(self, table_name: str, client: "DynamoDBClient") -> None:
+        """
+        Initialise the store.
+
+        Args:
+        ----
+        table_name: The name of the table. The partition key must be a string named id.
+        client: The DynamoDB client.
+
+        """
+        self.table_name = table_name
+        self.client = client
+
+    def claim(self, event_id: str, expires_at: int) -> bool:
+        """
+        Record an event as in progress, unless it has already been recorded.
+
+        DynamoDB can take a while to delete expired items, so expired records are
+        treated as missing.
+
+        Args:
+        ----
+        event_id: The Zendesk event ID.
+        expires_at: When the record expires, as a Unix timestamp.
+
+        Returns:
+        -------
+        True if the event hasn't been seen before.
+
+        """
+        try:
+            self.client.put_item(
+                TableName=self.table_name,
+                Item={
+                    "id": {"S": event_id},
+                    "status": {"S": "IN_PROGRESS"},
+                    "expires_at": {"N": str(expires_at)},
+                },
+                ConditionExpression="attribute_not_exists(id) OR expires_at < :now",
+                ExpressionAttributeValues={":now": {"N": str(int(time.time()))}},
+            )
+        except self.client.exceptions.ConditionalCheckFailedException:
+            return False
+        return True
+
+    def complete(self, event_id: str, expires_at: int) -> None:
+        """
+        Record a claimed event as processed.
+
+        Args:
+        ----
+        event_id: The Zendesk event ID.
+        expires_at: When the record expires, as a Unix timestamp.
+
+        """
+        self.client.put_item(
+            TableName=self.table_name,
+            Item={
+                "id": {"S": event_id},
+                "status": {"S": "COMPLETED"},
+                "expires_at": {"N": str(expires_at)},
+            },
+        )
+
+    def release(self, event_id: str) -> None:
+        """
+        Forget an event so it will be processed when it is redelivered.
+
+        Args:
+        ----
+        event_id: The Zendesk event ID.
+
+        """
+        self.client.delete_item(TableName=self.table_name, Key={"id": {"S": event_id}})
+
+
+@cache
+def idempotency_store() -> IdempotencyStore | None:
+    """
+    Get the shared idempotency store.
+
+    Returns
+    -------
+    The store, or None if IDEMPOTENCY_TABLE isn't set.
+
+    """
+    table_name = os.environ.get("IDEMPOTENCY_TABLE")
+    if not table_name:
+        return None
+    return DynamoDBIdempotencyStore(table_name, dynamodb_client())
+
+
+def claim_event(event_id: str) -> bool:
+    """
+    Check an event hasn't been processed and record that it is being processed.
+
+    Events seen by this container are checked in memory first. The claim expires
+    after IDEMPOTENCY_IN_PROGRESS_TTL unless the event is completed, so a redelivery
+    is processed if the invocation dies before publishing the event. If the shared
+    store can't be reached the event is processed, as a duplicate is better than a
+    lost event.
+
+    Args:
+    ----
+    event_id: The Zendesk event ID.
+
+    Returns:
+    -------
+    True if the event should be processed.
+
+    """
+    now = time.time()
+    expires_at = SEEN_EVENTS.get(event_id)
+    if expires_at is not None and expires_at > now:
+        SEEN_EVENTS.move_to_end(event_id)
+        return False
+
+    store = idempotency_store()
+    if store is not None:
+        try:
+            if not store.claim(event_id, int(now) + IDEMPOTENCY_IN_PROGRESS_TTL):
+                SEEN_EVENTS[event_id] = now + IDEMPOTENCY_IN_PROGRESS_TTL
+                SEEN_EVENTS.move_to_end(event_id)
+                return False
+        except (BotoCoreError, ClientError):
+            logger.exception("Error checking idempotency store")
+
+    SEEN_EVENTS[event_id] = now + IDEMPOTENCY_IN_PROGRESS_TTL
+    SEEN_EVENTS.move_to_end(event_id)
+    while len(SEEN_EVENTS) > IDEMPOTENCY_CACHE_SIZE:
+        SEEN_EVENTS.popitem(last=False)
+    return True
+
+
+def complete_event(event_id: str) -> None:
+    """
+    Record that a claimed event has been published, so redeliveries are dropped.
+
+    Args:
+    ----
+    event_id: The Zendesk event ID.
+
+    """
+    now = time.time()
+    SEEN_EVENTS[event_id] = now + IDEMPOTENCY_TTL
+    SEEN_EVENTS.move_to_end(event_id)
+
+    store = idempotency_store()
+    if store is not None:
+        try:
+            store.complete(event_id, int(now) + IDEMPOTENCY_TTL)
+        except (BotoCoreError, ClientError):
+            logger.exception("Error completing event in idempotency store")
+
+
+def release_event(event_id: str) -> None:
+    """
+    Forget an event that couldn't be processed, so a redelivery isn't dropped.
+
+    Args:
+    ----
+    event_id: The Zendesk event ID.
+
+    """
+    SEEN_EVENTS.pop(event_id, None)
+
+    store = idempotency_store()
+    if store is not None:
+        try:
+            store.release(event_id)
+        except (BotoCoreError, ClientError):
+            logger.exception("Error releasing event in idempotency store")
+
+
+def is_filtered(payload: str) -> bool:
+    """
+    Check if an event should be dropped without being published.
+
+    Only the event type and channel are read from the payload, so filtered events
+    don't pay for full validation. Payloads where these can't be found are left
+    for validation to reject.
+
+    Args:
+    ----
+    payload: The raw webhook payload as a string.
 
-def process_zendesk_webhook(event: dict[str, Any]) -> str:
+    Returns:
+    -------
+    True if the event type or channel has been filtered out.
+
+    """
+    if ALLOWED_EVENT_TYPES or DENIED_EVENT_TYPES:
+        match = EVENT_TYPE_PATTERN.search(payload)
+        if match:
+            event_type = match.group(1)
+            if ALLOWED_EVENT_TYPES and event_type not in ALLOWED_EVENT_TYPES:
+                return True
+            if event_type in DENIED_EVENT_TYPES:
+                return True
+
+    if ALLOWED_CHANNELS or DENIED_CHANNELS:
+        match = CHANNEL_PATTERN.search(payload)
+        if match:
+            channel = match.group(1)
+            if ALLOWED_CHANNELS and channel not in ALLOWED_CHANNELS:
+                return True
+            if channel in DENIED_CHANNELS:
+                return True
+
+    return False
+
+
+def process_zendesk_webhook(
+    event: dict[str, Any], context: LambdaContext | None = None
+) -> str:
     """
     Process a Zendesk webhook event.
 
     Args:
     ----
     event: The event data.
+    context: The Lambda context, used to keep retries inside the time budget.
 
     Returns:
     -------
@@ -599,45 +1691,276 @@ def process_zendesk_webhook(event: dict[str, Any]) -> str:
     ProcessingError: If there's an error during processing.
 
     """
-    validate_auth(event.get("headers", {}))
-    webhook_data = parse_webhook_data(event["body"])
-    event_data = prepare_event_data(webhook_data)
-    send_to_eventbridge(event_data)
+    with timed("Auth"):
+        validate_auth(event.get("headers", {}))
+
+    metrics.add_metric(
+        name="PayloadSize",
+        unit=MetricUnit.Bytes,
+        value=len(event["body"].encode("utf-8")),
+    )
+    if is_filtered(event["body"]):
+        metrics.add_metric(name="FilteredEvents", unit=MetricUnit.Count, value=1)
+        logger.debug("Event filtered")
+        return "Event filtered"
+
+    with timed("Parse"):
+        webhook_data = parse_webhook_data(event["body"])
+    metrics.add_dimension(name="EventType", value=webhook_data.type[15:])
+
+    if os.environ.get("INGEST_QUEUE_URL"):
+        # The batch handler puts the event on the bus and drops duplicates.
+        with timed("Enqueue"):
+            send_to_queue(event["body"], str(webhook_data.id))
+    else:
+        event_id = str(webhook_data.id)
+        if not claim_event(event_id):
+            metrics.add_metric(name="DuplicateEvents", unit=MetricUnit.Count, value=1)
+            logger.info("Duplicate event ignored", extra={"event_id": event_id})
+            return "Duplicate event ignored"
+
+        try:
+            with timed("Prepare"):
+                event_data = prepare_event_data(
+                    webhook_data, os.environ.get("_X_AMZN_TRACE_ID")
+                )
+            with timed("Publish"):
+                send_to_eventbridge(event_data, context)
+        except Exception:
+            release_event(event_id)
+            raise
+        complete_event(event_id)
     logger.info(
         "Event processed successfully",
-        extra={"ticket_id": webhook_data.detail.id},
+        extra={
+            "ticket_id": webhook_data.detail.id,
+            "event_type": webhook_data.type[15:],
+        },
     )
     return "Event processed successfully"
 
 
-@logger.inject_lambda_context(log_event=True)
-def handler(event: dict[str, Any], _: LambdaContext) -> dict[str, Any]:
+@metrics.log_metrics
+@logger.inject_lambda_context
+def handler(event: dict[str, Any], context: LambdaContext) -> dict[str, Any]:
     """
     Lambda handler function.
 
     Args:
     ----
     event: The event data.
-    _: The Lambda context (unused).
+    context: The Lambda context.
 
     Returns:
     -------
     A response indicating the result of the processing.
 
     """
+    record_invocation()
+    log_event(event, {"body_length": len(event.get("body") or "")})
     try:
-        result = process_zendesk_webhook(event)
+        result = process_zendesk_webhook(event, context)
         return {"statusCode": 200, "body": json.dumps({"message": result})}
     except ProcessingError as e:
         print(e.message)
-        logger.exception("Error processing webhook %s", e.message)
+        logger.exception(
+            "Error processing webhook %s",
+            e.message,
+            extra={"event": event_for_log(event)},
+        )
         return {
             "statusCode": e.status_code,
             "body": json.dumps({"message": e.message}),
         }
     except Exception:
-        logger.exception("Unexpected error")
+        logger.exception("Unexpected error", extra={"event": event_for_log(event)})
         return {
             "statusCode": 500,
             "body": json.dumps({"message": "An unexpected error occurred"}),
         }
+
+
+def load_queued_payload(body: str) -> str:
+    """
+    Get the webhook payload from the body of an SQS record.
+
+    Args:
+    ----
+    body: The body of the SQS record.
+
+    Returns:
+    -------
+    The raw webhook payload, fetched from S3 if it was too large for the queue.
+
+    Raises:
+    ------
+    ProcessingError: If the payload can't be fetched from S3.
+
+    """
+    if not body.startswith('{"claim_check":'):
+        return body
+
+    pointer = json.loads(body)["claim_check"]
+    try:
+        response = s3_client().get_object(Bucket=pointer["bucket"], Key=pointer["key"])
+        return response["Body"].read().decode("utf-8")
+    except (BotoCoreError, ClientError) as e:
+        logger.exception("Error fetching payload from S3")
+        raise ProcessingError("Error processing event", 500) from e  # noqa: TRY003 ProcessingError is a generic exception that needs a message
+
+
+def prepare_record(
+    record: dict[str, Any],
+) -> tuple[str, PutEventsRequestEntryTypeDef] | None:
+    """
+    Claim the event in an SQS record and prepare it for EventBridge.
+
+    Args:
+    ----
+    record: The SQS record.
+
+    Returns:
+    -------
+    The event ID and prepared event data, or None if the event is a duplicate.
+
+    Raises:
+    ------
+    ProcessingError: If the payload can't be parsed or prepared.
+
+    """
+    with timed("Parse"):
+        webhook_data = parse_webhook_data(load_queued_payload(record["body"]))
+
+    event_id = str(webhook_data.id)
+    if not claim_event(event_id):
+        return None
+
+    try:
+        # Continue the trace of the request that queued the payload.
+        trace_header = record.get("attributes", {}).get("AWSTraceHeader")
+        with timed("Prepare"):
+            return event_id, prepare_event_data(webhook_data, trace_header)
+    except Exception:
+        release_event(event_id)
+        raise
+
+
+@metrics.log_metrics
+@logger.inject_lambda_context
+def batch_handler(event: dict[str, Any], context: LambdaContext) -> dict[str, Any]:
+    """
+    Lambda handler function for batches of webhook payloads received from SQS.
+
+    Args:
+    ----
+    event: The SQS event data.
+    context: The Lambda context.
+
+    Returns:
+    -------
+    The message IDs of the records that need to be retried.
+
+    """
+    failures: list[str] = []
+    entries: list[PutEventsRequestEntryTypeDef] = []
+    message_ids: list[str] = []
+    event_ids: list[str] = []
+    duplicates = 0
+    record_invocation()
+    log_event(
+        event,
+        {
+            "records": len(event["Records"]),
+            "body_length": sum(len(record["body"]) for record in event["Records"]),
+        },
+    )
+
+    try:
+        for record in event["Records"]:
+            metrics.add_metric(
+                name="PayloadSize",
+                unit=MetricUnit.Bytes,
+                value=len(record["body"].encode("utf-8")),
+            )
+            try:
+                prepared = prepare_record(record)
+            except ProcessingError:
+                failures.append(record["messageId"])
+                continue
+
+            if prepared is None:
+                duplicates += 1
+                continue
+
+            event_ids.append(prepared[0])
+            entries.append(prepared[1])
+            message_ids.append(record["messageId"])
+
+        with timed("Publish"):
+            failed = put_event_batches(entries, context)
+    except Exception:
+        # SQS redelivers the whole batch, so none of the claims can be kept.
+        for event_id in event_ids:
+            release_event(event_id)
+        raise
+
+    for i, event_id in enumerate(event_ids):
+        if i in failed:
+            release_event(event_id)
+            failures.append(message_ids[i])
+        else:
+            complete_event(event_id)
+
+    if duplicates:
+        metrics.add_metric(
+            name="DuplicateEvents", unit=MetricUnit.Count, value=duplicates
+        )
+
+    if failures:
+        failed_records = set(failures)
+        logger.warning(
+            "Records will be retried",
+            extra={
+                "records": [
+                    event_for_log(record)
+                    for record in event["Records"]
+                    if record["messageId"] in failed_records
+                ]
+            },
+        )
+
+    logger.info(
+        "Batch processed",
+        extra={
+            "records": len(event["Records"]),
+            "duplicates": duplicates,
+            "failures": len(failures),
+        },
+    )
+    return {"batchItemFailures": [{"itemIdentifier": m} for m in failures]}
+
+
+def prime() -> None:
+    """
+    Warm up the container so the first request doesn't pay for the setup.
+
+    The Lambda init phase runs with a CPU boost, so it is cheaper to create the
+    clients, exercise the validator and fetch the credentials here than in the
+    first invocation.
+    """
+    eventbridge_client()
+    if os.environ.get("INGEST_QUEUE_URL"):
+        sqs_client()
+    idempotency_store()
+
+    ZendeskWebhook.validate_json(PRIMING_PAYLOAD)
+
+    if os.environ.get("CREDENTIALS_PARAM_PATH"):
+        try:
+            get_ssm_parameter(os.environ["CREDENTIALS_PARAM_PATH"])
+        except ProcessingError:
+            logger.warning("Unable to prime credentials, will retry on first request")
+
+
+if os.environ.get("PRIME_ON_INIT", "").lower() == "true":
+    prime()
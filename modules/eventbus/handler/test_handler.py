@@ -4,17 +4,21 @@ __author__ = "Dave Hall <me@davehall.com.au>"
 __copyright__ = "Copyright 2024, 2025, Skwashd Services Pty Ltd https://davehall.com.au"
 __license__ = "MIT"
 
+import io
 import json
 import os
 import typing
 import uuid
 from typing import Any
+from unittest.mock import MagicMock
 
 import boto3
 import moto
 import pytest
 from aws_lambda_powertools.utilities.typing.lambda_context import LambdaContext
+from botocore.exceptions import ClientError, EndpointConnectionError
 from pydantic import ValidationError
+from pytest_mock import MockerFixture
 from types_boto3_events.client import EventBridgeClient
 from types_boto3_ssm.client import SSMClient
 
@@ -34,7 +38,7 @@ EMPTY_CREDS = handler.Credentials({"username": "", "password": ""})
 class MockLambdaContext(LambdaContext):
     """Mock Lambda Context for testing purposes."""
 
-    def __init__(self) -> None:
+    def __init__(self, remaining_time_in_millis: int = 0) -> None:
         """Initialize the mock context."""
         super().__init__()
         self._function_name = "mock_lambda_function"
@@ -43,6 +47,47 @@ class MockLambdaContext(LambdaContext):
             "arn:aws:lambda:us-east-1:123456789012:function:mock_lambda_function"
         )
         self._aws_request_id = uuid.uuid4().hex
+        self._remaining_time_in_millis = remaining_time_in_millis
+
+    def get_remaining_time_in_millis(self) -> int:
+        """Return the configured remaining time."""
+        return self._remaining_time_in_millis
+
+
+@pytest.fixture(autouse=True)
+def _reset_clients() -> None:
+    """Ensure each test creates its own AWS clients and starts with no state."""
+    handler.eventbridge_client.cache_clear()
+    handler.sqs_client.cache_clear()
+    handler.dynamodb_client.cache_clear()
+    handler.s3_client.cache_clear()
+    handler.idempotency_store.cache_clear()
+    handler.SEEN_EVENTS.clear()
+    handler.metrics.clear_metrics()
+
+
+@pytest.fixture
+def emf(capsys: pytest.CaptureFixture[str]) -> typing.Callable[[], list[dict]]:
+    """Capture the Embedded Metric Format blobs written after the fixture is used."""
+    capsys.readouterr()
+
+    def blobs() -> list[dict]:
+        lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+        return [line for line in lines if "_aws" in line]
+
+    return blobs
+
+
+@pytest.fixture
+def logs(monkeypatch: pytest.MonkeyPatch) -> typing.Callable[[], list[dict]]:
+    """Capture the log entries written after the fixture is used."""
+    stream = io.StringIO()
+    monkeypatch.setattr(handler.logger.registered_handler, "stream", stream)
+
+    def entries() -> list[dict]:
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    return entries
 
 
 @pytest.fixture
@@ -88,6 +133,7 @@ def _lambda_environment(ssm: SSMClient) -> None:
     os.environ["CREDENTIALS_PARAM_PATH"] = creds_key
     os.environ["EVENT_BUS_NAME"] = "zendesk-webhook-bus"
     handler.SSM_PARAMS = {}
+    handler.SSM_PARAMS_FETCHED_AT = {}
     ssm.put_parameter(
         Name=creds_key,
         Value=json.dumps({"username": "test_user", "password": "test_password"}),
@@ -554,6 +600,103 @@ def test_parse_webhook_data_validation_error() -> None:
     assert "Invalid webhook data structure" in exc_info.value.message
 
 
+@pytest.mark.parametrize(
+    ("event_type", "event", "expected_model"),
+    [
+        (
+            "ticket.comment_added",
+            {"comment": {"id": "1", "body": "Hello", "is_public": True}},
+            handler.CommentEvent,
+        ),
+        (
+            "ticket.custom_field_changed",
+            {
+                "current": {"value": "b"},
+                "previous": {"value": "a"},
+                "custom_field": {"id": "1", "title": "Field", "type": "text"},
+            },
+            handler.CustomFieldEvent,
+        ),
+        (
+            "ticket.status_changed",
+            {"current": "open", "previous": "new"},
+            handler.EventDiff,
+        ),
+        (
+            "ticket.followers_changed",
+            {"users_added": ["1"], "users_removed": []},
+            handler.UserListEvent,
+        ),
+        (
+            "ticket.tags_changed",
+            {"tags_added": ["a"], "tags_removed": ["b"]},
+            handler.TagsEvent,
+        ),
+        ("ticket.merged", {"target_ticket_id": "42"}, handler.MergedEvent),
+        ("ticket.soft_deleted", {}, handler.EmptyEvent),
+        (
+            "ticket.attachment_linked_to_comment",
+            {"comment": {"id": "1", "is_public": False}},
+            handler.CommentEvent,
+        ),
+    ],
+)
+def test_parse_webhook_data_event_models(
+    base_zendesk_event_data: dict,
+    event_type: str,
+    event: dict[str, Any],
+    expected_model: type,
+) -> None:
+    """Test the event data model is selected using the event type."""
+    base_zendesk_event_data["type"] = f"zen:event-type:{event_type}"
+    base_zendesk_event_data["event"] = event
+
+    parsed = handler.parse_webhook_data(json.dumps(base_zendesk_event_data))
+
+    assert isinstance(parsed, handler.ZendeskEvent)
+    assert type(parsed.event) is expected_model
+
+
+def test_parse_webhook_data_covers_event_types() -> None:
+    """Test every event type maps to exactly one event model."""
+    mapped = [
+        event_type
+        for model in handler.ZendeskEvent.__subclasses__()
+        for event_type in typing.get_args(model.model_fields["type"].annotation)
+    ]
+
+    assert len(mapped) == len(set(mapped))
+    assert set(mapped) == set(typing.get_args(handler.EventType.__value__))
+
+
+def test_parse_webhook_data_event_mismatch(base_zendesk_event_data: dict) -> None:
+    """Test event data that doesn't match the event type is rejected."""
+    base_zendesk_event_data["type"] = "zen:event-type:ticket.tags_changed"
+    base_zendesk_event_data["event"] = {"current": "open", "previous": "new"}
+
+    with pytest.raises(handler.ProcessingError) as exc_info:
+        handler.parse_webhook_data(json.dumps(base_zendesk_event_data))
+
+    assert exc_info.value.status_code == 400
+    assert "Invalid webhook data structure" in exc_info.value.message
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        json.dumps([]),
+        json.dumps({"type": "zen:event-type:ticket.unknown"}),
+    ],
+)
+def test_parse_webhook_data_unknown_type(payload: str) -> None:
+    """Test payloads without a known event type are rejected."""
+    with pytest.raises(handler.ProcessingError) as exc_info:
+        handler.parse_webhook_data(payload)
+
+    assert exc_info.value.status_code == 400
+    assert "Invalid webhook data structure" in exc_info.value.message
+
+
 def test_prepare_event_data(mock_ticket: str) -> None:
     """Test preparing event data for EventBridge."""
     webhook_data = handler.parse_webhook_data(mock_ticket)
@@ -567,6 +710,74 @@ def test_prepare_event_data(mock_ticket: str) -> None:
     assert detail_json["detail"]["id"] == webhook_data.detail.id
 
 
+# Detail published for the mock ticket. Rules and state machines match on these
+# fields, so the serialised form must not change.
+EXPECTED_DETAIL = (
+    '{"account_id":12345,"detail":{"actor_id":123456,"assignee_id":4321,"brand_id":0,'
+    '"created_at":"2022-11-22T22:11:22Z","custom_status":1234,'
+    '"description":"Test ticket description","external_id":null,"form_id":0,'
+    '"group_id":2468,"id":24,"is_public":true,"organization_id":0,'
+    '"priority":"normal","requester_id":1234,"status":"pending",'
+    '"subject":"Test Ticket Subject","submitter_id":0,'
+    '"tags":["connecting_to_platform","sample_ticket"],"type":"incident",'
+    '"updated_at":"2022-11-22T22:11:22Z","via":{"channel":"web_form"}},'
+    '"event":{event},"id":"de305d54-75b4-431b-adb2-eb6b9e546013",'
+    '"subject":"ticket:24:created","time":"2022-11-22T22:11:22Z",'
+    '"type":"zen:event-type:{event_type}",'
+    '"zendesk_event_version":"2022-11-22T22:11:22Z"}'
+)
+
+
+@pytest.mark.parametrize(
+    ("event_type", "event", "expected_event"),
+    [
+        ("ticket.created", {}, "{}"),
+        (
+            "ticket.status_changed",
+            {"current": "SOLVED", "previous": "open"},
+            '{"current":"SOLVED","previous":"open"}',
+        ),
+        (
+            "ticket.group_assignment_changed",
+            {"current": "2468"},
+            '{"current":"2468","previous":null}',
+        ),
+        (
+            "ticket.comment_added",
+            {
+                "comment": {
+                    "id": "99",
+                    "body": "Merci\nü",
+                    "is_public": True,
+                    "author": {"id": "5", "is_staff": True, "name": "Agent"},
+                }
+            },
+            '{"comment":{"id":99,"body":"Merci\\nü","is_public":true,'
+            '"author":{"id":5,"is_staff":true,"name":"Agent"},"attachment":null}}',
+        ),
+    ],
+)
+def test_prepare_event_data_detail(
+    base_zendesk_event_data: dict,
+    event_type: str,
+    event: dict[str, Any],
+    expected_event: str,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test the Detail sent to EventBridge is unchanged, byte for byte."""
+    monkeypatch.setenv("EVENT_BUS_NAME", "test-bus")
+    base_zendesk_event_data["type"] = f"zen:event-type:{event_type}"
+    base_zendesk_event_data["event"] = event
+
+    entry = handler.prepare_event_data(
+        handler.parse_webhook_data(json.dumps(base_zendesk_event_data))
+    )
+
+    assert entry["Detail"] == EXPECTED_DETAIL.replace(
+        "{event}", expected_event
+    ).replace("{event_type}", event_type)
+
+
 def test_ticket_via_valid_channel() -> None:
     """Test TicketVia model with valid channel values."""
     valid_channels = [
@@ -644,3 +855,1133 @@ def test_channel_literal_invalid_value(channel_value: str) -> None:
 
     with pytest.raises(ValidationError):
         ModelWithChannel(channel_field=channel_value)  # type: ignore[arg-type] # Testing invalid values
+
+
+def _sqs_record(body: str, message_id: str) -> dict[str, Any]:
+    """Build a minimal SQS record wrapping a webhook payload."""
+    return {"messageId": message_id, "body": body}
+
+
+def _new_event(payload: str) -> str:
+    """Give a webhook payload a new event ID so it isn't treated as a duplicate."""
+    return json.dumps({**json.loads(payload), "id": str(uuid.uuid4())})
+
+
+def test_entry_size() -> None:
+    """Test the entry size matches the EventBridge calculation."""
+    entry = handler.PutEventsRequestEntryTypeDef(
+        {
+            "Source": "zendesk.com",
+            "Resources": ["ticket:24:created", "24"],
+            "DetailType": "ticket.created",
+            "Detail": '{"a":"ü"}',
+            "EventBusName": "zendesk-webhook-bus",
+        }
+    )
+    assert handler.entry_size(entry) == 11 + 14 + 10 + 17 + 2
+
+
+def test_batch_entries_count_limit(mock_ticket: str) -> None:
+    """Test entries are split into batches of at most 10."""
+    os.environ["EVENT_BUS_NAME"] = "zendesk-webhook-bus"
+    entry = handler.prepare_event_data(handler.parse_webhook_data(mock_ticket))
+    batches = list(handler.batch_entries([entry] * 25))
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    assert [i for batch in batches for i in batch] == list(range(25))
+
+
+def test_batch_entries_size_limit() -> None:
+    """Test entries are split when a batch would exceed the request size limit."""
+    entry = handler.PutEventsRequestEntryTypeDef(
+        {"Source": "zendesk.com", "DetailType": "x", "Detail": "a" * 100_000}
+    )
+    batches = list(handler.batch_entries([entry] * 5))
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+
+
+@pytest.mark.filterwarnings(
+    "ignore::DeprecationWarning"
+)  # "datetime.datetime.utcnow() is deprecated" coming from boto3
+@pytest.mark.usefixtures("_lambda_environment")
+def test_batch_handler(
+    events: EventBridgeClient,
+    lambda_context: handler.LambdaContext,
+    mock_ticket: str,
+) -> None:
+    """Test the batch handler only reports the invalid records as failures."""
+    records = [_sqs_record(_new_event(mock_ticket), f"msg-{i}") for i in range(12)]
+    records.insert(3, _sqs_record("invalid json", "msg-bad"))
+
+    response = handler.batch_handler({"Records": records}, lambda_context)
+
+    assert response == {"batchItemFailures": [{"itemIdentifier": "msg-bad"}]}
+
+
+@pytest.mark.usefixtures("_lambda_environment")
+def test_batch_handler_rejected_entries(
+    lambda_context: handler.LambdaContext,
+    mock_ticket: str,
+    mocker: MockerFixture,
+) -> None:
+    """Test entries rejected by EventBridge are reported as failures."""
+    client = mocker.Mock()
+    client.put_events.return_value = {
+        "FailedEntryCount": 1,
+        "Entries": [
+            {"EventId": "1"},
+            {"ErrorCode": "InternalFailure", "ErrorMessage": "Oops"},
+        ],
+    }
+    mocker.patch.object(handler.boto3, "client", return_value=client)
+
+    records = [
+        _sqs_record(_new_event(mock_ticket), "msg-1"),
+        _sqs_record(_new_event(mock_ticket), "msg-2"),
+    ]
+    response = handler.batch_handler({"Records": records}, lambda_context)
+
+    assert response == {"batchItemFailures": [{"itemIdentifier": "msg-2"}]}
+    client.put_events.assert_called_once()
+
+
+@pytest.mark.usefixtures("_lambda_environment")
+def test_batch_handler_eventbridge_error(
+    lambda_context: handler.LambdaContext,
+    mock_ticket: str,
+    mocker: MockerFixture,
+) -> None:
+    """Test a failed PutEvents request marks every record in the batch as failed."""
+    client = mocker.Mock()
+    client.put_events.side_effect = ClientError(
+        {"Error": {"Code": "ThrottlingException", "Message": "Slow down"}},
+        "PutEvents",
+    )
+    mocker.patch.object(handler.boto3, "client", return_value=client)
+
+    records = [
+        _sqs_record(_new_event(mock_ticket), "msg-1"),
+        _sqs_record(_new_event(mock_ticket), "msg-2"),
+    ]
+    response = handler.batch_handler({"Records": records}, lambda_context)
+
+    assert response == {
+        "batchItemFailures": [
+            {"itemIdentifier": "msg-1"},
+            {"itemIdentifier": "msg-2"},
+        ]
+    }
+
+
+@pytest.mark.usefixtures("_lambda_environment")
+def test_batch_handler_eventbridge_unreachable(
+    lambda_context: handler.LambdaContext,
+    mock_ticket: str,
+    mocker: MockerFixture,
+) -> None:
+    """Test records that couldn't be sent are processed when SQS redelivers them."""
+    client = mocker.Mock()
+    client.put_events.side_effect = [
+        EndpointConnectionError(endpoint_url="https://events"),
+        _put_events_response(None),
+    ]
+    mocker.patch.object(handler.boto3, "client", return_value=client)
+    records = [_sqs_record(mock_ticket, "msg-1")]
+
+    response = handler.batch_handler({"Records": records}, lambda_context)
+    assert response == {"batchItemFailures": [{"itemIdentifier": "msg-1"}]}
+
+    response = handler.batch_handler({"Records": records}, lambda_context)
+    assert response == {"batchItemFailures": []}
+    assert client.put_events.call_count == 2
+
+
+@pytest.mark.usefixtures("_lambda_environment")
+def test_batch_handler_unexpected_error_releases_claims(
+    lambda_context: handler.LambdaContext,
+    mock_ticket: str,
+    mocker: MockerFixture,
+) -> None:
+    """Test an invocation that fails releases its claims so the batch is retried."""
+    mocker.patch.object(handler, "put_event_batches", side_effect=RuntimeError)
+    records = [_sqs_record(mock_ticket, "msg-1")]
+
+    with pytest.raises(RuntimeError):
+        handler.batch_handler({"Records": records}, lambda_context)
+
+    assert handler.claim_event(json.loads(mock_ticket)["id"])
+
+
+@pytest.mark.filterwarnings(
+    "ignore::DeprecationWarning"
+)  # "datetime.datetime.utcnow() is deprecated" coming from boto3
+@pytest.mark.usefixtures("_lambda_environment")
+def test_process_zendesk_webhook_queue(
+    ssm: SSMClient, mock_ticket: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test the webhook payload is sent to SQS when batch ingestion is enabled."""
+    sqs = boto3.client("sqs")
+    queue_url = sqs.create_queue(QueueName="zendesk-ingest")["QueueUrl"]
+    monkeypatch.setenv("INGEST_QUEUE_URL", queue_url)
+
+    event = {"headers": {"authorization": AUTH_HEADER}, "body": mock_ticket}
+    handler.process_zendesk_webhook(event)
+
+    messages = sqs.receive_message(QueueUrl=queue_url)["Messages"]
+    assert [m["Body"] for m in messages] == [mock_ticket]
+
+
+def _put_events_response(*error_codes: str | None) -> dict[str, Any]:
+    """Build a PutEvents response with an entry for each error code."""
+    entries = [
+        {"EventId": uuid.uuid4().hex} if code is None else {"ErrorCode": code}
+        for code in error_codes
+    ]
+    return {
+        "FailedEntryCount": sum(code is not None for code in error_codes),
+        "Entries": entries,
+    }
+
+
+@pytest.fixture
+def entries(mock_ticket: str) -> list[handler.PutEventsRequestEntryTypeDef]:
+    """Return three prepared EventBridge entries."""
+    os.environ["EVENT_BUS_NAME"] = "zendesk-webhook-bus"
+    entry = handler.prepare_event_data(handler.parse_webhook_data(mock_ticket))
+    return [entry, entry.copy(), entry.copy()]
+
+
+@pytest.fixture
+def no_sleep(mocker: MockerFixture) -> MagicMock:
+    """Skip the backoff delays between retries."""
+    return mocker.patch.object(handler.time, "sleep")
+
+
+def test_put_events_retries_failed_entries(
+    entries: list[handler.PutEventsRequestEntryTypeDef],
+    mocker: MockerFixture,
+    no_sleep: MagicMock,
+) -> None:
+    """Test only the throttled entries are resent."""
+    client = mocker.Mock()
+    client.put_events.side_effect = [
+        _put_events_response(None, "ThrottlingException", "InternalFailure"),
+        _put_events_response(None, "ThrottlingException"),
+        _put_events_response(None),
+    ]
+
+    failed = handler.put_events(client, entries, MockLambdaContext(5000))
+
+    assert failed == []
+    assert [len(c.kwargs["Entries"]) for c in client.put_events.call_args_list] == [
+        3,
+        2,
+        1,
+    ]
+    assert no_sleep.call_count == 2
+
+
+def test_put_events_permanent_failure(
+    entries: list[handler.PutEventsRequestEntryTypeDef],
+    mocker: MockerFixture,
+    no_sleep: MagicMock,
+) -> None:
+    """Test entries rejected with a non transient error aren't resent."""
+    client = mocker.Mock()
+    client.put_events.return_value = _put_events_response(None, "MalformedDetail", None)
+
+    failed = handler.put_events(client, entries, MockLambdaContext(5000))
+
+    assert failed == [1]
+    client.put_events.assert_called_once()
+
+
+def test_put_events_gives_up_after_max_attempts(
+    entries: list[handler.PutEventsRequestEntryTypeDef],
+    mocker: MockerFixture,
+    no_sleep: MagicMock,
+) -> None:
+    """Test entries that keep failing are reported once the attempts are used up."""
+    client = mocker.Mock()
+    client.put_events.return_value = _put_events_response("ThrottlingException")
+
+    failed = handler.put_events(client, entries[:1], MockLambdaContext(5000))
+
+    assert failed == [0]
+    assert client.put_events.call_count == handler.PUT_EVENTS_MAX_ATTEMPTS
+
+
+def test_put_events_out_of_time(
+    entries: list[handler.PutEventsRequestEntryTypeDef],
+    mocker: MockerFixture,
+    no_sleep: MagicMock,
+) -> None:
+    """Test retries stop when the invocation is about to time out."""
+    client = mocker.Mock()
+    client.put_events.return_value = _put_events_response(None, "ThrottlingException")
+
+    failed = handler.put_events(client, entries[:2], MockLambdaContext(100))
+
+    assert failed == [1]
+    client.put_events.assert_called_once()
+    no_sleep.assert_not_called()
+
+
+def test_put_events_retry_metrics(
+    entries: list[handler.PutEventsRequestEntryTypeDef],
+    mocker: MockerFixture,
+    no_sleep: MagicMock,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    """Test the number of retries is published as a metric."""
+    client = mocker.Mock()
+    client.put_events.side_effect = [
+        _put_events_response("ThrottlingException"),
+        _put_events_response(None),
+    ]
+    handler.metrics.clear_metrics()
+    capsys.readouterr()
+
+    handler.put_events(client, entries[:1], MockLambdaContext(5000))
+    handler.metrics.flush_metrics()
+
+    emf = json.loads(capsys.readouterr().out)
+    assert emf["PutEventsRetries"] == [1.0]
+    assert emf["PutEventsFailedEntries"] == [0.0]
+
+
+@pytest.mark.usefixtures("_lambda_environment")
+def test_handler_failed_entries(
+    lambda_context: handler.LambdaContext,
+    mock_ticket: str,
+    mocker: MockerFixture,
+) -> None:
+    """Test the handler returns a 500 when the event is never accepted."""
+    client = mocker.Mock()
+    client.put_events.return_value = _put_events_response("ThrottlingException")
+    mocker.patch.object(handler.boto3, "client", return_value=client)
+    mocker.patch.object(
+        handler,
+        "get_ssm_parameter",
+        return_value={"username": "test_user", "password": "test_password"},
+    )
+
+    event = {"headers": {"authorization": AUTH_HEADER}, "body": mock_ticket}
+    response = handler.handler(event, lambda_context)
+
+    assert response["statusCode"] == 500
+    assert json.loads(response["body"])["message"] == "Error processing event"
+
+
+@pytest.mark.usefixtures("_lambda_environment")
+def test_eventbridge_client_reused(
+    mock_ticket: str,
+    mocker: MockerFixture,
+) -> None:
+    """Test the EventBridge client is only created once."""
+    client = mocker.Mock()
+    client.put_events.return_value = _put_events_response(None)
+    boto3_client = mocker.patch.object(handler.boto3, "client", return_value=client)
+
+    entry = handler.prepare_event_data(handler.parse_webhook_data(mock_ticket))
+    handler.send_to_eventbridge(entry)
+    handler.send_to_eventbridge(entry)
+
+    boto3_client.assert_called_once_with("events")
+    assert client.put_events.call_count == 2
+
+
+@pytest.mark.filterwarnings(
+    "ignore::DeprecationWarning"
+)  # "datetime.datetime.utcnow() is deprecated" coming from boto3
+@pytest.mark.usefixtures("_lambda_environment")
+def test_prime() -> None:
+    """Test priming creates the client and caches the credentials."""
+    handler.prime()
+
+    assert handler.eventbridge_client.cache_info().currsize == 1
+    assert handler.sqs_client.cache_info().currsize == 0
+    assert handler.SSM_PARAMS[os.environ["CREDENTIALS_PARAM_PATH"]] == {
+        "username": "test_user",
+        "password": "test_password",
+    }
+
+
+@moto.mock_aws
+@pytest.mark.usefixtures("_aws_credentials")
+def test_prime_missing_credentials(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test priming doesn't fail the init when the credentials can't be fetched."""
+    monkeypatch.setenv("CREDENTIALS_PARAM_PATH", "/non/existent")
+    handler.SSM_PARAMS = {}
+
+    handler.prime()
+
+    assert handler.SSM_PARAMS == {}
+
+
+def _expire_ssm_parameter(key: str, seconds: int) -> None:
+    """Age a cached parameter by the given number of seconds."""
+    handler.SSM_PARAMS_FETCHED_AT[key] -= seconds
+
+
+@pytest.mark.filterwarnings(
+    "ignore::DeprecationWarning"
+)  # "datetime.datetime.utcnow() is deprecated" coming from boto3
+@pytest.mark.usefixtures("_lambda_environment")
+def test_get_ssm_parameter_stale_while_revalidate(
+    ssm: SSMClient, mocker: MockerFixture
+) -> None:
+    """Test a stale parameter is served while it is refreshed in the background."""
+    key = "/zendesk/webhook_credentials"
+    handler.get_ssm_parameter(key)
+    _expire_ssm_parameter(key, handler.SSM_CACHE_TTL + 1)
+    new_creds = {"username": "new_user", "password": "new_password"}
+    ssm.put_parameter(
+        Name=key, Value=json.dumps(new_creds), Type="SecureString", Overwrite=True
+    )
+    refresh = mocker.spy(handler, "refresh_ssm_parameter_async")
+
+    assert handler.get_ssm_parameter(key)["username"] == "test_user"
+
+    refresh.spy_return.join()
+    assert handler.get_ssm_parameter(key) == new_creds
+    refresh.assert_called_once()
+
+
+@pytest.mark.filterwarnings(
+    "ignore::DeprecationWarning"
+)  # "datetime.datetime.utcnow() is deprecated" coming from boto3
+@pytest.mark.usefixtures("_lambda_environment")
+def test_get_ssm_parameter_refresh_failure(
+    ssm: SSMClient, mocker: MockerFixture
+) -> None:
+    """Test the cached value is kept when the background refresh fails."""
+    key = "/zendesk/webhook_credentials"
+    creds = handler.get_ssm_parameter(key)
+    _expire_ssm_parameter(key, handler.SSM_CACHE_TTL + 1)
+    ssm.delete_parameter(Name=key)
+    refresh = mocker.spy(handler, "refresh_ssm_parameter_async")
+
+    assert handler.get_ssm_parameter(key) == creds
+    refresh.spy_return.join()
+
+    assert handler.SSM_PARAMS[key] == creds
+    assert key not in handler.SSM_PARAMS_REFRESHING
+
+
+@pytest.mark.filterwarnings(
+    "ignore::DeprecationWarning"
+)  # "datetime.datetime.utcnow() is deprecated" coming from boto3
+@pytest.mark.usefixtures("_lambda_environment")
+def test_get_ssm_parameter_refresh_in_progress() -> None:
+    """Test only one background refresh runs at a time."""
+    key = "/zendesk/webhook_credentials"
+    handler.SSM_PARAMS_REFRESHING.add(key)
+    try:
+        assert handler.refresh_ssm_parameter_async(key) is None
+    finally:
+        handler.SSM_PARAMS_REFRESHING.discard(key)
+
+
+@pytest.mark.filterwarnings(
+    "ignore::DeprecationWarning"
+)  # "datetime.datetime.utcnow() is deprecated" coming from boto3
+@pytest.mark.usefixtures("_lambda_environment")
+def test_get_ssm_parameter_grace_period_expired(ssm: SSMClient) -> None:
+    """Test an expired parameter is fetched before it is returned."""
+    key = "/zendesk/webhook_credentials"
+    handler.get_ssm_parameter(key)
+    _expire_ssm_parameter(key, handler.SSM_CACHE_TTL + handler.SSM_CACHE_GRACE_PERIOD)
+    ssm.delete_parameter(Name=key)
+
+    with pytest.raises(handler.ProcessingError) as exc_info:
+        handler.get_ssm_parameter(key)
+
+    assert exc_info.value.status_code == 500
+
+
+@pytest.fixture
+def idempotency_table(
+    _aws_credentials: typing.Callable, monkeypatch: pytest.MonkeyPatch
+) -> typing.Generator[str]:
+    """Set up a mock idempotency table."""
+    with moto.mock_aws():
+        boto3.client("dynamodb").create_table(
+            TableName="zendesk-webhook-idempotency",
+            KeySchema=[{"AttributeName": "id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        monkeypatch.setenv("IDEMPOTENCY_TABLE", "zendesk-webhook-idempotency")
+        yield "zendesk-webhook-idempotency"
+
+
+def test_claim_event() -> None:
+    """Test an event can only be claimed once until it is released."""
+    event_id = str(uuid.uuid4())
+
+    assert handler.claim_event(event_id)
+    assert not handler.claim_event(event_id)
+
+    handler.release_event(event_id)
+
+    assert handler.claim_event(event_id)
+
+
+def test_claim_event_expired() -> None:
+    """Test an event can be claimed again once its record expires."""
+    event_id = str(uuid.uuid4())
+    handler.claim_event(event_id)
+    handler.SEEN_EVENTS[event_id] = handler.time.time() - 1
+
+    assert handler.claim_event(event_id)
+
+
+def test_claim_event_cache_size(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test the least recently seen events are evicted from the cache."""
+    monkeypatch.setattr(handler, "IDEMPOTENCY_CACHE_SIZE", 2)
+
+    for event_id in ("a", "b", "c"):
+        handler.claim_event(event_id)
+
+    assert list(handler.SEEN_EVENTS) == ["b", "c"]
+    assert handler.claim_event("a")
+
+
+@pytest.mark.usefixtures("idempotency_table")
+def test_claim_event_shared_store() -> None:
+    """Test an event claimed by another container isn't processed again."""
+    event_id = str(uuid.uuid4())
+    assert handler.claim_event(event_id)
+
+    # Simulate the redelivery reaching a different container.
+    handler.SEEN_EVENTS.clear()
+    assert not handler.claim_event(event_id)
+
+    handler.release_event(event_id)
+    handler.SEEN_EVENTS.clear()
+    assert handler.claim_event(event_id)
+
+
+def test_dynamodb_idempotency_store_expired(idempotency_table: str) -> None:
+    """Test records past their TTL are ignored even if DynamoDB hasn't deleted them."""
+    store = handler.DynamoDBIdempotencyStore(
+        idempotency_table, boto3.client("dynamodb")
+    )
+    expired = int(handler.time.time()) - 1
+
+    assert store.claim("event", expired)
+    assert store.claim("event", expired + handler.IDEMPOTENCY_TTL)
+    assert not store.claim("event", expired + handler.IDEMPOTENCY_TTL)
+
+
+def test_claim_event_store_error(mocker: MockerFixture) -> None:
+    """Test the event is processed when the shared store can't be reached."""
+    store = mocker.Mock()
+    store.claim.side_effect = ClientError(
+        {"Error": {"Code": "ProvisionedThroughputExceededException"}}, "PutItem"
+    )
+    mocker.patch.object(handler, "idempotency_store", return_value=store)
+
+    assert handler.claim_event(str(uuid.uuid4()))
+
+
+def test_claim_event_store_unreachable(mocker: MockerFixture) -> None:
+    """Test the event is processed when the request to the shared store fails."""
+    store = mocker.Mock()
+    store.claim.side_effect = EndpointConnectionError(endpoint_url="https://dynamodb")
+    store.release.side_effect = EndpointConnectionError(endpoint_url="https://dynamodb")
+    mocker.patch.object(handler, "idempotency_store", return_value=store)
+    event_id = str(uuid.uuid4())
+
+    assert handler.claim_event(event_id)
+    handler.release_event(event_id)
+    assert handler.claim_event(event_id)
+
+
+@pytest.mark.usefixtures("idempotency_table")
+def test_claim_event_in_progress(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test a claim lapses after the invocation unless the event is completed."""
+    event_id = str(uuid.uuid4())
+    now = handler.time.time()
+    assert handler.claim_event(event_id)
+
+    # Simulate the redelivery after the claiming invocation timed out.
+    now += handler.IDEMPOTENCY_IN_PROGRESS_TTL + 1
+    monkeypatch.setattr(handler.time, "time", lambda: now)
+    handler.SEEN_EVENTS.clear()
+    assert handler.claim_event(event_id)
+
+    handler.complete_event(event_id)
+    now += handler.IDEMPOTENCY_IN_PROGRESS_TTL + 1
+    handler.SEEN_EVENTS.clear()
+    assert not handler.claim_event(event_id)
+
+
+@pytest.mark.usefixtures("_lambda_environment")
+def test_handler_duplicate_event(
+    lambda_context: handler.LambdaContext,
+    mock_ticket: str,
+    mocker: MockerFixture,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    """Test a redelivered webhook gets a 200 without being put on the bus again."""
+    client = mocker.Mock()
+    client.put_events.return_value = _put_events_response(None)
+    mocker.patch.object(handler.boto3, "client", return_value=client)
+    event = {"headers": {"authorization": AUTH_HEADER}, "body": mock_ticket}
+
+    handler.handler(event, lambda_context)
+    capsys.readouterr()
+    response = handler.handler(event, lambda_context)
+
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"])["message"] == "Duplicate event ignored"
+    client.put_events.assert_called_once()
+    emf = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert any(line.get("DuplicateEvents") == [1.0] for line in emf)
+
+
+@pytest.mark.usefixtures("_lambda_environment")
+def test_handler_failed_event_released(
+    lambda_context: handler.LambdaContext,
+    mock_ticket: str,
+    mocker: MockerFixture,
+) -> None:
+    """Test a webhook that couldn't be put on the bus is processed when redelivered."""
+    client = mocker.Mock()
+    client.put_events.side_effect = [
+        ClientError({"Error": {"Code": "AccessDeniedException"}}, "PutEvents"),
+        _put_events_response(None),
+    ]
+    mocker.patch.object(handler.boto3, "client", return_value=client)
+    event = {"headers": {"authorization": AUTH_HEADER}, "body": mock_ticket}
+
+    assert handler.handler(event, lambda_context)["statusCode"] == 500
+    response = handler.handler(event, lambda_context)
+
+    assert json.loads(response["body"])["message"] == "Event processed successfully"
+    assert client.put_events.call_count == 2
+
+
+@pytest.mark.usefixtures("_lambda_environment")
+def test_handler_unreachable_event_released(
+    lambda_context: handler.LambdaContext,
+    mock_ticket: str,
+    mocker: MockerFixture,
+) -> None:
+    """Test a webhook is processed when redelivered after EventBridge was unreachable."""
+    client = mocker.Mock()
+    client.put_events.side_effect = [
+        EndpointConnectionError(endpoint_url="https://events"),
+        _put_events_response(None),
+    ]
+    mocker.patch.object(handler.boto3, "client", return_value=client)
+    event = {"headers": {"authorization": AUTH_HEADER}, "body": mock_ticket}
+
+    assert handler.handler(event, lambda_context)["statusCode"] == 500
+    response = handler.handler(event, lambda_context)
+
+    assert json.loads(response["body"])["message"] == "Event processed successfully"
+    assert client.put_events.call_count == 2
+
+
+@pytest.mark.usefixtures("_lambda_environment")
+def test_handler_unexpected_error_releases_event(
+    lambda_context: handler.LambdaContext,
+    mock_ticket: str,
+    mocker: MockerFixture,
+) -> None:
+    """Test a webhook is processed when redelivered after an unexpected error."""
+    mocker.patch.object(handler, "send_to_eventbridge", side_effect=RuntimeError)
+    event = {"headers": {"authorization": AUTH_HEADER}, "body": mock_ticket}
+
+    assert handler.handler(event, lambda_context)["statusCode"] == 500
+    assert handler.claim_event(json.loads(mock_ticket)["id"])
+
+
+@pytest.mark.usefixtures("_lambda_environment")
+def test_batch_handler_duplicate_events(
+    lambda_context: handler.LambdaContext,
+    mock_ticket: str,
+    mocker: MockerFixture,
+) -> None:
+    """Test duplicate records are acknowledged without being put on the bus."""
+    client = mocker.Mock()
+    client.put_events.return_value = _put_events_response(None)
+    mocker.patch.object(handler.boto3, "client", return_value=client)
+
+    records = [_sqs_record(mock_ticket, "msg-1"), _sqs_record(mock_ticket, "msg-2")]
+    response = handler.batch_handler({"Records": records}, lambda_context)
+
+    assert response == {"batchItemFailures": []}
+    assert len(client.put_events.call_args.kwargs["Entries"]) == 1
+
+
+@pytest.mark.parametrize(
+    ("setting", "values", "filtered"),
+    [
+        ("ALLOWED_EVENT_TYPES", {"ticket.created"}, False),
+        ("ALLOWED_EVENT_TYPES", {"ticket.status_changed"}, True),
+        ("DENIED_EVENT_TYPES", {"ticket.created"}, True),
+        ("DENIED_EVENT_TYPES", {"ticket.status_changed"}, False),
+        ("ALLOWED_CHANNELS", {"web_form"}, False),
+        ("ALLOWED_CHANNELS", {"mail"}, True),
+        ("DENIED_CHANNELS", {"web_form"}, True),
+        ("DENIED_CHANNELS", {"mail"}, False),
+    ],
+)
+def test_is_filtered(
+    mock_ticket: str,
+    monkeypatch: pytest.MonkeyPatch,
+    setting: str,
+    values: set[str],
+    filtered: bool,
+) -> None:
+    """Test events are filtered on their type and channel."""
+    monkeypatch.setattr(handler, setting, frozenset(values))
+
+    assert handler.is_filtered(mock_ticket) is filtered
+
+
+def test_is_filtered_no_filters(mock_ticket: str) -> None:
+    """Test nothing is filtered by default."""
+    assert not handler.is_filtered(mock_ticket)
+
+
+def test_is_filtered_ignores_comment_body(
+    base_zendesk_event_data: dict, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test text in a comment can't be mistaken for the event type or channel."""
+    monkeypatch.setattr(
+        handler, "ALLOWED_EVENT_TYPES", frozenset({"ticket.comment_added"})
+    )
+    monkeypatch.setattr(handler, "ALLOWED_CHANNELS", frozenset({"mail"}))
+    base_zendesk_event_data["detail"]["via"]["channel"] = "mail"
+    base_zendesk_event_data["type"] = "zen:event-type:ticket.comment_added"
+    base_zendesk_event_data["event"] = {
+        "comment": {
+            "id": "1",
+            "body": '{"channel": "web_form", "type": "zen:event-type:ticket.created"}',
+            "is_public": True,
+        }
+    }
+    # Put the comment first so it is searched before the real fields.
+    payload = json.dumps(
+        {"event": base_zendesk_event_data.pop("event"), **base_zendesk_event_data}
+    )
+
+    assert not handler.is_filtered(payload)
+
+
+@pytest.mark.usefixtures("_lambda_environment")
+def test_handler_filtered_event(
+    lambda_context: handler.LambdaContext,
+    mocker: MockerFixture,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    """Test filtered events get a 200 without being validated or published."""
+    monkeypatch.setattr(handler, "DENIED_EVENT_TYPES", frozenset({"ticket.created"}))
+    client = mocker.Mock()
+    mocker.patch.object(handler.boto3, "client", return_value=client)
+    parse = mocker.spy(handler, "parse_webhook_data")
+    capsys.readouterr()
+
+    event = {
+        "headers": {"authorization": AUTH_HEADER},
+        "body": json.dumps({"type": "zen:event-type:ticket.created"}),
+    }
+    response = handler.handler(event, lambda_context)
+
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"])["message"] == "Event filtered"
+    parse.assert_not_called()
+    client.put_events.assert_not_called()
+    emf = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert any(line.get("FilteredEvents") == [1.0] for line in emf)
+
+
+@pytest.fixture
+def claim_check_bucket(
+    _aws_credentials: typing.Callable, monkeypatch: pytest.MonkeyPatch
+) -> typing.Generator[str]:
+    """Set up a mock bucket for oversized events."""
+    with moto.mock_aws():
+        boto3.client("s3").create_bucket(Bucket="gata-data")
+        key_arn = boto3.client("kms").create_key()["KeyMetadata"]["Arn"]
+        monkeypatch.setenv("CLAIM_CHECK_BUCKET", "gata-data")
+        monkeypatch.setenv("KMS_KEY_ARN", key_arn)
+        monkeypatch.setenv("EVENT_BUS_NAME", "zendesk-webhook-bus")
+        yield "gata-data"
+
+
+@pytest.mark.filterwarnings(
+    "ignore::DeprecationWarning"
+)  # "datetime.datetime.utcnow() is deprecated" coming from boto3
+@pytest.mark.usefixtures("_lambda_environment")
+def test_handler_queue_claim_check(
+    claim_check_bucket: str,
+    lambda_context: handler.LambdaContext,
+    base_zendesk_event_data: dict,
+    monkeypatch: pytest.MonkeyPatch,
+    mocker: MockerFixture,
+) -> None:
+    """Test payloads too large for the queue are passed on through S3."""
+    sqs = boto3.client("sqs")
+    queue_url = sqs.create_queue(
+        QueueName="zendesk-ingest", Attributes={"MaximumMessageSize": "1048576"}
+    )["QueueUrl"]
+    monkeypatch.setenv("INGEST_QUEUE_URL", queue_url)
+    event_data = _comment_event(base_zendesk_event_data, 600 * 1024)
+    body = event_data.model_dump_json()
+    event = {"headers": {"authorization": AUTH_HEADER}, "body": body}
+
+    response = handler.handler(event, lambda_context)
+
+    assert response["statusCode"] == 200
+    (message,) = sqs.receive_message(QueueUrl=queue_url)["Messages"]
+    key = f"claim-check/queue/{event_data.id}.json"
+    assert json.loads(message["Body"]) == {
+        "claim_check": {"bucket": claim_check_bucket, "key": key}
+    }
+    stored = boto3.client("s3").get_object(Bucket=claim_check_bucket, Key=key)
+    assert stored["Body"].read().decode() == body
+
+    put_events = mocker.patch.object(handler, "put_event_batches", return_value=set())
+    records = [_sqs_record(message["Body"], message["MessageId"])]
+    response = handler.batch_handler({"Records": records}, lambda_context)
+
+    assert response == {"batchItemFailures": []}
+    (entry,) = put_events.call_args.args[0]
+    detail = json.loads(entry["Detail"])
+    assert detail["id"] == str(event_data.id)
+    assert detail["claim_check"]["key"] == f"claim-check/{event_data.id}.json"
+
+
+@pytest.mark.usefixtures("_lambda_environment")
+def test_handler_queue_payload_too_large(
+    lambda_context: handler.LambdaContext,
+    base_zendesk_event_data: dict,
+    monkeypatch: pytest.MonkeyPatch,
+    mocker: MockerFixture,
+) -> None:
+    """Test payloads too large for the queue are rejected without a bucket."""
+    monkeypatch.setenv("INGEST_QUEUE_URL", "https://sqs/zendesk-ingest")
+    sqs = mocker.patch.object(handler, "sqs_client").return_value
+    body = _comment_event(base_zendesk_event_data, 600 * 1024).model_dump_json()
+    event = {"headers": {"authorization": AUTH_HEADER}, "body": body}
+
+    response = handler.handler(event, lambda_context)
+
+    assert response["statusCode"] == 413
+    sqs.send_message.assert_not_called()
+
+
+def _comment_event(base_zendesk_event_data: dict, size: int) -> handler.ZendeskEvent:
+    """Build a comment event with a long description and comment body."""
+    base_zendesk_event_data["type"] = "zen:event-type:ticket.comment_added"
+    base_zendesk_event_data["detail"]["description"] = "d" * size
+    base_zendesk_event_data["event"] = {
+        "comment": {"id": "1", "body": "b" * size, "is_public": True}
+    }
+    return handler.parse_webhook_data(json.dumps(base_zendesk_event_data))
+
+
+def test_prepare_event_data_claim_check(
+    claim_check_bucket: str, base_zendesk_event_data: dict
+) -> None:
+    """Test the free text of an oversized event is moved to S3."""
+    event_data = _comment_event(base_zendesk_event_data, 150 * 1024)
+
+    entry = handler.prepare_event_data(event_data)
+
+    assert handler.entry_size(entry) < handler.CLAIM_CHECK_THRESHOLD
+    detail = json.loads(entry["Detail"])
+    assert detail["detail"]["description"] == "d" * handler.CLAIM_CHECK_PREVIEW_LENGTH
+    assert (
+        detail["event"]["comment"]["body"] == "b" * handler.CLAIM_CHECK_PREVIEW_LENGTH
+    )
+    assert detail["claim_check"] == {
+        "bucket": claim_check_bucket,
+        "key": f"claim-check/{event_data.id}.json",
+    }
+    stored = boto3.client("s3").get_object(
+        Bucket=claim_check_bucket, Key=detail["claim_check"]["key"]
+    )
+    assert stored["ServerSideEncryption"] == "aws:kms"
+    assert stored["Body"].read().decode() == event_data.model_dump_json()
+
+
+def test_prepare_event_data_small_event(
+    claim_check_bucket: str, base_zendesk_event_data: dict
+) -> None:
+    """Test events under the threshold are published unchanged."""
+    event_data = _comment_event(base_zendesk_event_data, 1024)
+
+    entry = handler.prepare_event_data(event_data)
+
+    assert entry["Detail"] == event_data.model_dump_json()
+    assert "Contents" not in boto3.client("s3").list_objects_v2(
+        Bucket=claim_check_bucket
+    )
+
+
+@pytest.mark.usefixtures("claim_check_bucket")
+def test_prepare_event_data_claim_check_error(
+    base_zendesk_event_data: dict, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test a 500 is returned when an oversized event can't be stored."""
+    monkeypatch.setenv("CLAIM_CHECK_BUCKET", "missing-bucket")
+    event_data = _comment_event(base_zendesk_event_data, 150 * 1024)
+
+    with pytest.raises(handler.ProcessingError) as exc_info:
+        handler.prepare_event_data(event_data)
+
+    assert exc_info.value.status_code == 500
+
+
+@pytest.mark.usefixtures("_lambda_environment")
+def test_handler_stage_metrics(
+    mock_ticket: str,
+    mocker: MockerFixture,
+    emf: typing.Callable[[], list[dict]],
+) -> None:
+    """Test each stage of processing is timed and published with the event type."""
+    client = mocker.Mock()
+    client.put_events.side_effect = [
+        _put_events_response("ThrottlingException"),
+        _put_events_response(None),
+    ]
+    mocker.patch.object(handler.boto3, "client", return_value=client)
+    mocker.patch.object(handler.time, "sleep")
+
+    handler.handler(
+        {"headers": {"authorization": AUTH_HEADER}, "body": mock_ticket},
+        MockLambdaContext(5000),
+    )
+
+    (blob,) = emf()
+    for stage in ("Auth", "Credentials", "Parse", "Prepare", "Publish"):
+        assert len(blob[f"{stage}Duration"]) == 1
+        assert blob[f"{stage}Duration"][0] >= 0
+    assert blob["PayloadSize"] == [float(len(mock_ticket))]
+    assert blob["PutEventsRetries"] == [1.0]
+    assert blob["EventType"] == "ticket.created"
+    dimensions = blob["_aws"]["CloudWatchMetrics"][0]["Dimensions"][0]
+    assert sorted(dimensions) == ["EventType", "service"]
+    assert isinstance(blob["ColdStart"], bool)
+
+
+def test_record_invocation_cold_start(
+    mocker: MockerFixture, emf: typing.Callable[[], list[dict]]
+) -> None:
+    """Test only the first invocation of a container is flagged as a cold start."""
+    mocker.patch.object(handler, "INVOCATIONS", handler.itertools.count())
+
+    cold_starts = []
+    for _ in range(2):
+        handler.record_invocation()
+        handler.metrics.add_metric(name="Test", unit=handler.MetricUnit.Count, value=1)
+        handler.metrics.flush_metrics()
+        cold_starts.extend(blob["ColdStart"] for blob in emf())
+
+    assert cold_starts == [True, False]
+
+
+TRACE_HEADER = (
+    "Root=1-5759e988-bd862e3fe1be46a994272793;Parent=53995c3f42cd8ad8;Sampled=1"
+)
+
+
+@pytest.mark.usefixtures("_lambda_environment")
+def test_handler_trace_header(
+    lambda_context: handler.LambdaContext,
+    mock_ticket: str,
+    mocker: MockerFixture,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test the X-Ray trace header is passed on to EventBridge."""
+    monkeypatch.setenv("_X_AMZN_TRACE_ID", TRACE_HEADER)
+    client = mocker.Mock()
+    client.put_events.return_value = _put_events_response(None)
+    mocker.patch.object(handler.boto3, "client", return_value=client)
+
+    handler.handler(
+        {"headers": {"authorization": AUTH_HEADER}, "body": mock_ticket},
+        lambda_context,
+    )
+
+    (entry,) = client.put_events.call_args.kwargs["Entries"]
+    assert entry["TraceHeader"] == TRACE_HEADER
+
+
+def test_prepare_event_data_no_trace_header(
+    mock_ticket: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test the trace header is left out when tracing is disabled."""
+    monkeypatch.setenv("EVENT_BUS_NAME", "zendesk-webhook-bus")
+
+    entry = handler.prepare_event_data(handler.parse_webhook_data(mock_ticket))
+
+    assert "TraceHeader" not in entry
+
+
+@pytest.mark.filterwarnings(
+    "ignore::DeprecationWarning"
+)  # "datetime.datetime.utcnow() is deprecated" coming from boto3
+@pytest.mark.usefixtures("_lambda_environment")
+def test_send_to_queue_trace_header(
+    mock_ticket: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test the trace header is attached to queued payloads."""
+    sqs = boto3.client("sqs")
+    queue_url = sqs.create_queue(QueueName="zendesk-ingest")["QueueUrl"]
+    monkeypatch.setenv("INGEST_QUEUE_URL", queue_url)
+    monkeypatch.setenv("_X_AMZN_TRACE_ID", TRACE_HEADER)
+
+    handler.send_to_queue(mock_ticket, "event")
+
+    (message,) = sqs.receive_message(
+        QueueUrl=queue_url, MessageSystemAttributeNames=["AWSTraceHeader"]
+    )["Messages"]
+    assert message["Attributes"]["AWSTraceHeader"] == TRACE_HEADER
+
+
+@pytest.mark.usefixtures("_lambda_environment")
+def test_batch_handler_trace_header(
+    lambda_context: handler.LambdaContext,
+    mock_ticket: str,
+    mocker: MockerFixture,
+) -> None:
+    """Test each entry continues the trace of the request that queued it."""
+    client = mocker.Mock()
+    client.put_events.return_value = _put_events_response(None, None)
+    mocker.patch.object(handler.boto3, "client", return_value=client)
+
+    traced = _sqs_record(_new_event(mock_ticket), "msg-1")
+    traced["attributes"] = {"AWSTraceHeader": TRACE_HEADER}
+    untraced = _sqs_record(_new_event(mock_ticket), "msg-2")
+    handler.batch_handler({"Records": [traced, untraced]}, lambda_context)
+
+    entries = client.put_events.call_args.kwargs["Entries"]
+    assert entries[0]["TraceHeader"] == TRACE_HEADER
+    assert "TraceHeader" not in entries[1]
+
+
+def test_truncate_for_log(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test long strings are shortened, including nested ones."""
+    monkeypatch.setattr(handler, "LOG_FIELD_LENGTH", 5)
+
+    value = {"body": "abcdefgh", "items": ["abc", {"text": "abcdefgh"}], "count": 10}
+
+    assert handler.truncate_for_log(value) == {
+        "body": "abcde... (8 characters)",
+        "items": ["abc", {"text": "abcde... (8 characters)"}],
+        "count": 10,
+    }
+
+
+@pytest.mark.usefixtures("_lambda_environment")
+def test_handler_logs_summary(
+    lambda_context: handler.LambdaContext,
+    mock_ticket: str,
+    mocker: MockerFixture,
+    monkeypatch: pytest.MonkeyPatch,
+    logs: typing.Callable[[], list[dict]],
+) -> None:
+    """Test only a summary of the event is logged when it isn't sampled."""
+    monkeypatch.setattr(handler, "LOG_EVENT_SAMPLE_RATE", 0)
+    client = mocker.Mock()
+    client.put_events.return_value = _put_events_response(None)
+    mocker.patch.object(handler.boto3, "client", return_value=client)
+
+    handler.handler(
+        {"headers": {"authorization": AUTH_HEADER}, "body": mock_ticket},
+        lambda_context,
+    )
+
+    entries = logs()
+    received = next(e for e in entries if e["message"] == "Event received")
+    assert received["body_length"] == len(mock_ticket)
+    assert "event" not in received
+    processed = next(
+        e for e in entries if e["message"] == "Event processed successfully"
+    )
+    assert processed["event_type"] == "ticket.created"
+    assert all(AUTH_HEADER not in json.dumps(e) for e in entries)
+
+
+@pytest.mark.usefixtures("_lambda_environment")
+def test_handler_logs_sampled_event(
+    lambda_context: handler.LambdaContext,
+    mock_ticket: str,
+    mocker: MockerFixture,
+    monkeypatch: pytest.MonkeyPatch,
+    logs: typing.Callable[[], list[dict]],
+) -> None:
+    """Test sampled events are logged without the credentials."""
+    monkeypatch.setattr(handler, "LOG_EVENT_SAMPLE_RATE", 1)
+    client = mocker.Mock()
+    client.put_events.return_value = _put_events_response(None)
+    mocker.patch.object(handler.boto3, "client", return_value=client)
+
+    handler.handler(
+        {"headers": {"Authorization": AUTH_HEADER}, "body": mock_ticket},
+        lambda_context,
+    )
+
+    received = next(e for e in logs() if e["message"] == "Event received")
+    assert received["event"]["headers"] == {}
+    assert received["event"]["body"].startswith(mock_ticket[:100])
+
+
+@pytest.mark.usefixtures("_lambda_environment")
+def test_handler_logs_event_on_error(
+    lambda_context: handler.LambdaContext,
+    monkeypatch: pytest.MonkeyPatch,
+    logs: typing.Callable[[], list[dict]],
+) -> None:
+    """Test the event is logged when processing fails, even if it wasn't sampled."""
+    monkeypatch.setattr(handler, "LOG_EVENT_SAMPLE_RATE", 0)
+
+    response = handler.handler(
+        {"headers": {"authorization": AUTH_HEADER}, "body": "{not json"},
+        lambda_context,
+    )
+
+    assert response["statusCode"] == 400
+    error = next(
+        e for e in logs() if e["message"].startswith("Error processing webhook")
+    )
+    assert error["event"] == {"headers": {}, "body": "{not json"}
+
+
+@pytest.mark.usefixtures("_lambda_environment")
+def test_batch_handler_logs_failed_records(
+    lambda_context: handler.LambdaContext,
+    mock_ticket: str,
+    mocker: MockerFixture,
+    monkeypatch: pytest.MonkeyPatch,
+    logs: typing.Callable[[], list[dict]],
+) -> None:
+    """Test the records that will be retried are logged in full."""
+    monkeypatch.setattr(handler, "LOG_EVENT_SAMPLE_RATE", 0)
+    client = mocker.Mock()
+    client.put_events.return_value = _put_events_response(None)
+    mocker.patch.object(handler.boto3, "client", return_value=client)
+
+    handler.batch_handler(
+        {
+            "Records": [
+                _sqs_record(_new_event(mock_ticket), "msg-1"),
+                _sqs_record("{not json", "msg-2"),
+            ]
+        },
+        lambda_context,
+    )
+
+    entries = logs()
+    received = next(e for e in entries if e["message"] == "Event received")
+    assert received["records"] == 2
+    retried = next(e for e in entries if e["message"] == "Records will be retried")
+    assert [r["messageId"] for r in retried["records"]] == ["msg-2"]
@@ -27,8 +27,20 @@ resource "aws_lambda_function" "this" {
 
   environment {
     variables = {
-      CREDENTIALS_PARAM_PATH = var.webhook_creds
-      EVENT_BUS_NAME         = var.eventbus_name
+      ALLOWED_CHANNELS            = join(",", var.allowed_channels)
+      ALLOWED_EVENT_TYPES         = join(",", var.allowed_event_types)
+      CLAIM_CHECK_BUCKET          = var.claim_check_bucket
+      CREDENTIALS_PARAM_PATH      = var.webhook_creds
+      DENIED_CHANNELS             = join(",", var.denied_channels)
+      DENIED_EVENT_TYPES          = join(",", var.denied_event_types)
+      EVENT_BUS_NAME              = var.eventbus_name
+      IDEMPOTENCY_IN_PROGRESS_TTL = 5 # Function timeout
+      IDEMPOTENCY_TABLE           = aws_dynamodb_table.idempotency.name
+      IDEMPOTENCY_TTL             = var.idempotency_ttl
+      INGEST_QUEUE_URL            = var.batch_ingestion ? aws_sqs_queue.ingest[0].url : ""
+      KMS_KEY_ARN                 = var.kms_key_arn
+      LOG_EVENT_SAMPLE_RATE       = var.log_event_sample_rate
+      PRIME_ON_INIT               = "true"
     }
   }
 
@@ -78,6 +90,17 @@ data "aws_iam_policy_document" "lambda_assume" {
 }
 
 data "aws_iam_policy_document" "lambda" {
+  statement {
+    actions = [
+      "dynamodb:DeleteItem",
+      "dynamodb:PutItem",
+    ]
+
+    resources = [
+      aws_dynamodb_table.idempotency.arn,
+    ]
+  }
+
   statement {
     actions = [
       "events:PutEvents",
@@ -91,6 +114,7 @@ data "aws_iam_policy_document" "lambda" {
   statement {
     actions = [
       "kms:Decrypt",
+      "kms:GenerateDataKey",
     ]
 
     resources = [
@@ -104,9 +128,56 @@ data "aws_iam_policy_document" "lambda" {
       "logs:PutLogEvents",
     ]
 
-    resources = [
-      "${aws_cloudwatch_log_group.lambda.arn}:log-stream:*"
-    ]
+    resources = concat(
+      ["${aws_cloudwatch_log_group.lambda.arn}:log-stream:*"],
+      [for group in aws_cloudwatch_log_group.batch : "${group.arn}:log-stream:*"],
+    )
+  }
+
+  dynamic "statement" {
+    for_each = var.claim_check_bucket != "" ? [var.claim_check_bucket] : []
+
+    content {
+      actions = [
+        "s3:PutObject",
+      ]
+
+      resources = [
+        provider::aws::arn_build(data.aws_partition.current.partition, "s3", "", "", "${statement.value}/claim-check/*"),
+      ]
+    }
+  }
+
+  dynamic "statement" {
+    for_each = var.batch_ingestion && var.claim_check_bucket != "" ? [var.claim_check_bucket] : []
+
+    content {
+      actions = [
+        "s3:GetObject",
+      ]
+
+      resources = [
+        provider::aws::arn_build(data.aws_partition.current.partition, "s3", "", "", "${statement.value}/claim-check/queue/*"),
+      ]
+    }
+  }
+
+  dynamic "statement" {
+    for_each = aws_sqs_queue.ingest
+
+    content {
+      actions = [
+        "sqs:ChangeMessageVisibility",
+        "sqs:DeleteMessage",
+        "sqs:GetQueueAttributes",
+        "sqs:ReceiveMessage",
+        "sqs:SendMessage",
+      ]
+
+      resources = [
+        statement.value.arn,
+      ]
+    }
   }
 
   statement {
@@ -0,0 +1,101 @@
+# Copyright 2026 Dave Hall, Skwashd Services https://gata.works, MIT License
+
+resource "aws_sqs_queue" "ingest" {
+  count = var.batch_ingestion ? 1 : 0
+
+  name = "${local.function_name}-ingest"
+
+  kms_master_key_id = var.kms_key_arn
+
+  kms_data_key_reuse_period_seconds = 600
+
+  max_message_size          = 1048576 # 1 MB
+  message_retention_seconds = 345600  # 4 days
+
+  visibility_timeout_seconds = 180 # 6 x batch function timeout
+
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.ingest_dlq[0].arn
+    maxReceiveCount     = 5
+  })
+
+  tags = var.tags
+}
+
+resource "aws_sqs_queue" "ingest_dlq" {
+  count = var.batch_ingestion ? 1 : 0
+
+  name = "${local.function_name}-ingest-dlq"
+
+  kms_master_key_id = var.kms_key_arn
+
+  kms_data_key_reuse_period_seconds = 600
+
+  max_message_size          = 1048576 # 1 MB
+  message_retention_seconds = 1209600 # 14 days
+
+  tags = var.tags
+}
+
+resource "aws_lambda_function" "batch" {
+  count = var.batch_ingestion ? 1 : 0
+
+  function_name = "${local.function_name}-batch"
+
+  filename         = data.archive_file.lambda.output_path
+  handler          = "handler.batch_handler"
+  source_code_hash = data.archive_file.lambda.output_base64sha256
+
+  architectures = ["arm64"]
+  memory_size   = 128
+  runtime       = var.python_version
+  timeout       = 30
+
+  role = aws_iam_role.lambda.arn
+
+  layers = [
+    var.lambda_powertools_arn,
+  ]
+
+  environment {
+    variables = {
+      CLAIM_CHECK_BUCKET          = var.claim_check_bucket
+      EVENT_BUS_NAME              = var.eventbus_name
+      IDEMPOTENCY_IN_PROGRESS_TTL = 30 # Function timeout
+      IDEMPOTENCY_TABLE           = aws_dynamodb_table.idempotency.name
+      IDEMPOTENCY_TTL             = var.idempotency_ttl
+      KMS_KEY_ARN                 = var.kms_key_arn
+      LOG_EVENT_SAMPLE_RATE       = var.log_event_sample_rate
+      PRIME_ON_INIT               = "true"
+    }
+  }
+
+  tracing_config {
+    mode = "Active"
+  }
+
+  tags = var.tags
+}
+
+# trivy:ignore:AVD-AWS-0017 Not logging sensitive data so CWL SSE is adequate
+resource "aws_cloudwatch_log_group" "batch" {
+  count = var.batch_ingestion ? 1 : 0
+
+  name              = "/aws/lambda/${aws_lambda_function.batch[0].function_name}"
+  retention_in_days = 30
+  tags              = var.tags
+}
+
+resource "aws_lambda_event_source_mapping" "batch" {
+  count = var.batch_ingestion ? 1 : 0
+
+  event_source_arn = aws_sqs_queue.ingest[0].arn
+  function_name    = aws_lambda_function.batch[0].arn
+
+  batch_size                         = 100
+  maximum_batching_window_in_seconds = 1
+
+  function_response_types = ["ReportBatchItemFailures"]
+
+  tags = var.tags
+}
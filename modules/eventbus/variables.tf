@@ -5,11 +5,53 @@ variable "application_name" {
   type        = string
 }
 
+variable "allowed_channels" {
+  description = "Only publish events for tickets created through these channels. Leave empty to allow all channels."
+  type        = list(string)
+  default     = []
+}
+
+variable "allowed_event_types" {
+  description = "Only publish these event types, for example ticket.created. Leave empty to allow all event types."
+  type        = list(string)
+  default     = []
+}
+
+variable "batch_ingestion" {
+  description = "Queue webhook events in SQS and put them on the event bus in batches. Use this if bulk ticket updates cause EventBridge throttling."
+  type        = bool
+  default     = false
+}
+
+variable "claim_check_bucket" {
+  description = "Name of the S3 bucket used to store events that are too large for EventBridge. Oversized events are rejected if not set."
+  type        = string
+  default     = ""
+}
+
+variable "denied_channels" {
+  description = "Don't publish events for tickets created through these channels."
+  type        = list(string)
+  default     = []
+}
+
+variable "denied_event_types" {
+  description = "Don't publish these event types, for example ticket.comment_added."
+  type        = list(string)
+  default     = []
+}
+
 variable "eventbus_name" {
   description = "Name of the EventBridge event bus"
   type        = string
 }
 
+variable "idempotency_ttl" {
+  description = "Number of seconds to remember webhook events for, so redeliveries from Zendesk aren't put on the event bus again."
+  type        = number
+  default     = 3600
+}
+
 variable "kms_key_arn" {
   description = "ARN of the KMS key to use for encryption"
   type        = string
@@ -20,6 +62,12 @@ variable "lambda_powertools_arn" {
   type        = string
 }
 
+variable "log_event_sample_rate" {
+  description = "Fraction of Lambda invocations that log the full event. Events are always logged when processing fails."
+  type        = number
+  default     = 0.01
+}
+
 variable "python_version" {
   description = "Python version to use for the Lambda function"
   type        = string
@@ -4,6 +4,7 @@ __author__ = "Dave Hall <me@davehall.com.au>"
 __copyright__ = "Copyright 2024, 2025, Skwashd Services Pty Ltd https://gata.works"
 __license__ = "MIT"
 
+import os
 import random
 from typing import Any
 
@@ -12,8 +13,34 @@ from aws_lambda_powertools.utilities.typing import LambdaContext
 
 logger = Logger()
 
+# Only a sample of the events are logged in full, unless the event is invalid.
+LOG_EVENT_SAMPLE_RATE = float(os.environ.get("LOG_EVENT_SAMPLE_RATE", "0.01"))
+LOG_FIELD_LENGTH = int(os.environ.get("LOG_FIELD_LENGTH", "1000"))
 
-@logger.inject_lambda_context(log_event=True)
+
+def truncate_for_log(value: object) -> object:
+    """
+    Shorten the long strings in a value before it is logged.
+
+    Args:
+    ----
+        value: The value to shorten. Dicts and lists are shortened recursively.
+
+    Returns:
+    -------
+        The shortened value.
+
+    """
+    if isinstance(value, str) and len(value) > LOG_FIELD_LENGTH:
+        return f"{value[:LOG_FIELD_LENGTH]}... ({len(value)} characters)"
+    if isinstance(value, dict):
+        return {key: truncate_for_log(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [truncate_for_log(item) for item in value]
+    return value
+
+
+@logger.inject_lambda_context
 def handler(event: dict, _: LambdaContext) -> dict[str, Any]:
     """
     Mock the ticket update handler.
@@ -32,9 +59,17 @@ def handler(event: dict, _: LambdaContext) -> dict[str, Any]:
         str: JSON response.
 
     """
-    payload = event["payload"]
-    ticket_id = int(event["path"]["ticket_id"])
-    group_id = int(payload["ticket"]["group_id"])
+    sampled = random.random() < LOG_EVENT_SAMPLE_RATE  # noqa S311 Not a cryptographic function
+    if sampled:
+        logger.info("Event received", extra={"event": truncate_for_log(event)})
+
+    try:
+        payload = event["payload"]
+        ticket_id = int(event["path"]["ticket_id"])
+        group_id = int(payload["ticket"]["group_id"])
+    except (KeyError, TypeError, ValueError):
+        logger.exception("Invalid event", extra={"event": truncate_for_log(event)})
+        raise
 
     body = {
         "audit": {
@@ -61,6 +96,11 @@ def handler(event: dict, _: LambdaContext) -> dict[str, Any]:
         "body": body,
     }
 
-    logger.info("Response: %s", response)
+    if sampled:
+        logger.info("Response: %s", response)
+    else:
+        logger.info(
+            "Ticket updated", extra={"ticket_id": ticket_id, "group_id": group_id}
+        )
 
     return response
@@ -4,6 +4,10 @@ __author__ = "Dave Hall <me@davehall.com.au>"
 __copyright__ = "Copyright 2024, 2025, Skwashd Services Pty Ltd https://gata.works"
 __license__ = "MIT"
 
+import importlib
+import io
+import json
+import typing
 import uuid
 from typing import Any
 
@@ -12,6 +16,9 @@ from aws_lambda_powertools.utilities.typing import LambdaContext
 
 import handler
 
+# The package exports the handler function under the same name as the module.
+handler_module = importlib.import_module("handler.handler")
+
 
 @pytest.fixture
 def lambda_context() -> LambdaContext:
@@ -30,6 +37,18 @@ def lambda_context() -> LambdaContext:
     return mock_context
 
 
+@pytest.fixture
+def logs(monkeypatch: pytest.MonkeyPatch) -> typing.Callable[[], list[dict]]:
+    """Capture the log entries written after the fixture is used."""
+    stream = io.StringIO()
+    monkeypatch.setattr(handler_module.logger.registered_handler, "stream", stream)
+
+    def entries() -> list[dict]:
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    return entries
+
+
 def test_handler(lambda_context: LambdaContext) -> None:
     """Test lambda handler."""
     event: dict[str, Any] = {
@@ -62,3 +81,57 @@ def test_handler_missing_path(lambda_context: LambdaContext) -> None:
     }
     with pytest.raises(KeyError):
         handler.handler(event, lambda_context)
+
+
+def test_handler_logs_summary(
+    lambda_context: LambdaContext,
+    monkeypatch: pytest.MonkeyPatch,
+    logs: typing.Callable[[], list[dict]],
+) -> None:
+    """Test only a summary is logged when the event isn't sampled."""
+    monkeypatch.setattr(handler_module, "LOG_EVENT_SAMPLE_RATE", 0)
+    event: dict[str, Any] = {
+        "path": {"ticket_id": 123},
+        "payload": {"ticket": {"group_id": 456}},
+    }
+    handler.handler(event, lambda_context)
+
+    (entry,) = logs()
+    assert entry["message"] == "Ticket updated"
+    assert entry["ticket_id"] == 123
+    assert entry["group_id"] == 456
+
+
+def test_handler_logs_sampled_event(
+    lambda_context: LambdaContext,
+    monkeypatch: pytest.MonkeyPatch,
+    logs: typing.Callable[[], list[dict]],
+) -> None:
+    """Test sampled events are logged with the response."""
+    monkeypatch.setattr(handler_module, "LOG_EVENT_SAMPLE_RATE", 1)
+    event: dict[str, Any] = {
+        "path": {"ticket_id": 123},
+        "payload": {"ticket": {"group_id": 456}},
+    }
+    handler.handler(event, lambda_context)
+
+    received, response = logs()
+    assert received["event"] == event
+    assert response["message"].startswith("Response: ")
+
+
+def test_handler_logs_invalid_event(
+    lambda_context: LambdaContext,
+    monkeypatch: pytest.MonkeyPatch,
+    logs: typing.Callable[[], list[dict]],
+) -> None:
+    """Test invalid events are logged even if they weren't sampled."""
+    monkeypatch.setattr(handler_module, "LOG_EVENT_SAMPLE_RATE", 0)
+    monkeypatch.setattr(handler_module, "LOG_FIELD_LENGTH", 5)
+    event: dict[str, Any] = {"path": {"ticket_id": "not a number"}}
+    with pytest.raises(KeyError):
+        handler.handler(event, lambda_context)
+
+    (entry,) = logs()
+    assert entry["level"] == "ERROR"
+    assert entry["event"] == {"path": {"ticket_id": "not a... (12 characters)"}}
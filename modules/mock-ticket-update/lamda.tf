@@ -24,6 +24,12 @@ resource "aws_lambda_function" "this" {
     var.lambda_powertools_arn,
   ]
 
+  environment {
+    variables = {
+      LOG_EVENT_SAMPLE_RATE = var.log_event_sample_rate
+    }
+  }
+
   tracing_config {
     mode = "Active"
   }
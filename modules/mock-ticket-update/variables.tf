@@ -10,6 +10,12 @@ variable "lambda_powertools_arn" {
   type        = string
 }
 
+variable "log_event_sample_rate" {
+  description = "Fraction of Lambda invocations that log the full event. Events are always logged when processing fails."
+  type        = number
+  default     = 0.01
+}
+
 variable "python_version" {
   description = "Python version to use for the Lambda function"
   type        = string
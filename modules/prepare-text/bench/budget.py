@@ -0,0 +1,128 @@
+"""
+Benchmark preparing long ticket text with a word budget.
+
+Compares preparing the whole of a long forwarded email chain with stopping once
+the cleaned text has enough words for the models. Run it from the module
+directory with `uv run python bench/budget.py`.
+"""
+
+__author__ = "Dave Hall <me@davehall.com.au>"
+__copyright__ = "Copyright 2026, Skwashd Services Pty Ltd https://gata.works"
+__license__ = "MIT"
+
+import argparse
+import json
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from prepare import body
+
+from handler.handler import prepare_text, text_cleanup_rules
+
+# Roughly the number of words that fit in a 512 token BERT input.
+DEFAULT_MAX_WORDS = 384
+
+
+def measure(text: str, max_words: int, runs: int) -> float:
+    """
+    Measure how long it takes to prepare the text.
+
+    Args:
+    ----
+        text: The text to prepare.
+        max_words: The word budget, or 0 to prepare all of the text.
+        runs: The number of times to prepare the text per repeat.
+
+    Returns:
+    -------
+        Milliseconds per text, using the fastest of 5 repeats.
+
+    """
+    rules = text_cleanup_rules()
+    best = min(
+        timeit.repeat(
+            lambda: prepare_text(text, rules, max_words), number=runs, repeat=5
+        )
+    )
+    return best / runs * 1_000
+
+
+def peak_memory(text: str, max_words: int) -> int:
+    """
+    Measure the memory allocated while preparing the text.
+
+    This is measured separately from the time, as tracing allocations slows down
+    the preparation.
+
+    Args:
+    ----
+        text: The text to prepare.
+        max_words: The word budget, or 0 to prepare all of the text.
+
+    Returns:
+    -------
+        The peak number of bytes allocated.
+
+    """
+    rules = text_cleanup_rules()
+    tracemalloc.start()
+    prepare_text(text, rules, max_words)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main() -> None:
+    """Run the benchmark and print a report."""
+    parser = argparse.ArgumentParser(description="Benchmark the word budget.")
+    parser.add_argument("--runs", type=int, default=20, help="texts per repeat")
+    parser.add_argument(
+        "--max-words", type=int, default=DEFAULT_MAX_WORDS, help="word budget"
+    )
+    parser.add_argument("--json", action="store_true", help="print JSON output")
+    args = parser.parse_args()
+
+    # Build the expander before measuring anything.
+    prepare_text("", text_cleanup_rules(), args.max_words)
+
+    report = {}
+    for size in (10_000, 100_000, 500_000):
+        text = body(size)
+        full = prepare_text(text, text_cleanup_rules())
+        budget = prepare_text(text, text_cleanup_rules(), args.max_words)
+        if budget.split() != full.split()[: args.max_words]:
+            print(f"Prepared text differs for a {size} character body", file=sys.stderr)
+            raise SystemExit(1)
+        report[size] = {
+            "full_ms": measure(text, 0, args.runs),
+            "budget_ms": measure(text, args.max_words, args.runs),
+            "full_peak_bytes": peak_memory(text, 0),
+            "budget_peak_bytes": peak_memory(text, args.max_words),
+            "full_chars": len(full),
+            "budget_chars": len(budget),
+        }
+
+    if args.json:
+        print(json.dumps(report))
+        return
+
+    print(f"word budget {args.max_words}")
+    print(
+        f"{'body chars':>10}  {'full ms':>8}  {'budget ms':>9}  "
+        f"{'full KiB':>8}  {'budget KiB':>10}  {'full out':>8}  {'budget out':>10}"
+    )
+    for size, stats in report.items():
+        print(
+            f"{size:>10}  {stats['full_ms']:8.2f}  {stats['budget_ms']:9.2f}  "
+            f"{stats['full_peak_bytes'] / 1024:8.0f}  "
+            f"{stats['budget_peak_bytes'] / 1024:10.0f}  "
+            f"{stats['full_chars']:8}  {stats['budget_chars']:10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Benchmark caching prepared text.
+
+Prepares a burst of tickets with and without the prepared text cache. Most of
+the burst is made up of a handful of alerts repeated many times, the way
+monitoring systems raise tickets, with ordinary email tickets mixed in. Run it
+from the module directory with `uv run python bench/cache.py`.
+"""
+
+__author__ = "Dave Hall <me@davehall.com.au>"
+__copyright__ = "Copyright 2026, Skwashd Services Pty Ltd https://gata.works"
+__license__ = "MIT"
+
+import argparse
+import itertools
+import json
+import random
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from prepare import body
+
+from handler.handler import (
+    DiskPreparedTextCache,
+    PreparedTextCache,
+    prepare_text,
+    text_cleanup_rules,
+)
+
+ALERT = (
+    "[ALERT] {host} disk usage above 90%\n"
+    "Monitor: Disk usage\nHost: {host}\nSeverity: critical\n\n"
+    "The disk usage on {host} has been above 90% for 5 minutes. "
+    "Don't reply to this email, it was sent by the monitoring system.\n"
+)
+
+
+def burst(size: int, alert_share: float) -> list[str]:
+    """
+    Build a burst of tickets.
+
+    Args:
+    ----
+        size: The number of tickets in the burst.
+        alert_share: The fraction of the tickets that are repeated alerts.
+
+    Returns:
+    -------
+        The ticket texts.
+
+    """
+    rng = random.Random(42)  # noqa S311 Not a cryptographic function
+    alerts = [ALERT.format(host=f"db{number}") for number in range(5)]
+    return [
+        rng.choice(alerts)
+        if rng.random() < alert_share
+        else f"Ticket {number}\n{body(rng.randint(500, 4000))}"
+        for number in range(size)
+    ]
+
+
+def measure(
+    make_cache: Callable[[], PreparedTextCache | None], texts: list[str]
+) -> tuple[float, float]:
+    """
+    Measure preparation throughput, starting with an empty cache each time.
+
+    Args:
+    ----
+        make_cache: Creates an empty cache, or returns None to not use one.
+        texts: The texts to prepare.
+
+    Returns:
+    -------
+        The number of texts prepared per second, using the fastest of 3 repeats,
+        and the cache hit rate.
+
+    """
+    rules = text_cleanup_rules()
+    best, hit_rate = float("inf"), 0.0
+    for _ in range(3):
+        cache = make_cache()
+        started = time.perf_counter()
+        for text in texts:
+            prepare_text(text, rules, cache=cache)
+        best = min(best, time.perf_counter() - started)
+        if cache is not None:
+            hit_rate = cache.hits / len(texts)
+        if isinstance(cache, DiskPreparedTextCache):
+            cache.close()
+    return len(texts) / best, hit_rate
+
+
+def main() -> None:
+    """Run the benchmark and print a report."""
+    parser = argparse.ArgumentParser(description="Benchmark the prepared text cache.")
+    parser.add_argument("--size", type=int, default=5000, help="tickets per burst")
+    parser.add_argument("--json", action="store_true", help="print JSON output")
+    args = parser.parse_args()
+
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        databases = (Path(tmp) / f"{number}.db" for number in itertools.count())
+        for alert_share in (0.0, 0.5, 0.9):
+            texts = burst(args.size, alert_share)
+            uncached, _ = measure(lambda: None, texts)
+            memory, hit_rate = measure(lambda: PreparedTextCache(1000), texts)
+            disk, _ = measure(
+                lambda: DiskPreparedTextCache(next(databases), max_size=0), texts
+            )
+            report[alert_share] = {
+                "uncached_per_sec": uncached,
+                "memory_per_sec": memory,
+                "disk_per_sec": disk,
+                "hit_rate": hit_rate,
+            }
+
+    if args.json:
+        print(json.dumps(report))
+        return
+
+    print(f"{args.size} tickets per burst")
+    print(
+        f"{'alerts':>6}  {'uncached/s':>10}  {'memory/s':>9}  {'disk/s':>9}  hit rate"
+    )
+    for alert_share, stats in report.items():
+        print(
+            f"{alert_share:6.0%}  {stats['uncached_per_sec']:10.0f}  "
+            f"{stats['memory_per_sec']:9.0f}  {stats['disk_per_sec']:9.0f}  "
+            f"{stats['hit_rate']:8.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Benchmark expanding contractions.
+
+Compares `contractions.fix` with the expander used by the handler, after checking
+they produce the same output. The time and memory needed to set each of them up
+are measured in a fresh interpreter, as that cost is paid on every cold start. Run
+it from the module directory with `uv run python bench/expand.py`.
+"""
+
+__author__ = "Dave Hall <me@davehall.com.au>"
+__copyright__ = "Copyright 2026, Skwashd Services Pty Ltd https://gata.works"
+__license__ = "MIT"
+
+import argparse
+import json
+import subprocess
+import sys
+import timeit
+from collections.abc import Callable
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import contractions
+from prepare import body
+
+from handler.handler import contraction_expander
+
+# Each snippet is run in a new interpreter to measure getting ready to expand
+# contractions. tracemalloc slows down allocations, so the time and the peak
+# memory use are measured in separate runs.
+SETUP = {
+    "contractions.fix": "import contractions",
+    "expander": (
+        "from handler.handler import ContractionExpander, load_contractions\n"
+        "ContractionExpander(load_contractions())"
+    ),
+}
+MEASURE_TIME = """
+import sys, time
+sys.path.insert(0, {path!r})
+import handler.handler
+start = time.perf_counter()
+{setup}
+print(time.perf_counter() - start)
+"""
+MEASURE_MEMORY = """
+import sys, tracemalloc
+sys.path.insert(0, {path!r})
+import handler.handler
+tracemalloc.start()
+{setup}
+print(tracemalloc.get_traced_memory()[1])
+"""
+
+
+def corpus() -> list[str]:
+    """
+    Build the texts used to check the expander matches `contractions.fix`.
+
+    Returns
+    -------
+        Each contraction in a sentence, in several cases, and some ticket bodies.
+
+    """
+    texts = [body(size) for size in (2_000, 10_000)]
+    for key in contraction_expander().contractions:
+        texts.extend(
+            [
+                f"so {key} then",
+                f"{key.upper()}!",
+                f"({key.title()})",
+                f"{key[0].upper()}{key[1:]}, ok",
+            ]
+        )
+    return texts
+
+
+def measure(expand: Callable[[str], str], text: str, runs: int) -> float:
+    """
+    Measure expansion throughput.
+
+    Args:
+    ----
+        expand: The function used to expand the contractions.
+        text: The text to expand.
+        runs: The number of times to expand the text per repeat.
+
+    Returns:
+    -------
+        The number of texts expanded per second, using the fastest of 5 repeats.
+
+    """
+    best = min(timeit.repeat(lambda: expand(text), number=runs, repeat=5))
+    return runs / best
+
+
+def measure_setup(setup: str) -> dict[str, float]:
+    """
+    Measure getting ready to expand contractions in a new interpreter.
+
+    The handler module is imported first so only the setup itself is measured.
+
+    Args:
+    ----
+        setup: The code to run.
+
+    Returns:
+    -------
+        The time taken in milliseconds and the peak memory allocated in KiB.
+
+    """
+    module_dir = str(Path(__file__).resolve().parent.parent)
+
+    def run(snippet: str) -> float:
+        return float(
+            subprocess.run(  # noqa: S603 Runs this interpreter with our own code
+                [sys.executable, "-c", snippet.format(path=module_dir, setup=setup)],
+                capture_output=True,
+                check=True,
+                text=True,
+            ).stdout
+        )
+
+    return {
+        "setup_ms": run(MEASURE_TIME) * 1000,
+        "peak_kib": run(MEASURE_MEMORY) / 1024,
+    }
+
+
+def main() -> None:
+    """Run the benchmark and print a report."""
+    parser = argparse.ArgumentParser(description="Benchmark expanding contractions.")
+    parser.add_argument("--runs", type=int, default=200, help="texts per repeat")
+    parser.add_argument("--json", action="store_true", help="print JSON output")
+    args = parser.parse_args()
+
+    expander = contraction_expander()
+    for text in corpus():
+        for case in (text, text.lower()):
+            if expander.expand(case) != contractions.fix(case):
+                print(f"Expansion differs for {case!r}", file=sys.stderr)
+                raise SystemExit(1)
+
+    report: dict[str, dict] = {"setup": {}, "throughput": {}}
+    for name, setup in SETUP.items():
+        report["setup"][name] = measure_setup(setup)
+    for size in (2_000, 10_000, 50_000):
+        text = body(size).lower()
+        report["throughput"][size] = {
+            "fix_per_sec": measure(contractions.fix, text, args.runs),
+            "expander_per_sec": measure(expander.expand, text, args.runs),
+        }
+
+    if args.json:
+        print(json.dumps(report))
+        return
+
+    print(f"{'':>16}  {'setup ms':>8}  {'peak KiB':>8}")
+    for name, stats in report["setup"].items():
+        print(f"{name:>16}  {stats['setup_ms']:8.1f}  {stats['peak_kib']:8.0f}")
+    print()
+    print(f"{'body chars':>10}  {'fix/s':>8}  {'expander/s':>10}  speedup")
+    for size, stats in report["throughput"].items():
+        speedup = stats["expander_per_sec"] / stats["fix_per_sec"]
+        print(
+            f"{size:>10}  {stats['fix_per_sec']:8.0f}  "
+            f"{stats['expander_per_sec']:10.0f}  {speedup:6.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
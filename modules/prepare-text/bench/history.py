@@ -0,0 +1,155 @@
+"""
+Benchmark removing the thread history from ticket text.
+
+Prepares a corpus of tickets with and without cutting the text off at the first
+reply marker, and reports how much smaller the prepared text is and how long it
+takes. The built in corpus covers the common email clients. Pass `--corpus` with
+a JSON lines file of `{"text": ...}` objects to measure real tickets instead.
+Run it from the module directory with `uv run python bench/history.py`.
+"""
+
+__author__ = "Dave Hall <me@davehall.com.au>"
+__copyright__ = "Copyright 2026, Skwashd Services Pty Ltd https://gata.works"
+__license__ = "MIT"
+
+import argparse
+import json
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from prepare import PARAGRAPH, SIGNATURE, SUBJECT
+
+from handler.handler import (
+    ReplyMarkers,
+    prepare_text,
+    reply_markers,
+    text_cleanup_rules,
+)
+
+REPLY = "Thanks, that didn't fix it. I'm still seeing the same error.\n\n"
+
+HISTORY = {
+    "gmail": (
+        "On Mon, 6 Jan 2025 at 09:12, Example Support <\nsupport@example.com> "
+        "wrote:\n\n" + "".join(f"> {line}\n" for line in PARAGRAPH.splitlines())
+    ),
+    "outlook": (
+        "________________________________\n"
+        "From: Example Support <support@example.com>\n"
+        "Sent: Monday, 6 January 2025 9:12 AM\n"
+        "To: Jane Citizen <jane@example.com>\n"
+        f"Subject: {SUBJECT}\n\n{PARAGRAPH}{SIGNATURE}"
+    ),
+    "original": f"-----Original Message-----\nFrom: Jane\nSent: Monday\n\n{PARAGRAPH}",
+    "mobile": "Sent from my iPhone\n\n",
+    "disclaimer": (
+        "This email and any attachments are confidential and intended solely for "
+        "the addressee. If you are not the intended recipient, delete it.\n"
+    ),
+}
+
+
+def builtin_corpus() -> list[str]:
+    """
+    Build a corpus of email tickets with different amounts of thread history.
+
+    Returns
+    -------
+        The ticket texts, as the workflow sends them.
+
+    """
+    texts = [f"{SUBJECT}\n{PARAGRAPH}{SIGNATURE}"]
+    for depth in (1, 3, 10):
+        for history in HISTORY.values():
+            texts.append(f"{SUBJECT}\n{REPLY}{SIGNATURE}{history * depth}")
+    # A ticket raised by forwarding an email keeps the forwarded message.
+    texts.append(f"{SUBJECT}\n{HISTORY['original']}")
+    return texts
+
+
+def load_corpus(path: Path) -> list[str]:
+    """
+    Load a corpus of tickets from a JSON lines file.
+
+    Args:
+    ----
+        path: The path to the file.
+
+    Returns:
+    -------
+        The ticket texts.
+
+    """
+    with path.open(encoding="utf-8") as corpus:
+        return [json.loads(line)["text"] for line in corpus if line.strip()]
+
+
+def measure(texts: list[str], markers: ReplyMarkers, runs: int) -> float:
+    """
+    Measure preparation throughput.
+
+    Args:
+    ----
+        texts: The texts to prepare.
+        markers: The reply markers used to cut off the thread history.
+        runs: The number of passes over the corpus per repeat.
+
+    Returns:
+    -------
+        The number of texts prepared per second, using the fastest of 5 repeats.
+
+    """
+    rules = text_cleanup_rules()
+    best = min(
+        timeit.repeat(
+            lambda: [prepare_text(text, rules, markers=markers) for text in texts],
+            number=runs,
+            repeat=5,
+        )
+    )
+    return len(texts) * runs / best
+
+
+def main() -> None:
+    """Run the benchmark and print a report."""
+    parser = argparse.ArgumentParser(description="Benchmark thread history removal.")
+    parser.add_argument("--corpus", type=Path, help="JSON lines file of tickets")
+    parser.add_argument("--runs", type=int, default=20, help="passes over the corpus")
+    parser.add_argument("--json", action="store_true", help="print JSON output")
+    args = parser.parse_args()
+
+    texts = load_corpus(args.corpus) if args.corpus else builtin_corpus()
+    rules = text_cleanup_rules()
+    keep, strip = ReplyMarkers([]), reply_markers()
+
+    kept_chars = sum(len(prepare_text(text, rules, markers=keep)) for text in texts)
+    stripped_chars = sum(
+        len(prepare_text(text, rules, markers=strip)) for text in texts
+    )
+    report = {
+        "texts": len(texts),
+        "input_chars": sum(len(text) for text in texts),
+        "kept_chars": kept_chars,
+        "stripped_chars": stripped_chars,
+        "reduction": 1 - stripped_chars / kept_chars if kept_chars else 0.0,
+        "kept_per_sec": measure(texts, keep, args.runs),
+        "stripped_per_sec": measure(texts, strip, args.runs),
+    }
+
+    if args.json:
+        print(json.dumps(report))
+        return
+
+    print(f"{report['texts']} texts, {report['input_chars']} characters")
+    print(f"     history kept: {report['kept_chars']:10} prepared characters")
+    print(f"  history removed: {report['stripped_chars']:10} prepared characters")
+    print(f"        reduction: {report['reduction']:10.1%}")
+    print(f"     history kept: {report['kept_per_sec']:10.0f} texts/s")
+    print(f"  history removed: {report['stripped_per_sec']:10.0f} texts/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Benchmark preparing ticket text.
+
+Compares applying the cleanup rules one pattern string at a time after
+`contractions.fix`, which is what the handler used to do, with the compiled rules
+and contraction expander used by the handler. Both the whole of `prepare_text`
+and the rules on their own are measured. Run it from the
+module directory with `uv run python bench/prepare.py`.
+"""
+
+__author__ = "Dave Hall <me@davehall.com.au>"
+__copyright__ = "Copyright 2026, Skwashd Services Pty Ltd https://gata.works"
+__license__ = "MIT"
+
+import argparse
+import json
+import re
+import sys
+import timeit
+from collections.abc import Callable
+from pathlib import Path
+
+import contractions
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from handler.handler import (
+    load_text_cleanup_rules,
+    prepare_text,
+    strip_bad_lines,
+    text_cleanup_rules,
+)
+
+SUBJECT = "RE: [EXTERNAL] Can't log in to the portal since this morning"
+
+PARAGRAPH = (
+    "Hi team,\n\n"
+    "I've tried resetting my password twice but I still can't get in. The error "
+    "says my account isn't active, which doesn't make sense as I logged in "
+    "yesterday. I'd appreciate it if you could take a look, there's a report due "
+    "by 5pm and we're stuck.\n"
+    "The guide at https://urldefense.com/v3/__https://help.example.com/login__;"
+    "!!AbCdEf123$ didn't help either.\n\n"
+)
+
+SIGNATURE = (
+    "Regards,\n"
+    "Jane Citizen\n"
+    "Senior Analyst | Example Pty Ltd\n"
+    "cell: +61 400 000 000\n"
+    "email: jane@example.com\n"
+    "-- \n"
+    "This email is confidential. If you aren't the intended recipient, delete it.\n"
+)
+
+
+def body(size: int) -> str:
+    """
+    Build an email style ticket body of roughly the given size.
+
+    Args:
+    ----
+        size: The approximate length of the body in characters.
+
+    Returns:
+    -------
+        The title and body as a single string, as the workflow sends them.
+
+    """
+    paragraphs = PARAGRAPH * max(1, size // len(PARAGRAPH))
+    return f"{SUBJECT}\n{paragraphs}{SIGNATURE}"
+
+
+def rules_per_call(text: str) -> str:
+    """
+    Load the rules and apply each pattern string.
+
+    Args:
+    ----
+        text: The text to clean.
+
+    Returns:
+    -------
+        The cleaned text.
+
+    """
+    for rule in load_text_cleanup_rules():
+        text = re.sub(rule["pattern"], rule["replace"], text)
+    return text
+
+
+def rules_compiled(text: str) -> str:
+    """
+    Apply the compiled rules.
+
+    Args:
+    ----
+        text: The text to clean.
+
+    Returns:
+    -------
+        The cleaned text.
+
+    """
+    return text_cleanup_rules().apply(text)
+
+
+def per_call(text: str) -> str:
+    """
+    Prepare the text with `contractions.fix` and each rule's pattern string.
+
+    Args:
+    ----
+        text: The text to prepare.
+
+    Returns:
+    -------
+        The prepared text.
+
+    """
+    return rules_per_call(strip_bad_lines(contractions.fix(text.lower())))
+
+
+def compiled(text: str) -> str:
+    """
+    Prepare the text with the compiled rules.
+
+    Args:
+    ----
+        text: The text to prepare.
+
+    Returns:
+    -------
+        The prepared text.
+
+    """
+    return prepare_text(text, text_cleanup_rules())
+
+
+def measure(prepare: Callable[[str], str], text: str, runs: int) -> float:
+    """
+    Measure preparation throughput.
+
+    Args:
+    ----
+        prepare: The function used to prepare the text.
+        text: The text to prepare.
+        runs: The number of times to prepare the text per repeat.
+
+    Returns:
+    -------
+        The number of texts prepared per second, using the fastest of 5 repeats.
+
+    """
+    best = min(timeit.repeat(lambda: prepare(text), number=runs, repeat=5))
+    return runs / best
+
+
+def main() -> None:
+    """Run the benchmark and print a report."""
+    parser = argparse.ArgumentParser(description="Benchmark preparing text.")
+    parser.add_argument("--runs", type=int, default=200, help="texts per repeat")
+    parser.add_argument("--json", action="store_true", help="print JSON output")
+    args = parser.parse_args()
+
+    report = {}
+    for size in (2_000, 10_000, 50_000):
+        text = body(size)
+        if per_call(text) != compiled(text):
+            print(f"Prepared text differs for a {size} character body", file=sys.stderr)
+            raise SystemExit(1)
+        # The rules are applied to the text once the lines have been stripped.
+        stripped = strip_bad_lines(contractions.fix(text.lower()))
+        report[size] = {
+            "per_call_per_sec": measure(per_call, text, args.runs),
+            "compiled_per_sec": measure(compiled, text, args.runs),
+            "rules_per_call_per_sec": measure(rules_per_call, stripped, args.runs),
+            "rules_compiled_per_sec": measure(rules_compiled, stripped, args.runs),
+        }
+
+    if args.json:
+        print(json.dumps(report))
+        return
+
+    for stage, prefix in (("prepare_text", ""), ("rules only", "rules_")):
+        print(stage)
+        print(f"{'body chars':>10}  {'per call/s':>10}  {'compiled/s':>10}  speedup")
+        for size, stats in report.items():
+            per_call_rate = stats[f"{prefix}per_call_per_sec"]
+            compiled_rate = stats[f"{prefix}compiled_per_sec"]
+            print(
+                f"{size:>10}  {per_call_rate:10.0f}  {compiled_rate:10.0f}  "
+                f"{compiled_rate / per_call_rate:6.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
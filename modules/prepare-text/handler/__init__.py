@@ -5,10 +5,45 @@ __copyright__ = "Copyright 2024, 2025, Skwashd Services Pty Ltd https://gata.wor
 __license__ = "MIT"
 
 from handler.handler import (
+    ContractionExpander,
+    DiskPreparedTextCache,
+    PreparedTextCache,
+    ReplyMarkers,
+    TextCleanupRules,
+    contraction_expander,
+    current_text_cleanup_rules,
+    fuse_text_cleanup_rules,
     handler,
+    load_contractions,
+    load_reply_markers,
     load_text_cleanup_rules,
+    parse_text_cleanup_rules,
     prepare_text,
+    prepare_texts,
+    prepared_text_cache,
+    reply_markers,
     strip_bad_lines,
+    text_cleanup_rules,
 )
 
-__all__ = ["handler", "load_text_cleanup_rules", "prepare_text", "strip_bad_lines"]
+__all__ = [
+    "ContractionExpander",
+    "DiskPreparedTextCache",
+    "PreparedTextCache",
+    "ReplyMarkers",
+    "TextCleanupRules",
+    "contraction_expander",
+    "current_text_cleanup_rules",
+    "fuse_text_cleanup_rules",
+    "handler",
+    "load_contractions",
+    "load_reply_markers",
+    "load_text_cleanup_rules",
+    "parse_text_cleanup_rules",
+    "prepare_text",
+    "prepare_texts",
+    "prepared_text_cache",
+    "reply_markers",
+    "strip_bad_lines",
+    "text_cleanup_rules",
+]
@@ -5,15 +5,63 @@ __copyright__ = "Copyright 2024, 2025, Skwashd Services Pty Ltd https://davehall
 __license__ = "MIT"
 
 
+import hashlib
+import importlib.util
+import itertools
+import json
+import os
+import random
 import re
+import sqlite3
+from collections import OrderedDict
+from collections.abc import Callable, Iterator, Sequence
+from functools import cache
+from pathlib import Path
 from typing import Any
 
-import contractions
 from aws_lambda_powertools import Logger
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
 logger = Logger()
 
+# Ticket text is only logged in full for a sample of invocations and on errors.
+# The rest of the time only its length is logged.
+LOG_EVENT_SAMPLE_RATE = float(os.environ.get("LOG_EVENT_SAMPLE_RATE", "0.01"))
+LOG_FIELD_LENGTH = int(os.environ.get("LOG_FIELD_LENGTH", "1000"))
+
+# The models only use the start of the text, so we stop preparing it once we have
+# this many words. 0 means the whole text is prepared.
+MAX_WORDS = int(os.environ.get("MAX_WORDS", "0"))
+
+# Alert tickets from monitoring systems arrive thousands of times with the same
+# text, so the prepared text of the most recent tickets is cached. 0 turns the
+# cache off.
+PREPARED_TEXT_CACHE_SIZE = int(os.environ.get("PREPARED_TEXT_CACHE_SIZE", "1000"))
+# Long tickets are prepared in full when MAX_WORDS is 0, so the cache is also
+# limited by the total length of the prepared texts to fit in the Lambda's memory.
+PREPARED_TEXT_CACHE_CHARS = int(
+    os.environ.get("PREPARED_TEXT_CACHE_CHARS", str(8 * 1024 * 1024))
+)
+# Writes to the on disk cache are committed in batches of this size.
+DISK_CACHE_COMMIT_SIZE = 100
+
+# Matches each line, using the same line boundaries as str.splitlines. Blank lines
+# are skipped as they are always removed.
+LINE_PATTERN = re.compile(r"[^\n\r\v\f\x1c-\x1e\x85\u2028\u2029]+")
+WORD_PATTERN = re.compile(r"\S+")
+
+# SSM parameter holding a JSON object with the `rules`, `excluded_line_prefixes`
+# and `reply_markers` to use instead of the built in ones. It is fetched at most
+# once every TEXT_CLEANUP_RULES_TTL seconds.
+TEXT_CLEANUP_RULES_PARAM = os.environ.get("TEXT_CLEANUP_RULES_PARAM", "")
+TEXT_CLEANUP_RULES_TTL = int(os.environ.get("TEXT_CLEANUP_RULES_TTL", "300"))
+BUILTIN_RULES_VERSION = "builtin"
+
+# The last good rules loaded from each parameter, with the value they came from,
+# and the values that were rejected so we don't try to compile them again.
+LOADED_RULES: dict[str, tuple[str, "TextCleanupRules"]] = {}
+REJECTED_RULES: set[str] = set()
+
 EXCLUDED_LINE_PREFIXES = (
     "-- ",  # Signature delimiter
     "bcc: ",
@@ -28,17 +76,50 @@ EXCLUDED_LINE_PREFIXES = (
     "to: ",
 )
 
+# A rule that replaces runs of characters outside a class with a space, followed by
+# a rule that collapses whitespace, can be done in a single pass by leaving the
+# space out of the class. Only classes of printable ASCII without escapes are
+# fused, so we know the class doesn't allow any other whitespace.
+STRIP_CHARS_PATTERN = re.compile(r"\[\^([\x21-\x5b\x5e-\x7e]+) \]\+")
+COLLAPSE_WHITESPACE_PATTERN = r"\s+"
+
+# contractions.fix only matches whole words, using these characters to find the
+# word boundaries.
+CONTRACTIONS_WORD_CHARS = "0-9A-Za-z_"
+# Word processors and email clients often replace apostrophes with this.
+RIGHT_SINGLE_QUOTE = "\u2019"
+CONTRACTIONS_MONTHS = (
+    "january",
+    "february",
+    "march",
+    "april",
+    "june",
+    "july",
+    "august",
+    "september",
+    "october",
+    "november",
+    "december",
+)
+# These contractions are ambiguous without the apostrophe, for example "we're"
+# and "were", so contractions.fix doesn't expand them when it is missing.
+CONTRACTIONS_SAFE_KEYS = frozenset(
+    {"he's", "he'll", "we'll", "we'd", "it's", "i'd", "we're", "i'll", "who're", "o'"}
+)
+
 
 def load_text_cleanup_rules() -> list[dict[str, str]]:
     """
     Get a list of text cleanup rules.
 
+    These are the built in rules, which are used when TEXT_CLEANUP_RULES_PARAM
+    isn't set or the parameter doesn't define its own rules.
+
     Returns
     -------
         A list regex patterns to apply to strings.
 
     """
-    # TODO Make this dynamic using SSM or args
     return [
         {
             # Remove proofpoint wrapper from URLs
@@ -63,60 +144,930 @@ def load_text_cleanup_rules() -> list[dict[str, str]]:
     ]
 
 
-def prepare_text(text: str, rules: list[dict[str, str]]) -> str:
+def load_reply_markers() -> list[str]:
+    """
+    Get the patterns that mark the start of the thread history in an email.
+
+    Each pattern is matched case insensitively at the start of a line, after any
+    indentation.
+
+    Returns
+    -------
+        A list of regex patterns.
+
+    """
+    return [
+        # Quoted reply
+        r">",
+        # Gmail and Apple Mail, which wrap long attributions onto a second line
+        r"on\b[^\n]{0,300}(?:\n[^\n]{0,300})?\bwrote:[ \t\r]*$",
+        # Outlook
+        r"-{2,} ?original message ?-{2,}",
+        r"_{10,}[ \t\r]*$",
+        r"from:[^\n]*\n[ \t]*(?:sent|date):",
+        # Mobile signatures
+        r"sent from my \w+",
+        r"get outlook for \w+",
+        # Disclaimer footers
+        r"this (?:e-?mail|message)\b[^\n]{0,200}\b(?:confidential|intended (?:solely|only))",
+        r"if you (?:are not|have received this)\b[^\n]{0,100}\b(?:intended recipient|in error)",
+    ]
+
+
+class ReplyMarkers:
+    """Reply markers compiled into a single pattern, used to cut off thread history."""
+
+    def __init__(self, markers: list[str]) -> None:
+        """
+        Compile the markers.
+
+        Args:
+        ----
+            markers: A list of regex patterns that mark the start of the history.
+
+        """
+        self.markers = markers
+        self._pattern = (
+            re.compile(
+                f"^[ \\t]*(?:{'|'.join(f'(?:{marker})' for marker in markers)})",
+                re.IGNORECASE | re.MULTILINE,
+            )
+            if markers
+            else None
+        )
+
+    def strip_history(self, text: str) -> str:
+        """
+        Cut the text off at the first reply marker.
+
+        Markers with nothing but other markers before them are ignored, so a
+        ticket raised by forwarding an email keeps the forwarded message.
+
+        Args:
+        ----
+            text: The text to cut.
+
+        Returns:
+        -------
+            The text before the first reply marker.
+
+        """
+        if self._pattern is None:
+            return text
+        position = 0
+        for match in self._pattern.finditer(text):
+            if text[position : match.start()].strip():
+                return text[: match.start()]
+            # Skip the rest of the line holding the marker.
+            position = text.find("\n", match.end())
+            if position == -1:
+                break
+        return text
+
+
+@cache
+def reply_markers() -> ReplyMarkers:
+    """
+    Get the compiled reply markers.
+
+    The markers are compiled once per container.
+
+    Returns
+    -------
+        The compiled markers.
+
+    """
+    return ReplyMarkers(load_reply_markers())
+
+
+def fuse_text_cleanup_rules(rules: list[dict[str, str]]) -> list[dict[str, str]]:
+    """
+    Combine rules that can be applied in a single pass over the text.
+
+    Args:
+    ----
+        rules: A list of text cleanup rules.
+
+    Returns:
+    -------
+        The rules, with the fused rules replacing the originals.
+
+    """
+    fused: list[dict[str, str]] = []
+    for rule in rules:
+        strip_chars = (
+            STRIP_CHARS_PATTERN.fullmatch(fused[-1]["pattern"])
+            if fused and fused[-1]["replace"] == " "
+            else None
+        )
+        if strip_chars and rule == {
+            "pattern": COLLAPSE_WHITESPACE_PATTERN,
+            "replace": " ",
+        }:
+            fused[-1] = {"pattern": f"[^{strip_chars.group(1)}]+", "replace": " "}
+        else:
+            fused.append(rule)
+    return fused
+
+
+class TextCleanupRules:
+    """Text cleanup rules compiled so they can be applied to many strings."""
+
+    def __init__(
+        self,
+        rules: list[dict[str, str]],
+        excluded_line_prefixes: Sequence[str] = EXCLUDED_LINE_PREFIXES,
+        markers: ReplyMarkers | None = None,
+        version: str = BUILTIN_RULES_VERSION,
+    ) -> None:
+        """
+        Compile the rules.
+
+        Args:
+        ----
+            rules: A list of text cleanup rules.
+            excluded_line_prefixes: Lines starting with these are removed.
+            markers: The compiled reply markers. Defaults to `reply_markers()`.
+            version: Identifies where the rules came from.
+
+        """
+        self.rules = fuse_text_cleanup_rules(rules)
+        self._compiled = [
+            (re.compile(rule["pattern"]), rule["replace"]) for rule in self.rules
+        ]
+        # Lines are lowercased before they are checked.
+        self.excluded_line_prefixes = tuple(
+            prefix.lower() for prefix in excluded_line_prefixes
+        )
+        self.markers = markers or reply_markers()
+        self.version = version
+        # Identifies what the rules do, as the version doesn't change when rules
+        # are passed in rather than loaded.
+        self.fingerprint = hashlib.sha256(
+            json.dumps(
+                [self.rules, self.excluded_line_prefixes, self.markers.markers]
+            ).encode()
+        ).hexdigest()
+
+    def apply(self, text: str) -> str:
+        """
+        Apply the rules to the text in order.
+
+        Args:
+        ----
+            text: The text to clean.
+
+        Returns:
+        -------
+            The cleaned text.
+
+        """
+        for pattern, replace in self._compiled:
+            text = pattern.sub(replace, text)
+        return text
+
+
+@cache
+def text_cleanup_rules() -> TextCleanupRules:
+    """
+    Get the compiled text cleanup rules.
+
+    The rules are compiled once per container.
+
+    Returns
+    -------
+        The compiled rules.
+
+    """
+    return TextCleanupRules(load_text_cleanup_rules())
+
+
+def _string_list(config: dict[str, Any], key: str) -> list[str] | None:
+    """
+    Get a list of non-empty strings from the rules config.
+
+    Args:
+    ----
+        config: The rules config.
+        key: The key of the list.
+
+    Returns:
+    -------
+        The list, or None if the key isn't set.
+
+    Raises:
+    ------
+        ValueError: If the value isn't a list of non-empty strings.
+
+    """
+    value = config.get(key)
+    if value is None:
+        return None
+    if not isinstance(value, list) or not all(
+        isinstance(item, str) and item for item in value
+    ):
+        raise ValueError(f"`{key}` must be a list of non-empty strings")  # noqa TRY003 We need an error message
+    return value
+
+
+def parse_text_cleanup_rules(value: str) -> TextCleanupRules:
+    """
+    Validate and compile the rules stored in the SSM parameter.
+
+    Anything the parameter doesn't set uses the built in value. The version is the
+    `version` property, if there is one, or a hash of the value.
+
+    Args:
+    ----
+        value: The JSON value of the parameter.
+
+    Returns:
+    -------
+        The compiled rules.
+
+    Raises:
+    ------
+        ValueError: If the rules aren't valid.
+
+    """
+    try:
+        config = json.loads(value)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Rules aren't valid JSON: {e}") from e  # noqa TRY003 We need an error message
+    if not isinstance(config, dict):
+        raise ValueError("Rules must be a JSON object")  # noqa TRY003 We need an error message
+
+    rules = config.get("rules", load_text_cleanup_rules())
+    if not isinstance(rules, list) or not all(
+        isinstance(rule, dict)
+        and isinstance(rule.get("pattern"), str)
+        and isinstance(rule.get("replace"), str)
+        for rule in rules
+    ):
+        raise ValueError("`rules` must be a list of patterns and replacements")  # noqa TRY003 We need an error message
+    prefixes = _string_list(config, "excluded_line_prefixes")
+    markers = _string_list(config, "reply_markers")
+    version = str(
+        config.get("version") or hashlib.sha256(value.encode()).hexdigest()[:12]
+    )
+
+    try:
+        for rule in rules:
+            # Group references in the replacement are only checked when the
+            # pattern matches, and the empty alternative always matches.
+            re.compile(f"{rule['pattern']}|").sub(rule["replace"], "", count=1)
+        return TextCleanupRules(
+            rules,
+            EXCLUDED_LINE_PREFIXES if prefixes is None else prefixes,
+            None if markers is None else ReplyMarkers(markers),
+            version,
+        )
+    except re.error as e:
+        raise ValueError(f"Invalid pattern in rules: {e}") from e  # noqa TRY003 We need an error message
+
+
+def current_text_cleanup_rules() -> TextCleanupRules:
+    """
+    Get the text cleanup rules to use for this invocation.
+
+    The rules are loaded from the TEXT_CLEANUP_RULES_PARAM SSM parameter, which
+    is only fetched once it is older than TEXT_CLEANUP_RULES_TTL seconds, and only
+    compiled when its value changes. If the parameter can't be fetched or the
+    rules aren't valid, the last good rules are used. The built in rules are used
+    when there is no parameter, or it has never held valid rules.
+
+    Returns
+    -------
+        The compiled rules.
+
+    """
+    if not TEXT_CLEANUP_RULES_PARAM:
+        return text_cleanup_rules()
+
+    # Only needed when rules are loaded from SSM, so keep it off the import path.
+    from aws_lambda_powertools.utilities import parameters
+    from aws_lambda_powertools.utilities.parameters.exceptions import (
+        GetParameterError,
+    )
+
+    loaded_value, loaded = LOADED_RULES.get(
+        TEXT_CLEANUP_RULES_PARAM, ("", text_cleanup_rules())
+    )
+    try:
+        value = parameters.get_parameter(
+            TEXT_CLEANUP_RULES_PARAM, max_age=TEXT_CLEANUP_RULES_TTL
+        )
+    except GetParameterError:
+        logger.warning(
+            "Unable to fetch text cleanup rules, using the last good rules",
+            extra={"version": loaded.version},
+            exc_info=True,
+        )
+        return loaded
+
+    if value == loaded_value or value in REJECTED_RULES:
+        return loaded
+
+    try:
+        rules = parse_text_cleanup_rules(str(value))
+    except ValueError:
+        REJECTED_RULES.add(str(value))
+        logger.exception(
+            "Rejected text cleanup rules, using the last good rules",
+            extra={"version": loaded.version},
+        )
+        return loaded
+
+    LOADED_RULES[TEXT_CLEANUP_RULES_PARAM] = (str(value), rules)
+    logger.info("Loaded text cleanup rules", extra={"version": rules.version})
+    return rules
+
+
+def load_contractions() -> dict[str, str]:
+    """
+    Build the table of contractions expanded by `contractions.fix`.
+
+    The data files are read from the contractions package without importing it, as
+    importing it builds four Aho-Corasick automata that we don't use.
+
+    Returns
+    -------
+        The expansions keyed by the lowercase contraction.
+
+    """
+    spec = importlib.util.find_spec("contractions")
+    if spec is None or not spec.submodule_search_locations:
+        raise ModuleNotFoundError(name="contractions")
+    data_dir = Path(spec.submodule_search_locations[0]) / "data"
+
+    def load(name: str) -> dict[str, str]:
+        return json.loads((data_dir / f"{name}_dict.json").read_text(encoding="utf-8"))
+
+    contractions = load("contractions")
+    leftovers = load("leftovers")
+    slang = load("slang")
+
+    for month in CONTRACTIONS_MONTHS:
+        contractions[f"{month[:3]}."] = month
+    contractions.update(
+        {k.replace("'", RIGHT_SINGLE_QUOTE): v for k, v in contractions.items()}
+    )
+    leftovers.update(
+        {k.replace("'", RIGHT_SINGLE_QUOTE): v for k, v in leftovers.items()}
+    )
+
+    # Match the contractions with the apostrophes left out, or only some of them.
+    for key, value in contractions.items():
+        if key.lower() in CONTRACTIONS_SAFE_KEYS or "'" not in key:
+            continue
+        tokens = key.split("'")
+        for joiners in itertools.product(("", "'"), repeat=len(tokens) - 1):
+            slang[
+                "".join(
+                    itertools.chain(
+                        *zip(tokens[:-1], joiners, strict=True), tokens[-1:]
+                    )
+                )
+            ] = value
+
+    return {
+        key.lower(): value
+        for table in (contractions, leftovers, slang)
+        for key, value in table.items()
+    }
+
+
+def _trie_pattern(words: list[str]) -> str:
+    """
+    Build a regex that matches any of the words, preferring the longest match.
+
+    Nesting the alternatives by their common prefixes means the regex engine only
+    tries the words that start with the character it is looking at.
+
+    Args:
+    ----
+        words: The words to match.
+
+    Returns:
+    -------
+        The regex pattern.
+
+    """
+    trie: dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: dict[str, dict]) -> str:
+        branches = [
+            re.escape(char) + build(node[char]) for char in sorted(node) if char
+        ]
+        if not branches:
+            return ""
+        pattern = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        return f"(?:{pattern})?" if "" in node else pattern
+
+    return build(trie)
+
+
+def _match_case(word: str, expansion: str) -> str:
+    """
+    Apply the case of a contraction to its expansion.
+
+    Args:
+    ----
+        word: The contraction as it appears in the text.
+        expansion: The expansion of the contraction.
+
+    Returns:
+    -------
+        The expansion in the same case as the contraction.
+
+    """
+    if word == word.upper():
+        return expansion.upper()
+    if word == word.title():
+        return expansion.title()
+    if word == word.lower():
+        return expansion.lower()
+    if word == word[0].upper() + word[1:].lower():
+        return expansion[0].upper() + expansion[1:].lower()
+    return expansion
+
+
+class ContractionExpander:
+    """Expand contractions the same way `contractions.fix` does, in a single pass."""
+
+    def __init__(self, contractions: dict[str, str]) -> None:
+        """
+        Compile the contractions into a single regex.
+
+        Args:
+        ----
+            contractions: The expansions keyed by the lowercase contraction.
+
+        """
+        self.contractions = contractions
+        self._lowercase = {key: value.lower() for key, value in contractions.items()}
+        self._pattern = re.compile(
+            f"(?<![{CONTRACTIONS_WORD_CHARS}])"
+            f"{_trie_pattern(list(contractions))}"
+            f"(?![{CONTRACTIONS_WORD_CHARS}])"
+        )
+
+    def expand(self, text: str) -> str:
+        """
+        Expand the contractions in the text, keeping the case of each contraction.
+
+        Args:
+        ----
+            text: The text to expand.
+
+        Returns:
+        -------
+            The expanded text.
+
+        """
+        lowered = text.lower()
+        if lowered == text:
+            return self._pattern.sub(lambda match: self._lowercase[match[0]], text)
+
+        parts = []
+        position = 0
+        for match in self._pattern.finditer(lowered):
+            start, end = match.span()
+            parts.append(text[position:start])
+            parts.append(_match_case(text[start:end], self.contractions[match[0]]))
+            position = end
+        parts.append(text[position:])
+        return "".join(parts)
+
+
+@cache
+def contraction_expander() -> ContractionExpander:
+    """
+    Get the contraction expander.
+
+    The expander is built once per container.
+
+    Returns
+    -------
+        The contraction expander.
+
+    """
+    return ContractionExpander(load_contractions())
+
+
+class PreparedTextCache:
+    """A bounded LRU cache of prepared text, keyed by a hash of the input and rules."""
+
+    def __init__(
+        self, max_size: int, max_chars: int = PREPARED_TEXT_CACHE_CHARS
+    ) -> None:
+        """
+        Create an empty cache.
+
+        Args:
+        ----
+            max_size: The maximum number of prepared texts to keep.
+            max_chars: The maximum total length of the prepared texts to keep. Texts
+                longer than this aren't cached.
+
+        """
+        self.max_size = max_size
+        self.max_chars = max_chars
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, str] = OrderedDict()
+        self._chars = 0
+
+    @staticmethod
+    def key(
+        text: str, rules: TextCleanupRules, max_words: int | None, markers: ReplyMarkers
+    ) -> str:
+        """
+        Build the cache key for preparing a text.
+
+        Args:
+        ----
+            text: The text to prepare.
+            rules: The compiled text cleanup rules.
+            max_words: The maximum number of words to return.
+            markers: The compiled reply markers.
+
+        Returns:
+        -------
+            The cache key.
+
+        """
+        digest = hashlib.sha256(rules.fingerprint.encode())
+        for part in (str(max_words or 0), *markers.markers, text):
+            digest.update(b"\0")
+            digest.update(part.encode(errors="surrogatepass"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> str | None:
+        """
+        Get a prepared text from the cache.
+
+        Args:
+        ----
+            key: The cache key.
+
+        Returns:
+        -------
+            The prepared text, or None if it isn't cached.
+
+        """
+        body = self._load(key)
+        if body is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return body
+
+    def put(self, key: str, body: str) -> None:
+        """
+        Add a prepared text to the cache.
+
+        Args:
+        ----
+            key: The cache key.
+            body: The prepared text.
+
+        """
+        self._store(key, body)
+
+    def flush(self) -> None:
+        """Save any pending changes. The in memory cache has nothing to save."""
+
+    def _load(self, key: str) -> str | None:
+        body = self._entries.get(key)
+        if body is not None:
+            self._entries.move_to_end(key)
+        return body
+
+    def _store(self, key: str, body: str) -> None:
+        if len(body) > self.max_chars:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._chars -= len(previous)
+        self._entries[key] = body
+        self._chars += len(body)
+        while len(self._entries) > self.max_size or self._chars > self.max_chars:
+            _, evicted = self._entries.popitem(last=False)
+            self._chars -= len(evicted)
+
+
+class DiskPreparedTextCache(PreparedTextCache):
+    """
+    A prepared text cache stored in SQLite, so it can be shared between runs.
+
+    Processes can share the same file. The most recently used texts are also kept
+    in memory. The file isn't bounded, so delete it when it is no longer needed.
+    The cache can be handed to another thread, but only one thread can use it at
+    a time.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        max_size: int = 1000,
+        max_chars: int = PREPARED_TEXT_CACHE_CHARS,
+    ) -> None:
+        """
+        Open the cache, creating the file if needed.
+
+        Args:
+        ----
+            path: The path to the SQLite database.
+            max_size: The maximum number of prepared texts to keep in memory.
+            max_chars: The maximum total length of the prepared texts to keep in
+                memory. Longer texts are only stored in the database.
+
+        """
+        super().__init__(max_size, max_chars)
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS prepared_text (key TEXT PRIMARY KEY, body TEXT NOT NULL)"
+        )
+        self._db.commit()
+        self._pending = 0
+
+    def flush(self) -> None:
+        """Commit the texts added since the last commit."""
+        if self._pending:
+            self._db.commit()
+            self._pending = 0
+
+    def close(self) -> None:
+        """Commit any pending texts and close the database."""
+        self.flush()
+        self._db.close()
+
+    def _load(self, key: str) -> str | None:
+        body = super()._load(key)
+        if body is not None:
+            return body
+        row = self._db.execute(
+            "SELECT body FROM prepared_text WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        super()._store(key, row[0])
+        return row[0]
+
+    def _store(self, key: str, body: str) -> None:
+        super()._store(key, body)
+        self._db.execute(
+            "INSERT OR REPLACE INTO prepared_text (key, body) VALUES (?, ?)",
+            (key, body),
+        )
+        self._pending += 1
+        if self._pending >= DISK_CACHE_COMMIT_SIZE:
+            self.flush()
+
+
+@cache
+def prepared_text_cache() -> PreparedTextCache | None:
+    """
+    Get the prepared text cache for this container.
+
+    Returns
+    -------
+        The cache, or None if PREPARED_TEXT_CACHE_SIZE is 0.
+
+    """
+    if PREPARED_TEXT_CACHE_SIZE <= 0:
+        return None
+    return PreparedTextCache(PREPARED_TEXT_CACHE_SIZE)
+
+
+def prepare_text(
+    text: str,
+    rules: TextCleanupRules | list[dict[str, str]],
+    max_words: int | None = None,
+    markers: ReplyMarkers | None = None,
+    cache: PreparedTextCache | None = None,
+) -> str:
     """
     Prepare text for training, inference, and/or vectorisation.
 
+    The thread history is cut off first, as on email tickets it is often most of
+    the text and would otherwise be cleaned only to dilute the embeddings.
+
+    When `max_words` is set the text is prepared a line at a time, and we stop once
+    the cleaned text has enough words. Long forwarded email chains are mostly
+    thrown away downstream, so there is no point cleaning all of it.
+
     Args:
     ----
         text: The ticket title and body as a single string.
-        rules: A list of text cleanup rules.
+        rules: The compiled text cleanup rules, or a list of rules to compile.
+        max_words: The maximum number of words to return. None or 0 returns all
+            of them.
+        markers: The compiled reply markers. Defaults to the rules' markers.
+        cache: Where to look for the text before preparing it, and to store it
+            after.
 
     Returns:
     -------
         The processed string.
 
     """
-    # Reusing the text variable saves a bit of memory
-    text = text.lower()
-    text = contractions.fix(text)
-    text = strip_bad_lines(text)
+    if not isinstance(rules, TextCleanupRules):
+        rules = TextCleanupRules(rules)
 
-    for rule in rules:
-        text = re.sub(rule["pattern"], rule["replace"], text)
+    markers = markers or rules.markers
+
+    if cache is not None:
+        key = cache.key(text, rules, max_words, markers)
+        body = cache.get(key)
+        if body is None:
+            body = prepare_text(text, rules, max_words, markers)
+            cache.put(key, body)
+        return body
+
+    if not max_words:
+        # Reusing the text variable saves a bit of memory
+        text = text.lower()
+        text = markers.strip_history(text)
+        text = contraction_expander().expand(text)
+        text = strip_bad_lines(text, rules.excluded_line_prefixes)
+        return rules.apply(text)
+
+    text = markers.strip_history(text)
+    expander = contraction_expander()
+    lines: list[str] = []
+    words = 0
+    # The rules can drop or split words, so the word count of the lines is only an
+    # estimate. Double it each time the cleaned text comes up short so we don't
+    # clean the same lines too many times.
+    check_at = max_words
+    for line in good_lines(
+        text,
+        lambda line: expander.expand(line.lower()),
+        rules.excluded_line_prefixes,
+    ):
+        lines.append(line)
+        words += len(line.split())
+        if words < check_at:
+            continue
+        cleaned = truncate_words(rules.apply(" ".join(lines)), max_words)
+        if cleaned is not None:
+            return cleaned
+        check_at = words * 2
 
-    return text
+    cleaned = rules.apply(" ".join(lines))
+    return truncate_words(cleaned, max_words) or cleaned
 
 
-def strip_bad_lines(in_text: str) -> str:
+def truncate_words(text: str, max_words: int) -> str | None:
+    """
+    Cut the text off after a number of words.
+
+    Args:
+    ----
+        text: The text to truncate.
+        max_words: The number of words to keep.
+
+    Returns:
+    -------
+        The truncated text, or None if the text has fewer words.
+
+    """
+    last = next(
+        itertools.islice(WORD_PATTERN.finditer(text), max_words - 1, None), None
+    )
+    return None if last is None else text[: last.end()]
+
+
+def prepare_texts(
+    texts: list[str | dict[str, Any]],
+    rules: TextCleanupRules,
+    max_words: int | None = None,
+    cache: PreparedTextCache | None = None,
+) -> list[dict[str, Any]]:
+    """
+    Prepare a batch of texts.
+
+    Each item is either a string or an object with a `text` property and an
+    optional `id`. Items without an `id` are identified by their position.
+
+    Args:
+    ----
+        texts: The texts to prepare.
+        rules: The compiled text cleanup rules.
+        max_words: The maximum number of words to return for each item.
+        cache: The prepared text cache.
+
+    Returns:
+    -------
+        The result for each item, with the processed string in `body`, or an
+        `error` if the item isn't valid.
+
+    """
+    results: list[dict[str, Any]] = []
+    for index, item in enumerate(texts):
+        if isinstance(item, dict):
+            item_id, text = item.get("id", index), item.get("text")
+        else:
+            item_id, text = index, item
+
+        if isinstance(text, str):
+            results.append(
+                {
+                    "id": item_id,
+                    "body": prepare_text(text, rules, max_words, cache=cache),
+                }
+            )
+        else:
+            logger.warning("Invalid text in batch", extra={"id": item_id})
+            results.append({"id": item_id, "error": "Property `text` must be a string"})
+
+    return results
+
+
+def strip_bad_lines(
+    in_text: str, excluded_line_prefixes: tuple[str, ...] = EXCLUDED_LINE_PREFIXES
+) -> str:
     """
     Remove lines that are repetive and/or add no value to the dataset.
 
     Args:
     ----
         in_text: The text to clean.
+        excluded_line_prefixes: Lines starting with these are removed.
 
     Returns:
     -------
         The cleaned text.
 
     """
-    out_text = []
+    return " ".join(good_lines(in_text, excluded_line_prefixes=excluded_line_prefixes))
+
+
+def good_lines(
+    in_text: str,
+    transform: Callable[[str], str] | None = None,
+    excluded_line_prefixes: tuple[str, ...] = EXCLUDED_LINE_PREFIXES,
+) -> Iterator[str]:
+    """
+    Yield the lines that aren't removed by `strip_bad_lines`, one at a time.
+
+    Args:
+    ----
+        in_text: The text to clean.
+        transform: A function applied to each line before it is checked.
+        excluded_line_prefixes: Lines starting with these are removed.
 
-    for line in in_text.splitlines():
+    Yields:
+    ------
+        The stripped lines.
+
+    """
+    for match in LINE_PATTERN.finditer(in_text):
+        line = match[0] if transform is None else transform(match[0])
         stripped = line.strip()
-        if not stripped or stripped.startswith(EXCLUDED_LINE_PREFIXES):
-            continue
-        out_text.append(stripped)
+        if stripped and not stripped.startswith(excluded_line_prefixes):
+            yield stripped
 
-    return " ".join(out_text)
 
+def truncate_for_log(value: object) -> object:
+    """
+    Shorten the long strings in a value before it is logged.
 
-@logger.inject_lambda_context(log_event=True)
+    Args:
+    ----
+        value: The value to shorten. Dicts and lists are shortened recursively.
+
+    Returns:
+    -------
+        The shortened value.
+
+    """
+    if isinstance(value, str) and len(value) > LOG_FIELD_LENGTH:
+        return f"{value[:LOG_FIELD_LENGTH]}... ({len(value)} characters)"
+    if isinstance(value, dict):
+        return {key: truncate_for_log(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [truncate_for_log(item) for item in value]
+    return value
+
+
+@logger.inject_lambda_context
 def handler(event: dict, _: LambdaContext) -> dict[str, Any]:
     """
     Clean up the ticket text for inference and vectorisation.
 
+    The event contains either a single `text`, or a list of `texts` which are
+    prepared in a single invocation. See `prepare_texts` for the batch format.
+    `max_words` overrides the `MAX_WORDS` environment variable for the request.
+
     Args:
     ----
         event: Event payload.
@@ -127,27 +1078,63 @@ def handler(event: dict, _: LambdaContext) -> dict[str, Any]:
         str: JSON response.
 
     """
-    if "text" not in event:
-        logger.error("No text in event")
+    if "texts" in event:
+        if not isinstance(event["texts"], list):
+            logger.error("Texts isn't a list", extra={"event": truncate_for_log(event)})
+            raise TypeError("Property `texts` must be a list")  # noqa TRY003 We need an error message
+    elif "text" not in event:
+        logger.error("No text in event", extra={"event": truncate_for_log(event)})
         raise AttributeError(  # noqa TRY003 We need an error message
             "Property `text` not in event", obj="event", name="text"
         )
 
-    text = event["text"]
-    logger.debug("Text: %s", text)
+    if random.random() < LOG_EVENT_SAMPLE_RATE:  # noqa S311 Not a cryptographic function
+        logger.info("Event received", extra={"event": truncate_for_log(event)})
+
+    max_words = event.get("max_words", MAX_WORDS)
+    if not isinstance(max_words, int) or max_words < 0:
+        logger.error("Invalid max words", extra={"event": truncate_for_log(event)})
+        raise ValueError("Property `max_words` must be a non-negative integer")  # noqa TRY003 We need an error message
 
-    rules = load_text_cleanup_rules()
-    logger.debug("Text cleanup rules: %s", rules)
+    rules = current_text_cleanup_rules()
+    logger.debug("Text cleanup rules %s: %s", rules.version, rules.rules)
+    cache = prepared_text_cache()
+
+    try:
+        body: str | list[dict[str, Any]] = (
+            prepare_texts(event["texts"], rules, max_words, cache)
+            if "texts" in event
+            else prepare_text(event["text"], rules, max_words, cache=cache)
+        )
+    except Exception:
+        logger.exception(
+            "Unable to prepare text", extra={"event": truncate_for_log(event)}
+        )
+        raise
 
-    cleaned_text = prepare_text(text, rules)
-    logger.info("Returned %d characters of text", len(cleaned_text))
-    logger.debug("Cleaned text: %s", cleaned_text)
+    # The cache counters are for the life of the container.
+    cache_stats = (
+        {}
+        if cache is None
+        else {"cache_hits": cache.hits, "cache_misses": cache.misses}
+    )
+    if isinstance(body, list):
+        logger.info(
+            "Returned %d texts",
+            len(body),
+            extra={"errors": sum("error" in result for result in body), **cache_stats},
+        )
+    else:
+        logger.info(
+            "Returned %d characters of text",
+            len(body),
+            extra={"text_length": len(event["text"]), **cache_stats},
+        )
+        logger.debug("Cleaned text: %s", truncate_for_log(body))
 
-    response = {
-        "body": cleaned_text,
+    return {
+        "body": body,
         "headers": {},  # Headers aren't important
+        "rulesVersion": rules.version,
         "statusCode": 200,
     }
-    logger.debug("Response: %s", response)
-
-    return response
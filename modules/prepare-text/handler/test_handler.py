@@ -4,13 +4,23 @@ __author__ = "Dave Hall <me@davehall.com.au>"
 __copyright__ = "Copyright 2024, 2025, Skwashd Services Pty Ltd https://davehall.com.au"
 __license__ = "MIT"
 
+import importlib
+import io
+import json
+import pathlib
+import re
+import typing
 import uuid
 
+import contractions
 import pytest
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
 import handler
 
+# The package exports the handler function under the same name as the module.
+handler_module = importlib.import_module("handler.handler")
+
 
 @pytest.fixture
 def lambda_context() -> LambdaContext:
@@ -29,6 +39,18 @@ def lambda_context() -> LambdaContext:
     return mock_context
 
 
+@pytest.fixture
+def logs(monkeypatch: pytest.MonkeyPatch) -> typing.Callable[[], list[dict]]:
+    """Capture the log entries written after the fixture is used."""
+    stream = io.StringIO()
+    monkeypatch.setattr(handler_module.logger.registered_handler, "stream", stream)
+
+    def entries() -> list[dict]:
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    return entries
+
+
 @pytest.mark.parametrize(
     ("input", "expected"),
     [
@@ -57,6 +79,7 @@ def test_handler(lambda_context: LambdaContext, input: str, expected: str) -> No
     assert response == {
         "body": expected,
         "headers": {},
+        "rulesVersion": "builtin",
         "statusCode": 200,
     }
 
@@ -89,3 +112,506 @@ def test_prepare_text_custom_rules() -> None:
     assert (
         cleaned_text == "here is my text to prepare let me know wotcha think, alright?"
     )
+
+
+def test_handler_logs_summary(
+    lambda_context: LambdaContext,
+    monkeypatch: pytest.MonkeyPatch,
+    logs: typing.Callable[[], list[dict]],
+) -> None:
+    """Test only the text length is logged when the event isn't sampled."""
+    monkeypatch.setattr(handler_module, "LOG_EVENT_SAMPLE_RATE", 0)
+    handler.handler({"text": "My password is hunter2"}, lambda_context)
+
+    (entry,) = logs()
+    assert entry["text_length"] == 22
+    assert "hunter2" not in json.dumps(entry)
+
+
+def test_handler_logs_sampled_event(
+    lambda_context: LambdaContext,
+    monkeypatch: pytest.MonkeyPatch,
+    logs: typing.Callable[[], list[dict]],
+) -> None:
+    """Test long text is shortened when a sampled event is logged."""
+    monkeypatch.setattr(handler_module, "LOG_EVENT_SAMPLE_RATE", 1)
+    monkeypatch.setattr(handler_module, "LOG_FIELD_LENGTH", 10)
+    handler.handler({"text": "This is a long ticket body"}, lambda_context)
+
+    received = logs()[0]
+    assert received["event"] == {"text": "This is a ... (26 characters)"}
+
+
+def test_handler_logs_event_on_error(
+    lambda_context: LambdaContext,
+    monkeypatch: pytest.MonkeyPatch,
+    logs: typing.Callable[[], list[dict]],
+) -> None:
+    """Test the event is logged when the text can't be prepared."""
+    monkeypatch.setattr(handler_module, "LOG_EVENT_SAMPLE_RATE", 0)
+    with pytest.raises(AttributeError):
+        handler.handler({"text": None}, lambda_context)
+
+    (entry,) = logs()
+    assert entry["level"] == "ERROR"
+    assert entry["event"] == {"text": None}
+
+
+def test_fuse_text_cleanup_rules() -> None:
+    """Test stripping characters and collapsing whitespace are fused."""
+    rules = handler.fuse_text_cleanup_rules(handler.load_text_cleanup_rules())
+    assert len(rules) == 3
+    assert rules[-1] == {"pattern": "[^a-z0-9?.!]+", "replace": " "}
+
+
+@pytest.mark.parametrize(
+    "rules",
+    [
+        # The class allows whitespace other than a space
+        [
+            {"pattern": r"[^a-z\t ]+", "replace": " "},
+            {"pattern": r"\s+", "replace": " "},
+        ],
+        # The characters aren't replaced with a space
+        [
+            {"pattern": r"[^a-z ]+", "replace": ""},
+            {"pattern": r"\s+", "replace": " "},
+        ],
+        # The class doesn't allow spaces
+        [
+            {"pattern": r"[^a-z]+", "replace": " "},
+            {"pattern": r"\s+", "replace": " "},
+        ],
+    ],
+)
+def test_fuse_text_cleanup_rules_unsafe(rules: list[dict[str, str]]) -> None:
+    """Test rules are left alone when fusing them would change the output."""
+    assert handler.fuse_text_cleanup_rules(rules) == rules
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "re: can't login",
+        "[external] fwd: see https://urldefense.com/v3/__https://gata.works__;!!abc$ now",
+        "tabs\tand non\u00a0breaking\u3000spaces   everywhere",
+        "ünïcödé — “quotes” and emoji 🎉!!",
+        "",
+    ],
+)
+def test_text_cleanup_rules_match_sequential(text: str) -> None:
+    """Test the compiled rules produce the same output as applying each rule."""
+    rules = handler.load_text_cleanup_rules()
+    expected = text
+    for rule in rules:
+        expected = re.sub(rule["pattern"], rule["replace"], expected)
+
+    assert handler.TextCleanupRules(rules).apply(text) == expected
+
+
+def test_text_cleanup_rules_cached() -> None:
+    """Test the rules are only compiled once per container."""
+    assert handler.text_cleanup_rules() is handler.text_cleanup_rules()
+
+
+def test_contraction_expander_matches_fix() -> None:
+    """Test the expander produces the same output as contractions.fix."""
+    expander = handler.contraction_expander()
+    for key in expander.contractions:
+        for text in (f"so {key} then", f"{key.upper()}!", f"({key.title()})"):
+            assert expander.expand(text) == contractions.fix(text), text
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "I'm sure we'll be fine, but y'all shouldn't've waited til jan.",
+        "cant login, pls help asap. ur site's been down since mon",
+        "Couldn\u2019t open the file. DON'T close the ticket!",
+        "the cause of the outage is unknown, r u sure?",
+        "no contractions here",
+        "",
+    ],
+)
+def test_contraction_expander_sentences(text: str) -> None:
+    """Test the expander matches contractions.fix on ticket like sentences."""
+    expander = handler.contraction_expander()
+    assert expander.expand(text) == contractions.fix(text)
+    assert expander.expand(text.lower()) == contractions.fix(text.lower())
+
+
+def test_contraction_expander_case() -> None:
+    """Test the case of the contraction is applied to the expansion."""
+    expander = handler.ContractionExpander({"can't": "cannot", "idk": "I do not know"})
+    assert (
+        expander.expand("can't Can't CAN'T idk IDK")
+        == "cannot Cannot CANNOT i do not know I DO NOT KNOW"
+    )
+
+
+def test_contraction_expander_whole_words() -> None:
+    """Test contractions inside other words aren't expanded."""
+    expander = handler.ContractionExpander({"u": "you"})
+    assert expander.expand("u run_u u2 u.") == "you run_u u2 you."
+
+
+def test_handler_batch(lambda_context: LambdaContext) -> None:
+    """Test preparing a batch of texts in a single invocation."""
+    event = {
+        "texts": [
+            {"id": "subject", "text": "RE: I can't log in"},
+            {"id": "description", "text": "Hi,\n\nIt's broken.\n\nRegards,\nJane"},
+        ]
+    }
+    response = handler.handler(event, lambda_context)
+    assert response == {
+        "body": [
+            {"id": "subject", "body": "i cannot log in"},
+            {"id": "description", "body": "hi it is broken. jane"},
+        ],
+        "headers": {},
+        "rulesVersion": "builtin",
+        "statusCode": 200,
+    }
+
+
+def test_handler_batch_strings(lambda_context: LambdaContext) -> None:
+    """Test texts without an id are identified by their position."""
+    response = handler.handler({"texts": ["I'm here", "", "Bye"]}, lambda_context)
+    assert response["body"] == [
+        {"id": 0, "body": "i am here"},
+        {"id": 1, "body": ""},
+        {"id": 2, "body": "bye"},
+    ]
+
+
+def test_handler_batch_invalid_item(lambda_context: LambdaContext) -> None:
+    """Test an invalid item doesn't stop the rest of the batch."""
+    event = {"texts": [{"id": "subject", "text": None}, {"id": "body", "text": "Hi"}]}
+    response = handler.handler(event, lambda_context)
+    assert response["body"] == [
+        {"id": "subject", "error": "Property `text` must be a string"},
+        {"id": "body", "body": "hi"},
+    ]
+
+
+def test_handler_batch_not_a_list(lambda_context: LambdaContext) -> None:
+    """Test the batch must be a list."""
+    with pytest.raises(TypeError):
+        handler.handler({"texts": "I'm not a list"}, lambda_context)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "I'm a test",
+        "[EXTERNAL] Re: Can't log in\n\nHi,\r\nIt's broken!!\n-- \nJane\n\n" * 20,
+        "----\n====\n" * 50 + "finally some words here",
+        "\u00dcn\u00efc\u00f6d\u00e9 line\u2028breaks\x85and\fmore\vlines",
+    ],
+)
+@pytest.mark.parametrize("max_words", [1, 3, 10, 1000])
+def test_prepare_text_max_words(text: str, max_words: int) -> None:
+    """Test the word budget returns the start of the fully prepared text."""
+    rules = handler.text_cleanup_rules()
+    full = handler.prepare_text(text, rules)
+    truncated = handler.prepare_text(text, rules, max_words)
+    assert full.startswith(truncated)
+    assert truncated.split() == full.split()[:max_words]
+
+
+def test_prepare_text_max_words_stops_early(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test lines after the word budget aren't prepared."""
+    expander = handler.contraction_expander()
+    prepared = []
+
+    class CountingExpander:
+        def expand(self, text: str) -> str:
+            prepared.append(text)
+            return expander.expand(text)
+
+    monkeypatch.setattr(handler_module, "contraction_expander", CountingExpander)
+    text = "\n".join(f"line {number}" for number in range(1000))
+    rules = handler.text_cleanup_rules()
+    assert handler.prepare_text(text, rules, 5) == "line 0 line 1 line"
+    assert len(prepared) == 3
+
+
+def test_handler_max_words(lambda_context: LambdaContext) -> None:
+    """Test the word budget can be set for a request."""
+    event = {"text": "One two three four", "max_words": 2}
+    response = handler.handler(event, lambda_context)
+    assert response["body"] == "one two"
+
+
+def test_handler_max_words_default(
+    lambda_context: LambdaContext, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test the word budget defaults to the environment setting."""
+    monkeypatch.setattr(handler_module, "MAX_WORDS", 3)
+    response = handler.handler({"texts": ["One two three four"]}, lambda_context)
+    assert response["body"] == [{"id": 0, "body": "one two three"}]
+
+
+@pytest.mark.parametrize("max_words", [-1, "10", 1.5])
+def test_handler_max_words_invalid(
+    lambda_context: LambdaContext, max_words: object
+) -> None:
+    """Test the word budget must be a non-negative integer."""
+    with pytest.raises(ValueError, match="max_words"):
+        handler.handler({"text": "Hi", "max_words": max_words}, lambda_context)
+
+
+@pytest.mark.parametrize(
+    ("text", "expected"),
+    [
+        # Gmail, with the attribution wrapped onto a second line
+        (
+            "Still broken\n\nOn Mon, 1 Jan 2024 at 10:00, Jane Citizen <\n"
+            "jane@example.com> wrote:\n> Have you tried turning it off?",
+            "Still broken\n\n",
+        ),
+        ("Still broken\n> Have you tried turning it off?", "Still broken\n"),
+        ("Help\n-----Original Message-----\nFrom: IT", "Help\n"),
+        ("Help\n\nFrom: IT\r\nSent: Monday\r\nTo: Jane", "Help\n\n"),
+        ("Help\n________________________________\nFrom: IT", "Help\n"),
+        ("Please fix\n\nSent from my iPhone", "Please fix\n\n"),
+        (
+            "Please fix\nThis email and any attachments are confidential.",
+            "Please fix\n",
+        ),
+        (
+            "Please fix\nIf you are not the intended recipient, delete it.",
+            "Please fix\n",
+        ),
+        # Markers in the middle of a line are left alone
+        ("On Monday I wrote: my password", "On Monday I wrote: my password"),
+        ("Use a => b", "Use a => b"),
+    ],
+)
+def test_strip_history(text: str, expected: str) -> None:
+    """Test the thread history is cut off at the first reply marker."""
+    assert handler.reply_markers().strip_history(text) == expected
+
+
+def test_strip_history_forwarded() -> None:
+    """Test a forwarded email is kept when there is nothing before it."""
+    text = (
+        "-----Original Message-----\nFrom: Jane\nSent: Monday\n\nI can't log in\n"
+        "\nOn Sunday IT wrote:\n> Try again"
+    )
+    assert handler.reply_markers().strip_history(text) == text[: text.index("On")]
+
+
+def test_strip_history_custom_markers() -> None:
+    """Test the reply markers can be configured."""
+    markers = handler.ReplyMarkers([r"#+ reply above this line #+"])
+    text = "Thanks\n## Reply above this line ##\nYour ticket\nOn Monday IT wrote:"
+    assert markers.strip_history(text) == "Thanks\n"
+    assert handler.ReplyMarkers([]).strip_history(text) == text
+    assert (
+        handler.prepare_text(text, handler.text_cleanup_rules(), markers=markers)
+        == "thanks"
+    )
+
+
+@pytest.mark.parametrize("max_words", [None, 100])
+def test_prepare_text_strips_history(max_words: int | None) -> None:
+    """Test prepare_text removes the thread history."""
+    text = "I can't log in\n\nOn Monday IT wrote:\n> Try again"
+    assert (
+        handler.prepare_text(text, handler.text_cleanup_rules(), max_words)
+        == "i cannot log in"
+    )
+
+
+@pytest.fixture
+def ssm_rules(monkeypatch: pytest.MonkeyPatch) -> dict[str, typing.Any]:
+    """Serve the text cleanup rules from a fake SSM parameter."""
+    from aws_lambda_powertools.utilities import parameters
+    from aws_lambda_powertools.utilities.parameters.exceptions import (
+        GetParameterError,
+    )
+
+    param: dict[str, typing.Any] = {"value": "{}", "calls": []}
+
+    def get_parameter(name: str, max_age: int | None = None) -> str:
+        param["calls"].append((name, max_age))
+        if param["value"] is None:
+            raise GetParameterError(name)
+        return param["value"]
+
+    monkeypatch.setattr(parameters, "get_parameter", get_parameter)
+    monkeypatch.setattr(handler_module, "TEXT_CLEANUP_RULES_PARAM", "/gata/test/rules")
+    monkeypatch.setattr(handler_module, "LOADED_RULES", {})
+    monkeypatch.setattr(handler_module, "REJECTED_RULES", set())
+    return param
+
+
+def test_ssm_rules(
+    lambda_context: LambdaContext, ssm_rules: dict[str, typing.Any]
+) -> None:
+    """Test the rules, prefixes and markers are loaded from SSM."""
+    ssm_rules["value"] = json.dumps(
+        {
+            "version": "v2",
+            "rules": [{"pattern": "[0-9]+", "replace": "#"}],
+            "excluded_line_prefixes": ["Ticket:"],
+            "reply_markers": ["-- reply above --"],
+        }
+    )
+    text = "Ticket: 123\nCall 555 1234\n-- Reply above --\nOld"
+    response = handler.handler({"text": text}, lambda_context)
+    assert response["body"] == "call # #"
+    assert response["rulesVersion"] == "v2"
+    assert ssm_rules["calls"] == [
+        ("/gata/test/rules", handler_module.TEXT_CLEANUP_RULES_TTL)
+    ]
+
+
+def test_ssm_rules_defaults(ssm_rules: dict[str, typing.Any]) -> None:
+    """Test the built in values are used for anything the parameter doesn't set."""
+    rules = handler.current_text_cleanup_rules()
+    assert rules.rules == handler.text_cleanup_rules().rules
+    assert rules.excluded_line_prefixes == handler_module.EXCLUDED_LINE_PREFIXES
+    assert rules.markers is handler.reply_markers()
+    # Without a version property the version is a hash of the value.
+    assert re.fullmatch("[0-9a-f]{12}", rules.version)
+
+
+def test_ssm_rules_compiled_once(ssm_rules: dict[str, typing.Any]) -> None:
+    """Test the rules are only compiled again when the parameter changes."""
+    first = handler.current_text_cleanup_rules()
+    assert handler.current_text_cleanup_rules() is first
+
+    ssm_rules["value"] = '{"version": "v3"}'
+    second = handler.current_text_cleanup_rules()
+    assert second is not first
+    assert second.version == "v3"
+    assert handler.current_text_cleanup_rules() is second
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "not json",
+        "[]",
+        '{"rules": {}}',
+        '{"rules": [{"pattern": "a"}]}',
+        '{"rules": [{"pattern": "(", "replace": ""}]}',
+        '{"rules": [{"pattern": "(a)", "replace": "\\\\2"}]}',
+        '{"excluded_line_prefixes": "cc: "}',
+        '{"excluded_line_prefixes": [""]}',
+        '{"reply_markers": ["[a-"]}',
+    ],
+)
+def test_ssm_rules_rejected(
+    ssm_rules: dict[str, typing.Any],
+    logs: typing.Callable[[], list[dict]],
+    value: str,
+) -> None:
+    """Test invalid rules are rejected and the last good rules are kept."""
+    ssm_rules["value"] = '{"version": "good"}'
+    good = handler.current_text_cleanup_rules()
+
+    ssm_rules["value"] = value
+    assert handler.current_text_cleanup_rules() is good
+    assert handler.current_text_cleanup_rules() is good
+
+    (entry,) = (entry for entry in logs() if entry["level"] == "ERROR")
+    assert entry["message"].startswith("Rejected text cleanup rules")
+    assert entry["version"] == "good"
+
+
+def test_ssm_rules_rejected_on_cold_start(ssm_rules: dict[str, typing.Any]) -> None:
+    """Test the built in rules are used when the parameter has never been valid."""
+    ssm_rules["value"] = "not json"
+    assert handler.current_text_cleanup_rules() is handler.text_cleanup_rules()
+
+
+def test_ssm_rules_fetch_error(ssm_rules: dict[str, typing.Any]) -> None:
+    """Test the last good rules are used when the parameter can't be fetched."""
+    ssm_rules["value"] = '{"version": "good"}'
+    good = handler.current_text_cleanup_rules()
+
+    ssm_rules["value"] = None
+    assert handler.current_text_cleanup_rules() is good
+
+
+def test_prepared_text_cache() -> None:
+    """Test prepared texts are cached and the least recently used are dropped."""
+    rules = handler.text_cleanup_rules()
+    cache = handler.PreparedTextCache(2)
+    for text in ("I'm one", "I'm two", "I'm one", "I'm three", "I'm two"):
+        handler.prepare_text(text, rules, cache=cache)
+    # "I'm two" was dropped when "I'm three" was added, as "I'm one" had been used.
+    assert (cache.hits, cache.misses) == (1, 4)
+    assert handler.prepare_text("I'm one", rules, cache=cache) == "i am one"
+    assert cache.misses == 5
+
+
+def test_prepared_text_cache_max_chars() -> None:
+    """Test the cache drops texts to stay under its length limit."""
+    cache = handler.PreparedTextCache(10, max_chars=10)
+    cache.put("a", "12345")
+    cache.put("b", "12345")
+    cache.put("c", "12345678901")
+    assert cache.get("c") is None
+    assert (cache.get("a"), cache.get("b")) == ("12345", "12345")
+
+    cache.put("c", "123")
+    assert cache.get("a") is None
+    assert (cache.get("b"), cache.get("c")) == ("12345", "123")
+
+    cache.put("b", "1")
+    cache.put("d", "123456")
+    assert (cache.get("b"), cache.get("c"), cache.get("d")) == ("1", "123", "123456")
+
+
+def test_prepared_text_cache_key() -> None:
+    """Test the cache key changes with anything that changes the prepared text."""
+    rules = handler.text_cleanup_rules()
+    markers = handler.reply_markers()
+    key = handler.PreparedTextCache.key("Hi", rules, None, markers)
+    assert key == handler.PreparedTextCache.key("Hi", rules, 0, markers)
+    assert key != handler.PreparedTextCache.key("hi", rules, None, markers)
+    assert key != handler.PreparedTextCache.key("Hi", rules, 10, markers)
+    assert key != handler.PreparedTextCache.key(
+        "Hi", handler.TextCleanupRules([]), None, markers
+    )
+    assert key != handler.PreparedTextCache.key(
+        "Hi", rules, None, handler.ReplyMarkers([])
+    )
+
+
+def test_disk_prepared_text_cache(tmp_path: pathlib.Path) -> None:
+    """Test the on disk cache is shared between instances."""
+    rules = handler.text_cleanup_rules()
+    path = tmp_path / "prepared.db"
+    first = handler.DiskPreparedTextCache(path, max_size=0)
+    assert handler.prepare_text("I'm cached", rules, cache=first) == "i am cached"
+    first.close()
+
+    second = handler.DiskPreparedTextCache(path)
+    key = second.key("I'm cached", rules, None, rules.markers)
+    assert second.get(key) == "i am cached"
+    assert (second.hits, second.misses) == (1, 0)
+    second.close()
+
+
+def test_handler_cache(
+    lambda_context: LambdaContext,
+    monkeypatch: pytest.MonkeyPatch,
+    logs: typing.Callable[[], list[dict]],
+) -> None:
+    """Test the handler caches prepared texts and logs the counters."""
+    cache = handler.PreparedTextCache(10)
+    monkeypatch.setattr(handler_module, "prepared_text_cache", lambda: cache)
+    event = {"texts": ["ALERT: disk full on db1", "ALERT: disk full on db1"]}
+    response = handler.handler(event, lambda_context)
+    assert [result["body"] for result in response["body"]] == [
+        "alert disk full on db1"
+    ] * 2
+
+    (entry,) = (entry for entry in logs() if entry["message"] == "Returned 2 texts")
+    assert (entry["cache_hits"], entry["cache_misses"]) == (1, 1)
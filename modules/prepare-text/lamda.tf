@@ -57,6 +57,16 @@ resource "aws_lambda_function" "this" {
     var.lambda_powertools_arn,
   ]
 
+  environment {
+    variables = {
+      LOG_EVENT_SAMPLE_RATE    = var.log_event_sample_rate
+      MAX_WORDS                = var.max_words
+      PREPARED_TEXT_CACHE_SIZE = var.prepared_text_cache_size
+      TEXT_CLEANUP_RULES_PARAM = var.text_cleanup_rules
+      TEXT_CLEANUP_RULES_TTL   = var.text_cleanup_rules_ttl
+    }
+  }
+
   tracing_config {
     mode = "Active"
   }
@@ -114,6 +124,20 @@ data "aws_iam_policy_document" "lambda" {
 
     resources = ["*"]
   }
+
+  dynamic "statement" {
+    for_each = var.text_cleanup_rules != "" ? [var.text_cleanup_rules] : []
+
+    content {
+      actions = [
+        "ssm:GetParameter",
+      ]
+
+      resources = [
+        provider::aws::arn_build(data.aws_partition.current.partition, "ssm", data.aws_region.current.name, data.aws_caller_identity.current.account_id, "parameter${statement.value}"),
+      ]
+    }
+  }
 }
 
 resource "aws_iam_policy" "lambda" {
@@ -1,3 +1,7 @@
 # Copyright 2024, 2025 Dave Hall, Skwashd Services https://gata.works, MIT License
 
 data "aws_caller_identity" "current" {}
+
+data "aws_partition" "current" {}
+
+data "aws_region" "current" {}
@@ -10,6 +10,34 @@ variable "lambda_powertools_arn" {
   description = "ARN of the AWS Lambda Powertools Lambda layer"
 }
 
+variable "log_event_sample_rate" {
+  description = "Fraction of Lambda invocations that log the full event. Events are always logged when processing fails."
+  type        = number
+  default     = 0.01
+}
+
+variable "max_words" {
+  description = "Stop preparing text once it has this many words. The models only use the start of the text. 0 prepares all of it."
+  type        = number
+  default     = 0
+
+  validation {
+    condition     = var.max_words >= 0 && floor(var.max_words) == var.max_words
+    error_message = "The maximum number of words must be a whole number that is 0 or more."
+  }
+}
+
+variable "prepared_text_cache_size" {
+  description = "Number of prepared texts each Lambda container keeps, so repeated alert tickets aren't prepared again. 0 turns the cache off."
+  type        = number
+  default     = 1000
+
+  validation {
+    condition     = var.prepared_text_cache_size >= 0 && floor(var.prepared_text_cache_size) == var.prepared_text_cache_size
+    error_message = "The cache size must be a whole number that is 0 or more."
+  }
+}
+
 variable "role_namespace" {
   description = "Namespace/prefix for the Lambda execution role"
   type        = string
@@ -22,6 +50,18 @@ variable "role_permissions_boundary" {
   default     = null
 }
 
+variable "text_cleanup_rules" {
+  description = "Name of the SSM parameter containing the text cleanup rules, excluded line prefixes and reply markers. The built in ones are used when this isn't set."
+  type        = string
+  default     = ""
+}
+
+variable "text_cleanup_rules_ttl" {
+  description = "Number of seconds the text cleanup rules are cached before they are fetched from SSM again"
+  type        = number
+  default     = 300
+}
+
 variable "tags" {
   description = "Tags to apply to all resources"
   type        = map(string)
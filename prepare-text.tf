@@ -7,6 +7,12 @@ module "prepare_text" {
 
   lambda_powertools_arn = local.lambda_powertools_arn
 
+  log_event_sample_rate = var.log_event_sample_rate
+
+  max_words = var.prepare_text_max_words
+
+  text_cleanup_rules = aws_ssm_parameter.text_cleanup_rules.name
+
   role_namespace            = var.role_namespace
   role_permissions_boundary = local.permissions_boundary
 
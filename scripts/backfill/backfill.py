@@ -5,16 +5,25 @@ __author__ = "Dave Hall <me@davehall.com.au>"
 __copyright__ = "Copyright 2025 - 2026, Skwashd Services Pty Ltd https://gata.works"
 __license__ = "MIT"
 
+import array
+import dataclasses
 import datetime
+import hashlib
 import json
 import logging
 import os
+import queue
+import re
+import sqlite3
+import tempfile
+import threading
 import time
-from collections.abc import Generator
-from typing import Any
+from collections.abc import Callable, Generator, Iterable, Sequence
+from typing import Any, NamedTuple
 
 import boto3
 import zenpy
+from botocore.exceptions import ClientError
 
 import handler
 
@@ -22,8 +31,10 @@ logging.basicConfig(level=logging.INFO)
 LOGGER = logging.getLogger(__name__)
 
 BEDROCK = boto3.client("bedrock-runtime")
+BEDROCK_JOBS = boto3.client("bedrock")
 COMPREHEND = boto3.client("comprehend")
 RDS = boto3.client("rds-data")
+S3 = boto3.client("s3")
 SECRETS = boto3.client("secretsmanager")
 SSM = boto3.client("ssm")
 
@@ -50,9 +61,72 @@ ZENDESK_CREDS = json.loads(
 SQL = """
 INSERT INTO ticket (id, processed_data, via_channel, probability, routed_by, created, initial_group_id, initial_group_id_mapped, closed, closed_group_id, closed_group_id_mapped, embedding)
 VALUES (:id, :processed_data, :via_channel::channel, 0.0, 'external'::router, :created, 0, 0, :closed, :closed_group_id::bigint, :closed_group_id_mapped::bigint, :embedding::vector)
+ON CONFLICT(id) DO UPDATE SET processed_data = :processed_data, closed = :closed, closed_group_id = :closed_group_id::bigint, closed_group_id_mapped = :closed_group_id_mapped::bigint, embedding = :embedding::vector
 """
 
-TEXT_CLEANUP_RULES = handler.load_text_cleanup_rules()
+# Threads for each stage that calls AWS. The threads spend nearly all of their
+# time waiting for a response, so there can be more of them than CPU cores.
+REDACT_WORKERS = int(os.environ.get("REDACT_WORKERS", "4"))
+EMBED_WORKERS = int(os.environ.get("EMBED_WORKERS", "8"))
+INSERT_WORKERS = int(os.environ.get("INSERT_WORKERS", "4"))
+# Tickets waiting for each stage. When a queue is full the stage before it waits,
+# so a slow stage holds back the export rather than filling up memory.
+QUEUE_SIZE = int(os.environ.get("QUEUE_SIZE", "32"))
+# Tickets are inserted in batches, once there are INSERT_BATCH_SIZE of them or the
+# oldest has waited INSERT_BATCH_SECONDS.
+INSERT_BATCH_SIZE = int(os.environ.get("INSERT_BATCH_SIZE", "100"))
+INSERT_BATCH_SECONDS = float(os.environ.get("INSERT_BATCH_SECONDS", "2"))
+# The Data API rejects requests over 4 MiB. Leave room for the SQL and the rest of
+# the request. Each ticket is around 10 KB, most of it the embedding.
+INSERT_BATCH_BYTES = 3 * 1024 * 1024
+PROGRESS_INTERVAL = 100  # tickets
+
+EMBEDDING_MODEL_ID = "amazon.titan-embed-text-v2:0"
+EMBEDDING_DIMENSIONS = 1024
+# "sync" calls Comprehend or Bedrock for each ticket. "batch" sends the tickets to
+# asynchronous jobs, which are cheaper and aren't throttled, but take longer to run.
+REDACT_MODE = os.environ.get("REDACT_MODE", "sync")
+EMBED_MODE = os.environ.get("EMBED_MODE", "sync")
+for mode_var, mode in (("REDACT_MODE", REDACT_MODE), ("EMBED_MODE", EMBED_MODE)):
+    if mode not in ("sync", "batch"):
+        raise ValueError(f"{mode_var} must be sync or batch, not {mode}")  # noqa: TRY003 This is a simple script.
+if "batch" in (REDACT_MODE, EMBED_MODE):
+    BATCH_BUCKET = os.environ["BATCH_BUCKET"]
+if REDACT_MODE == "batch":
+    REDACT_BATCH_ROLE_ARN = os.environ["REDACT_BATCH_ROLE_ARN"]
+if EMBED_MODE == "batch":
+    EMBED_BATCH_ROLE_ARN = os.environ["EMBED_BATCH_ROLE_ARN"]
+BATCH_PREFIX = os.environ.get("BATCH_PREFIX", "backfill/")
+BATCH_POLL_SECONDS = float(os.environ.get("BATCH_POLL_SECONDS", "60"))
+# Tickets in each job, and the number of jobs running at once.
+REDACT_BATCH_SIZE = int(os.environ.get("REDACT_BATCH_SIZE", "10000"))
+REDACT_BATCH_JOBS = int(os.environ.get("REDACT_BATCH_JOBS", "2"))
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "10000"))
+EMBED_BATCH_JOBS = int(os.environ.get("EMBED_BATCH_JOBS", "2"))
+# Comprehend jobs take minutes to start, so it is quicker to redact small batches
+# one ticket at a time. Bedrock rejects batch inference jobs with fewer records.
+REDACT_BATCH_MIN_RECORDS = 100
+EMBED_BATCH_MIN_RECORDS = 100
+REDACT_BATCH_RUNNING = ("SUBMITTED", "IN_PROGRESS")
+EMBED_BATCH_RUNNING = ("Submitted", "Validating", "Scheduled", "InProgress")
+EMBED_BATCH_FINISHED = ("Completed", "PartiallyCompleted")
+# Comprehend jobs treat each line as a document. These are swapped for spaces,
+# which doesn't move any characters, so the offsets still match the ticket.
+LINE_BREAKS = re.compile(r"[\n\r\v\f\x1c-\x1e\x85\u2028\u2029]")
+
+TEXT_CLEANUP_RULES = handler.current_text_cleanup_rules()
+
+# Runs that are restarted, or backfill overlapping date ranges, can reuse the text
+# prepared by earlier runs.
+PREPARED_TEXT_CACHE = os.environ.get("PREPARED_TEXT_CACHE")
+TEXT_CACHE = (
+    handler.DiskPreparedTextCache(PREPARED_TEXT_CACHE) if PREPARED_TEXT_CACHE else None
+)
+# Reruns only send the texts that changed since the last run to Bedrock. Each
+# embedding takes around 4 KB.
+EMBEDDING_CACHE = os.environ.get("EMBEDDING_CACHE")
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", "250000"))
+EMBEDDING_CACHE_COMMIT_SIZE = 100
 
 
 ## DB FUNCTIONS ##
@@ -106,22 +180,48 @@ def db_query(query: str, parameters: list[dict[str, Any]]) -> list[dict[str, Any
     return response.get("records", [])
 
 
-def insert_ticket(ticket: zenpy.lib.api.Ticket) -> None:  # type: ignore[possibly-missing-attribute] Trust me, this will be set
+def db_batch_query(query: str, parameter_sets: list[list[dict[str, Any]]]) -> None:
+    """
+    Execute a query against the database once for each set of parameters.
+
+    Args:
+    ----
+        query: The SQL query to execute.
+        parameter_sets: The parameters for each execution of the SQL query.
+
+    """
+    RDS.batch_execute_statement(
+        secretArn=DB_SECRET_ARN,
+        database=DB_CONFIG["dbname"],
+        resourceArn=DB_CONFIG["cluster_arn"],
+        sql=query,
+        parameterSets=parameter_sets,
+    )
+
+
+def ticket_params(
+    ticket: zenpy.lib.api.Ticket,  # type: ignore[possibly-missing-attribute] Trust me, this will be set
+    text: str,
+    embedding: str,
+) -> list[dict[str, Any]]:
     """
-    Prepare data and insert a ticket record into the database.
+    Build the parameters used to insert a ticket record into the database.
 
     Args:
     ----
         ticket: The ticket to insert.
+        text: The prepared ticket text.
+        embedding: The embedding of the prepared text.
+
+    Returns:
+    -------
+        The parameters for the SQL query.
 
     """
     created_at = datetime.datetime.fromisoformat(ticket.created_at)
     updated_at = datetime.datetime.fromisoformat(ticket.updated_at)
 
-    text = prepare_text(f"{ticket.raw_subject}\n{ticket.description}")
-    embedding = generate_embeddings(text)
-
-    params = [
+    return [
         {"name": "id", "value": {"longValue": ticket.id}},
         {"name": "processed_data", "value": {"stringValue": text}},
         {"name": "via_channel", "value": {"stringValue": ticket.via.channel}},
@@ -146,8 +246,6 @@ def insert_ticket(ticket: zenpy.lib.api.Ticket) -> None:  # type: ignore[possibl
         {"name": "embedding", "value": {"stringValue": embedding}},
     ]
 
-    db_query(SQL, parameters=params)
-
 
 ## STATUS TRACKING FUNCTIONS ##
 
@@ -206,12 +304,160 @@ def get_tickets() -> Generator[zenpy.lib.api.Ticket]:  # type: ignore[possibly-m
     yield from zenpy_client.search_export(**params)
 
 
+## EMBEDDING CACHE ##
+
+
+class EmbeddingCache:
+    """
+    A cache of embeddings stored in SQLite, so they can be reused by later runs.
+
+    Embeddings are keyed by a hash of the model, dimensions and prepared text, and
+    stored as 32 bit floats. Once there are more than `max_size` embeddings, the
+    least recently used are removed. The cache can be used from several threads.
+    """
+
+    def __init__(self, path: str, max_size: int) -> None:
+        """
+        Open the cache, creating the file if needed.
+
+        Args:
+        ----
+            path: The path to the SQLite database.
+            max_size: The maximum number of embeddings to keep.
+
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embedding (key TEXT PRIMARY KEY, vector BLOB NOT NULL, used INTEGER NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS embedding_used ON embedding (used)"
+        )
+        self._db.commit()
+        # Increases with each read or write, to find the least recently used.
+        self._used = self._db.execute("SELECT MAX(used) FROM embedding").fetchone()[0]
+        self._used = self._used or 0
+        self._pending = 0
+
+    @staticmethod
+    def key(text: str) -> str:
+        """
+        Build the cache key for embedding a text.
+
+        Args:
+        ----
+            text: The prepared text.
+
+        Returns:
+        -------
+            The cache key.
+
+        """
+        digest = hashlib.sha256(EMBEDDING_MODEL_ID.encode())
+        for part in (str(EMBEDDING_DIMENSIONS), text):
+            digest.update(b"\0")
+            digest.update(part.encode(errors="surrogatepass"))
+        return digest.hexdigest()
+
+    def get(self, text: str) -> list[float] | None:
+        """
+        Get the embedding of a text from the cache.
+
+        Args:
+        ----
+            text: The prepared text.
+
+        Returns:
+        -------
+            The embedding, or None if it isn't cached.
+
+        """
+        key = self.key(text)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT vector FROM embedding WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._used += 1
+            self._db.execute(
+                "UPDATE embedding SET used = ? WHERE key = ?", (self._used, key)
+            )
+            self._written()
+        vector = array.array("f")
+        vector.frombytes(row[0])
+        return vector.tolist()
+
+    def put(self, text: str, embedding: list[float]) -> None:
+        """
+        Add the embedding of a text to the cache.
+
+        Args:
+        ----
+            text: The prepared text.
+            embedding: The embedding returned by the model.
+
+        """
+        vector = array.array("f", embedding).tobytes()
+        key = self.key(text)
+        with self._lock:
+            self._used += 1
+            self._db.execute(
+                "INSERT OR REPLACE INTO embedding (key, vector, used) VALUES (?, ?, ?)",
+                (key, vector, self._used),
+            )
+            self._written()
+
+    def flush(self) -> None:
+        """Commit the changes since the last commit, and remove any extra embeddings."""
+        with self._lock:
+            self._commit()
+
+    def close(self) -> None:
+        """Commit any pending changes and close the database."""
+        self.flush()
+        self._db.close()
+
+    def _written(self) -> None:
+        self._pending += 1
+        if self._pending >= EMBEDDING_CACHE_COMMIT_SIZE:
+            self._commit()
+
+    def _commit(self) -> None:
+        if not self._pending:
+            return
+        # Only checked when committing, so the cache can briefly go over its size.
+        extra = (
+            self._db.execute("SELECT COUNT(*) FROM embedding").fetchone()[0]
+            - self.max_size
+        )
+        if extra > 0:
+            self._db.execute(
+                "DELETE FROM embedding WHERE key IN (SELECT key FROM embedding ORDER BY used LIMIT ?)",
+                (extra,),
+            )
+        self._db.commit()
+        self._pending = 0
+
+
+EMBED_CACHE = (
+    EmbeddingCache(EMBEDDING_CACHE, EMBEDDING_CACHE_SIZE) if EMBEDDING_CACHE else None
+)
+
+
 ## TEXT PROCESSING AND EMBEDDING FUNCTIONS ##
 
 
 def prepare_text(text: str) -> str:
     """
-    Prepare the text for embedding generation.
+    Prepare the redacted text for embedding generation.
 
     Args:
     ----
@@ -225,8 +471,9 @@ def prepare_text(text: str) -> str:
     if not text:
         return ""
 
-    text = redact_pii(text)
-    return handler.prepare_text(text, TEXT_CLEANUP_RULES)
+    return handler.prepare_text(
+        text, TEXT_CLEANUP_RULES, handler.MAX_WORDS, cache=TEXT_CACHE
+    )
 
 
 def redact_pii(text: str) -> str:
@@ -246,27 +493,43 @@ def redact_pii(text: str) -> str:
         return ""
 
     response = COMPREHEND.detect_pii_entities(Text=text, LanguageCode="en")
+    return redact_entities(text, response.get("Entities", []))
 
-    pii_entities = response.get("Entities", [])
-    if not pii_entities:
-        return text
 
-    entities = sorted(pii_entities, key=lambda x: int(x["EndOffset"]), reverse=True)
-    for entity in entities:
-        text = "".join(
-            [
-                text[: int(entity["BeginOffset"])],
-                entity["Type"],
-                text[int(entity["EndOffset"]) :],
-            ]
-        )
+def redact_entities(text: str, entities: list[dict[str, Any]]) -> str:
+    """
+    Replace each PII entity in the text with its type, in a single pass.
 
-    return text
+    Args:
+    ----
+        text: The text to process.
+        entities: The PII entities Comprehend found in the text.
+
+    Returns:
+    -------
+        The text with PII redacted.
+
+    """
+    if not entities:
+        return text
+
+    parts = []
+    position = 0
+    for entity in sorted(entities, key=lambda x: int(x["BeginOffset"])):
+        begin, end = int(entity["BeginOffset"]), int(entity["EndOffset"])
+        if begin < position:
+            # Overlaps the entity before it, so extend that one instead.
+            position = max(position, end)
+            continue
+        parts.extend((text[position:begin], entity["Type"]))
+        position = end
+    parts.append(text[position:])
+    return "".join(parts)
 
 
 def generate_embeddings(text: str) -> str:
     """
-    Get the embedding for the given text from Bedrock.
+    Get the embedding for the given text from the cache, or Bedrock.
 
     Args:
     ----
@@ -276,43 +539,731 @@ def generate_embeddings(text: str) -> str:
     -------
         The embedding as a string formatted for insertion into the database.
 
+    """
+    if EMBED_CACHE is not None and (embedding := EMBED_CACHE.get(text)) is not None:
+        return format_embedding(embedding)
+    return format_embedding(fetch_embedding(text))
+
+
+def fetch_embedding(text: str) -> list[float]:
+    """
+    Get the embedding for the given text from Bedrock, and add it to the cache.
+
+    Args:
+    ----
+        text: The text to generate the embedding for.
+
+    Returns:
+    -------
+        The embedding.
+
     """
     response = BEDROCK.invoke_model(
-        modelId="amazon.titan-embed-text-v2:0",
+        modelId=EMBEDDING_MODEL_ID,
         contentType="application/json",
         accept="application/json",
         body=json.dumps(
             {
                 "inputText": text,
+                "dimensions": EMBEDDING_DIMENSIONS,
             }
         ),
     )
 
-    response_body = json.loads(response["body"].read())
-    embedding = response_body["embedding"]
+    embedding = json.loads(response["body"].read())["embedding"]
+    if EMBED_CACHE is not None:
+        EMBED_CACHE.put(text, embedding)
+    return embedding
+
+
+def format_embedding(embedding: list[float]) -> str:
+    """
+    Format an embedding for insertion into the database.
+
+    Args:
+    ----
+        embedding: The embedding returned by the model.
+
+    Returns:
+    -------
+        The embedding as a string formatted for insertion into the database.
+
+    """
     return "[" + ",".join(f"{value:.6f}" for value in embedding) + "]"
 
 
-## LET'S DO THIS! ##
+## BATCH JOB FUNCTIONS ##
 
 
-def main() -> None:
-    """Orchestrate backfilling the database."""
-    last_id = get_last_processed_ticket_id()
+def write_batch_file(key: str, lines: Iterable[str]) -> None:
+    """
+    Write the input for a batch job to S3.
+
+    Args:
+    ----
+        key: The S3 key of the input file.
+        lines: The lines of the file.
+
+    """
+    with tempfile.TemporaryFile() as batch:
+        for line in lines:
+            batch.write(line.encode() + b"\n")
+        batch.seek(0)
+        S3.upload_fileobj(batch, BATCH_BUCKET, key)
+
+
+def read_batch_records(prefix: str, suffix: str) -> Generator[dict[str, Any]]:
+    """
+    Stream the JSON lines output of a batch job from S3.
+
+    Args:
+    ----
+        prefix: The S3 prefix of the job's output files.
+        suffix: The end of the names of the output files with the records.
+
+    Yields:
+    ------
+        Each record in the output files.
+
+    """
+    response = S3.list_objects_v2(Bucket=BATCH_BUCKET, Prefix=prefix)
+    for item in response.get("Contents", []):
+        if not item["Key"].endswith(suffix):
+            continue
+        body = S3.get_object(Bucket=BATCH_BUCKET, Key=item["Key"])["Body"]
+        for line in body.iter_lines():
+            if line:
+                yield json.loads(line)
+
+
+def run_pii_job(name: str, input_key: str, output_prefix: str) -> str:
+    """
+    Submit a Comprehend PII entities detection job and wait for it to finish.
+
+    Args:
+    ----
+        name: The name of the job.
+        input_key: The S3 key of the input file, with a document on each line.
+        output_prefix: The S3 prefix the job writes its output under.
+
+    Returns:
+    -------
+        The S3 prefix of the job's output files.
+
+    Raises:
+    ------
+        RuntimeError: The job didn't complete.
+
+    """
+    job_id = COMPREHEND.start_pii_entities_detection_job(
+        InputDataConfig={
+            "S3Uri": f"s3://{BATCH_BUCKET}/{input_key}",
+            "InputFormat": "ONE_DOC_PER_LINE",
+        },
+        OutputDataConfig={"S3Uri": f"s3://{BATCH_BUCKET}/{output_prefix}"},
+        Mode="ONLY_OFFSETS",
+        DataAccessRoleArn=REDACT_BATCH_ROLE_ARN,
+        JobName=name,
+        LanguageCode="en",
+    )["JobId"]
+    LOGGER.info("Submitted PII entities detection job %s", job_id)
+
+    while True:
+        job = COMPREHEND.describe_pii_entities_detection_job(JobId=job_id)[
+            "PiiEntitiesDetectionJobProperties"
+        ]
+        if job["JobStatus"] not in REDACT_BATCH_RUNNING:
+            break
+        time.sleep(BATCH_POLL_SECONDS)
+
+    if job["JobStatus"] != "COMPLETED":
+        raise RuntimeError(  # noqa: TRY003 This is a simple script.
+            f"PII entities detection job {job_id} {job['JobStatus']}: {job.get('Message', '')}"
+        )
+    LOGGER.info("PII entities detection job %s %s", job_id, job["JobStatus"])
+    # Strip the s3:// and bucket name.
+    return job["OutputDataConfig"]["S3Uri"].split("/", 3)[3]
+
+
+def run_batch_job(name: str, input_key: str, output_prefix: str) -> str:
+    """
+    Submit a batch inference job and wait for it to finish.
+
+    Args:
+    ----
+        name: The name of the job.
+        input_key: The S3 key of the input file.
+        output_prefix: The S3 prefix the job writes its output to.
+
+    Returns:
+    -------
+        The ID of the job, which Bedrock adds to the output prefix.
+
+    Raises:
+    ------
+        RuntimeError: The job didn't complete.
+
+    """
+    job_arn = BEDROCK_JOBS.create_model_invocation_job(
+        jobName=name,
+        roleArn=EMBED_BATCH_ROLE_ARN,
+        modelId=EMBEDDING_MODEL_ID,
+        inputDataConfig={
+            "s3InputDataConfig": {"s3Uri": f"s3://{BATCH_BUCKET}/{input_key}"}
+        },
+        outputDataConfig={
+            "s3OutputDataConfig": {"s3Uri": f"s3://{BATCH_BUCKET}/{output_prefix}"}
+        },
+    )["jobArn"]
+    LOGGER.info("Submitted batch inference job %s", job_arn)
+
+    while True:
+        job = BEDROCK_JOBS.get_model_invocation_job(jobIdentifier=job_arn)
+        if job["status"] not in EMBED_BATCH_RUNNING:
+            break
+        time.sleep(BATCH_POLL_SECONDS)
+
+    if job["status"] not in EMBED_BATCH_FINISHED:
+        raise RuntimeError(  # noqa: TRY003 This is a simple script.
+            f"Batch inference job {job_arn} {job['status']}: {job.get('message', '')}"
+        )
+    LOGGER.info("Batch inference job %s %s", job_arn, job["status"])
+    return job_arn.rsplit("/", 1)[-1]
+
+
+def read_batch_output(prefix: str) -> Generator[tuple[str, list[float]]]:
+    """
+    Stream the embeddings written by a batch inference job.
+
+    Args:
+    ----
+        prefix: The S3 prefix of the job's output files.
+
+    Yields:
+    ------
+        The record ID and embedding of each record that succeeded.
+
+    """
+    for record in read_batch_records(prefix, ".jsonl.out"):
+        output = record.get("modelOutput") or {}
+        if "embedding" in output:
+            yield record["recordId"], output["embedding"]
+
+
+## PIPELINE ##
+
+
+@dataclasses.dataclass
+class Job:
+    """A ticket moving through the pipeline."""
+
+    seq: int
+    ticket: Any
+    text: str = ""
+    embedding: str = ""
+    failed: bool = False
+    error: Exception | None = None
+
+
+class Stage(NamedTuple):
+    """
+    A step each ticket goes through.
+
+    Batches are passed to the stage once they have `batch_size` tickets, or the
+    oldest ticket has waited `batch_seconds`. When `batch_seconds` is None, they
+    wait until they are full or there are no more tickets.
+    """
+
+    name: str
+    run: Callable[[list[Job]], None]
+    threads: int
+    batch_size: int = 1
+    batch_seconds: float | None = None
+
+
+class Pipeline:
+    """
+    Run each ticket through the stages, with the stages running concurrently.
+
+    The stages are connected by bounded queues, and each stage has its own pool of
+    threads. Each thread passes its stage a batch of tickets. Tickets
+    finish out of order, but the checkpoint only moves past a ticket once it and
+    every ticket before it have finished every stage. If a stage fails, no more
+    tickets are started and the error is raised once the tickets in flight have
+    drained.
+    """
+
+    def __init__(
+        self,
+        stages: Sequence[Stage],
+        queue_size: int,
+        checkpoint: Callable[[Any], None],
+    ) -> None:
+        """
+        Set up the pipeline.
+
+        Args:
+        ----
+            stages: The stages each ticket is run through, in order.
+            queue_size: The number of tickets that can wait for each stage.
+            checkpoint: Called with the last ticket when the checkpoint moves.
+
+        """
+        self.stages = stages
+        self.checkpoint = checkpoint
+        self.queues: list[queue.Queue[Job | None]] = [
+            queue.Queue(maxsize=queue_size) for _ in stages
+        ]
+        # The checkpoint thread keeps up easily, and must never block a stage.
+        self.done: queue.Queue[Job | None] = queue.Queue()
+        self.failed = threading.Event()
+        self.failed_seq = -1
+        self.error: Exception | None = None
+        self.committed = 0
+
+    def _fail(self, job: Job, error: Exception) -> None:
+        """
+        Record a ticket that failed, and stop starting new tickets.
+
+        Args:
+        ----
+            job: The ticket that failed.
+            error: The reason it failed.
+
+        """
+        job.failed = True
+        if self.error is None or job.seq < self.failed_seq:
+            self.error, self.failed_seq = error, job.seq
+        self.failed.set()
+
+    def _collect(
+        self, inbox: queue.Queue[Job | None], stage: Stage
+    ) -> tuple[list[Job], bool]:
+        """
+        Wait for a batch of tickets.
+
+        Args:
+        ----
+            inbox: The stage's queue.
+            stage: The stage the batch is for.
+
+        Returns:
+        -------
+            The batch, and whether the stage has been told to stop.
+
+        """
+        if (job := inbox.get()) is None:
+            return [], True
+        batch = [job]
+        deadline = None
+        if stage.batch_seconds is not None:
+            deadline = time.monotonic() + stage.batch_seconds
+        while len(batch) < stage.batch_size:
+            timeout = None
+            if deadline is not None:
+                timeout = max(deadline - time.monotonic(), 0)
+            try:
+                job = inbox.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if job is None:
+                # Finish the tickets already collected before stopping.
+                return batch, True
+            batch.append(job)
+        return batch, False
+
+    def _work(self, index: int) -> None:
+        """
+        Run the tickets in a stage's queue through the stage.
+
+        Args:
+        ----
+            index: The index of the stage.
+
+        """
+        stage = self.stages[index]
+        inbox = self.queues[index]
+        outbox = self.queues[index + 1] if index + 1 < len(self.stages) else self.done
+        stop = False
+        while not stop:
+            batch, stop = self._collect(inbox, stage)
+            for job in batch:
+                if self.failed.is_set() and job.seq > self.failed_seq:
+                    # Drain the tickets after the failure without doing any more
+                    # work. The tickets before it still finish, so the checkpoint
+                    # reaches it.
+                    job.failed = True
+            if todo := [job for job in batch if not job.failed]:
+                try:
+                    stage.run(todo)
+                except Exception as e:
+                    LOGGER.exception(
+                        "Unable to %s tickets %s",
+                        stage.name,
+                        [job.ticket.id for job in todo],
+                    )
+                    for job in todo:
+                        self._fail(job, e)
+                for job in todo:
+                    if job.error is not None:
+                        self._fail(job, job.error)
+            for job in batch:
+                outbox.put(job)
+
+    def _track(self) -> None:
+        """Move the checkpoint past the tickets that have finished, in order."""
+        finished: dict[int, Job] = {}
+        started = time.monotonic()
+        while (job := self.done.get()) is not None:
+            finished[job.seq] = job
+            last = None
+            while self.committed in finished and not finished[self.committed].failed:
+                last = finished.pop(self.committed)
+                self.committed += 1
+                if self.committed % PROGRESS_INTERVAL == 0:
+                    LOGGER.info(
+                        "Committed %d tickets, %.1f tickets/s",
+                        self.committed,
+                        self.committed / (time.monotonic() - started),
+                    )
+            if last is not None:
+                self.checkpoint(last.ticket)
+
+    def run(self, tickets: Iterable[Any]) -> int:
+        """
+        Run the tickets through the pipeline.
+
+        Args:
+        ----
+            tickets: The tickets to process, in checkpoint order.
+
+        Returns:
+        -------
+            The number of tickets processed.
+
+        Raises:
+        ------
+            Exception: The first error raised by a stage.
+
+        """
+        workers = [
+            [
+                threading.Thread(target=self._work, args=(index,), daemon=True)
+                for _ in range(stage.threads)
+            ]
+            for index, stage in enumerate(self.stages)
+        ]
+        tracker = threading.Thread(target=self._track, daemon=True)
+        for thread in [*(thread for stage in workers for thread in stage), tracker]:
+            thread.start()
+
+        try:
+            for seq, ticket in enumerate(tickets):
+                if self.failed.is_set():
+                    break
+                # Blocks while the first stage is busy.
+                self.queues[0].put(Job(seq, ticket))
+        except BaseException:
+            self.failed.set()
+            raise
+        finally:
+            # Each stage finishes its tickets before the next one is told to stop.
+            for inbox, stage in zip(self.queues, workers, strict=True):
+                for _ in stage:
+                    inbox.put(None)
+                for thread in stage:
+                    thread.join()
+            self.done.put(None)
+            tracker.join()
+
+        if self.error is not None:
+            raise self.error
+        return self.committed
+
+
+def redact_stage(jobs: list[Job]) -> None:
+    """
+    Redact the PII in the ticket subjects and descriptions.
+
+    Args:
+    ----
+        jobs: The tickets being processed.
+
+    """
+    for job in jobs:
+        job.text = redact_pii(f"{job.ticket.raw_subject}\n{job.ticket.description}")
+
+
+def batch_redact_stage(jobs: list[Job]) -> None:
+    """
+    Redact the PII in the ticket subjects and descriptions using a Comprehend job.
+
+    Tickets the job didn't return entities for are redacted one at a time.
+
+    Args:
+    ----
+        jobs: The tickets being processed.
+
+    """
+    if len(jobs) < REDACT_BATCH_MIN_RECORDS:
+        redact_stage(jobs)
+        return
+
+    documents = []
+    for job in jobs:
+        job.text = f"{job.ticket.raw_subject}\n{job.ticket.description}"
+        if job.text:
+            documents.append(job)
+
+    name = f"gata-backfill-pii-{int(time.time())}-{jobs[0].ticket.id}"
+    input_key = f"{BATCH_PREFIX}pii/{name}/input.txt"
+    write_batch_file(input_key, (LINE_BREAKS.sub(" ", job.text) for job in documents))
+    output_prefix = run_pii_job(name, input_key, f"{BATCH_PREFIX}pii/{name}/output/")
+
+    # Each document is identified by its line number in the input file.
+    pending = dict(enumerate(documents))
+    for record in read_batch_records(output_prefix, ".out"):
+        if "Entities" not in record:
+            continue
+        if (job := pending.pop(record.get("Line"), None)) is not None:
+            job.text = redact_entities(job.text, record["Entities"])
+
+    if pending:
+        LOGGER.warning(
+            "PII entities detection job %s didn't redact %d tickets, redacting them now",
+            name,
+            len(pending),
+        )
+        for job in pending.values():
+            job.text = redact_pii(job.text)
+
+
+def prepare_stage(jobs: list[Job]) -> None:
+    """
+    Prepare the redacted text.
+
+    Args:
+    ----
+        jobs: The tickets being processed.
+
+    """
+    for job in jobs:
+        job.text = prepare_text(job.text)
+
+
+def embed_stage(jobs: list[Job]) -> None:
+    """
+    Generate the embeddings of the prepared text.
+
+    Args:
+    ----
+        jobs: The tickets being processed.
+
+    """
+    for job in jobs:
+        job.embedding = generate_embeddings(job.text)
+
+
+def batch_embed_stage(jobs: list[Job]) -> None:
+    """
+    Generate the embeddings of the prepared text using a batch inference job.
+
+    Cached embeddings are used, and records the job didn't return an embedding for
+    are embedded one at a time.
+
+    Args:
+    ----
+        jobs: The tickets being processed.
+
+    """
+    pending = []
+    for job in jobs:
+        embedding = EMBED_CACHE.get(job.text) if EMBED_CACHE is not None else None
+        if embedding is None:
+            pending.append(job)
+        else:
+            job.embedding = format_embedding(embedding)
+
+    if len(pending) < EMBED_BATCH_MIN_RECORDS:
+        for job in pending:
+            job.embedding = format_embedding(fetch_embedding(job.text))
+        return
+
+    name = f"gata-backfill-{int(time.time())}-{pending[0].ticket.id}"
+    records = {f"{job.seq:011d}": job for job in pending}
+    input_key = f"{BATCH_PREFIX}embeddings/{name}/input.jsonl"
+    output_prefix = f"{BATCH_PREFIX}embeddings/{name}/output/"
+
+    write_batch_file(
+        input_key,
+        (
+            json.dumps(
+                {
+                    "recordId": key,
+                    "modelInput": {
+                        "inputText": job.text,
+                        "dimensions": EMBEDDING_DIMENSIONS,
+                    },
+                }
+            )
+            for key, job in records.items()
+        ),
+    )
+    job_id = run_batch_job(name, input_key, output_prefix)
+    for record_id, embedding in read_batch_output(f"{output_prefix}{job_id}/"):
+        if (job := records.pop(record_id, None)) is not None:
+            job.embedding = format_embedding(embedding)
+            if EMBED_CACHE is not None:
+                EMBED_CACHE.put(job.text, embedding)
+
+    if records:
+        LOGGER.warning(
+            "Batch inference job %s didn't embed %d tickets, embedding them now",
+            job_id,
+            len(records),
+        )
+        for job in records.values():
+            job.embedding = format_embedding(fetch_embedding(job.text))
+
+
+def insert_batch(rows: list[tuple[Job, list[dict[str, Any]]]]) -> None:
+    """
+    Insert a batch of tickets, splitting it to find the tickets that fail.
+
+    Statements outside a transaction are committed as they run, so part of a
+    failed batch may already be in the database. The insert is an upsert, so
+    writing those tickets again is safe.
+
+    Args:
+    ----
+        rows: The ticket being processed and its parameters for each ticket.
+
+    """
+    try:
+        db_batch_query(SQL, [params for _, params in rows])
+    except ClientError as e:
+        if len(rows) == 1:
+            job = rows[0][0]
+            LOGGER.exception("Unable to insert ticket %s", job.ticket.id)
+            job.error = e
+            return
+        middle = len(rows) // 2
+        insert_batch(rows[:middle])
+        insert_batch(rows[middle:])
+
+
+def insert_stage(jobs: list[Job]) -> None:
+    """
+    Insert the tickets into the database, as few requests as the size limit allows.
+
+    Tickets that can't be inserted have their error set, so the rest of the batch
+    is still committed.
+
+    Args:
+    ----
+        jobs: The tickets being processed.
+
+    """
+    batch: list[tuple[Job, list[dict[str, Any]]]] = []
+    batch_bytes = 0
+    for job in jobs:
+        params = ticket_params(job.ticket, job.text, job.embedding)
+        size = len(json.dumps(params))
+        if batch and batch_bytes + size > INSERT_BATCH_BYTES:
+            insert_batch(batch)
+            batch, batch_bytes = [], 0
+        batch.append((job, params))
+        batch_bytes += size
+    if batch:
+        insert_batch(batch)
+
+
+def backfill_stages() -> list[Stage]:
+    """
+    Get the pipeline stages used to backfill the database.
+
+    Returns
+    -------
+        The stages each ticket is run through, in order.
+
+    """
+    redact = Stage("redact", redact_stage, REDACT_WORKERS)
+    if REDACT_MODE == "batch":
+        redact = Stage(
+            "redact", batch_redact_stage, REDACT_BATCH_JOBS, REDACT_BATCH_SIZE
+        )
+    embed = Stage("embed", embed_stage, EMBED_WORKERS)
+    if EMBED_MODE == "batch":
+        embed = Stage("embed", batch_embed_stage, EMBED_BATCH_JOBS, EMBED_BATCH_SIZE)
+    return [
+        redact,
+        # Preparing is CPU bound, so more threads won't help. A single thread also
+        # means the prepared text cache is only used from one thread.
+        Stage("prepare", prepare_stage, 1),
+        embed,
+        Stage(
+            "insert",
+            insert_stage,
+            INSERT_WORKERS,
+            INSERT_BATCH_SIZE,
+            INSERT_BATCH_SECONDS,
+        ),
+    ]
 
-    db_connect()
 
+def unprocessed_tickets(last_id: int) -> Generator[zenpy.lib.api.Ticket]:  # type: ignore[possibly-missing-attribute]
+    """
+    Fetch the tickets that haven't been processed by an earlier run.
+
+    Args:
+    ----
+        last_id: The ID of the last ticket processed, or 0 if this is the first run.
+
+    Yields:
+    ------
+        The tickets to process.
+
+    """
     for ticket in get_tickets():
         if last_id > 0 and ticket.id >= last_id:
             LOGGER.info("Skipping already processed ticket ID: %s", ticket.id)
             continue
+        yield ticket
 
-        LOGGER.info("Processing ticket ID: %s", ticket.id)
 
-        insert_ticket(ticket)
+## LET'S DO THIS! ##
 
-        update_last_processed_ticket_id(ticket.id)
 
+def main() -> None:
+    """Orchestrate backfilling the database."""
+    last_id = get_last_processed_ticket_id()
+
+    db_connect()
+
+    pipeline = Pipeline(
+        backfill_stages(),
+        QUEUE_SIZE,
+        lambda ticket: update_last_processed_ticket_id(ticket.id),
+    )
+    try:
+        processed = pipeline.run(unprocessed_tickets(last_id))
+    finally:
+        if TEXT_CACHE is not None:
+            TEXT_CACHE.close()
+            LOGGER.info(
+                "Prepared text cache hits: %d, misses: %d",
+                TEXT_CACHE.hits,
+                TEXT_CACHE.misses,
+            )
+        if EMBED_CACHE is not None:
+            EMBED_CACHE.close()
+            LOGGER.info(
+                "Embedding cache hits: %d, misses: %d",
+                EMBED_CACHE.hits,
+                EMBED_CACHE.misses,
+            )
+
+    LOGGER.info("Processed %d tickets", processed)
     LOGGER.info("Backfill complete")
     LOGGER.debug("Removing last processed ticket ID file")
     os.unlink(LAST_TICKET_ID_FILE)
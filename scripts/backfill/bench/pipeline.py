@@ -0,0 +1,494 @@
+"""
+Benchmark the backfill pipeline.
+
+Runs a batch of tickets through the backfill stages one ticket at a time, the way
+the script used to, then through the pipeline. The AWS clients are replaced with
+local fakes that sleep for a typical response time, so no AWS account is needed.
+Run it from the script directory with `uv run python bench/pipeline.py`, after
+copying the handler. Add `--redact-mode batch` or `--embed-mode batch` to run the
+tickets through local stand-ins for S3, Comprehend PII entities detection jobs and
+Bedrock batch inference jobs instead.
+"""
+
+__author__ = "Dave Hall <me@davehall.com.au>"
+__copyright__ = "Copyright 2026, Skwashd Services Pty Ltd https://gata.works"
+__license__ = "MIT"
+
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+from unittest import mock
+
+from botocore.response import StreamingBody
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+TEXT = (
+    "Hi team,\nI can't log in to the portal since this morning. I've reset my "
+    "password twice and it still says my account is locked. My number is "
+    "0400 000 000 if you need to call.\n\nThanks,\nJane\n"
+)
+
+
+class FakeClient:
+    """An AWS client that answers the backfill calls after a delay."""
+
+    def __init__(self, latency: float, row_latency: float = 0) -> None:
+        """
+        Set up the client.
+
+        Args:
+        ----
+            latency: The number of seconds each call takes.
+            row_latency: The number of seconds each extra row in a batch adds.
+
+        """
+        self.latency = latency
+        self.row_latency = row_latency
+        self.inserted: list[int] = []
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def get_secret_value(self, **_: Any) -> dict[str, Any]:  # noqa: ANN401 Matches boto3
+        """Return the database secret."""
+        return {"SecretString": json.dumps({"dbname": "gata", "cluster_arn": "arn"})}
+
+    def get_parameter(self, **_: Any) -> dict[str, Any]:  # noqa: ANN401 Matches boto3
+        """Return the Zendesk credentials."""
+        return {"Parameter": {"Value": json.dumps({"username": "u", "token": "t"})}}
+
+    def detect_pii_entities(self, Text: str, **_: Any) -> dict[str, Any]:  # noqa: ANN401, N803 Matches boto3
+        """Find the phone number."""
+        time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+        return {"Entities": find_phone(Text)}
+
+    def invoke_model(self, **_: Any) -> dict[str, Any]:  # noqa: ANN401 Matches boto3
+        """Return an embedding."""
+        time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+        return {"body": io.BytesIO(json.dumps({"embedding": [0.1] * 1024}).encode())}
+
+    def batch_execute_statement(self, **kwargs: Any) -> dict[str, Any]:  # noqa: ANN401 Matches boto3
+        """Record the inserted tickets."""
+        parameter_sets = kwargs["parameterSets"]
+        time.sleep(self.latency + self.row_latency * (len(parameter_sets) - 1))
+        with self._lock:
+            self.inserted.extend(
+                param["value"]["longValue"]
+                for params in parameter_sets
+                for param in params
+                if param["name"] == "id"
+            )
+        return {"updateResults": [{} for _ in parameter_sets]}
+
+
+def find_phone(text: str) -> list[dict[str, Any]]:
+    """
+    Find the phone number in a ticket.
+
+    Args:
+    ----
+        text: The ticket text.
+
+    Returns:
+    -------
+        The PII entities in the text.
+
+    """
+    start = text.find("0400")
+    if start < 0:
+        return []
+    return [{"Type": "PHONE", "BeginOffset": start, "EndOffset": start + 12}]
+
+
+class FakeS3:
+    """An S3 client that keeps the objects in memory."""
+
+    def __init__(self) -> None:
+        """Set up the client."""
+        self.objects: dict[tuple[str, str], bytes] = {}
+
+    def upload_fileobj(self, fileobj: io.BufferedIOBase, bucket: str, key: str) -> None:
+        """Store an object."""
+        self.objects[bucket, key] = fileobj.read()
+
+    def get_object(self, Bucket: str, Key: str) -> dict[str, Any]:  # noqa: N803 Matches boto3
+        """Return an object."""
+        body = self.objects[Bucket, Key]
+        return {"Body": StreamingBody(io.BytesIO(body), len(body))}
+
+    def list_objects_v2(self, Bucket: str, Prefix: str) -> dict[str, Any]:  # noqa: N803 Matches boto3
+        """List the objects with a prefix."""
+        return {
+            "Contents": [
+                {"Key": key}
+                for bucket, key in sorted(self.objects)
+                if bucket == Bucket and key.startswith(Prefix)
+            ]
+        }
+
+
+class FakeComprehend(FakeClient):
+    """A Comprehend client that also runs PII entities detection jobs."""
+
+    def __init__(
+        self, latency: float, s3: FakeS3, duration: float, error_every: int
+    ) -> None:
+        """
+        Set up the client.
+
+        Args:
+        ----
+            latency: The number of seconds each call takes.
+            s3: The S3 client the jobs read from and write to.
+            duration: The number of seconds each job runs for.
+            error_every: Fail every nth document in a job, or 0 to not fail any.
+
+        """
+        super().__init__(latency)
+        self.s3 = s3
+        self.duration = duration
+        self.error_every = error_every
+        self.jobs: dict[str, dict[str, Any]] = {}
+
+    def start_pii_entities_detection_job(self, **kwargs: Any) -> dict[str, Any]:  # noqa: ANN401 Matches boto3
+        """Submit a job."""
+        job_id = f"{len(self.jobs):032x}"
+        self.jobs[job_id] = {**kwargs, "started": time.monotonic()}
+        return {"JobId": job_id, "JobStatus": "SUBMITTED"}
+
+    def describe_pii_entities_detection_job(self, JobId: str) -> dict[str, Any]:  # noqa: N803 Matches boto3
+        """Check on a job, writing its output once it has run for long enough."""
+        job = self.jobs[JobId]
+        if time.monotonic() - job["started"] < self.duration:
+            return {"PiiEntitiesDetectionJobProperties": {"JobStatus": "IN_PROGRESS"}}
+        if "output" not in job:
+            self._write_output(JobId, job)
+        return {
+            "PiiEntitiesDetectionJobProperties": {
+                "JobStatus": "COMPLETED",
+                "OutputDataConfig": {"S3Uri": job["output"]},
+            }
+        }
+
+    def _write_output(self, job_id: str, job: dict[str, Any]) -> None:
+        """Find the phone number in each line of the job's input file."""
+        bucket, key = job["InputDataConfig"]["S3Uri"][5:].split("/", 1)
+        output = f"{job['OutputDataConfig']['S3Uri']}123456789012-PII-{job_id}/output/"
+        name = key.rsplit("/", 1)[-1]
+        lines = []
+        for number, line in enumerate(
+            self.s3.objects[bucket, key].decode().split("\n")[:-1]
+        ):
+            record: dict[str, Any] = {"File": name, "Line": number}
+            if self.error_every and (number + 1) % self.error_every == 0:
+                record |= {"ErrorCode": "INTERNAL_SERVER_ERROR", "ErrorMessage": "Oops"}
+            else:
+                record["Entities"] = find_phone(line)
+            lines.append(json.dumps(record))
+        self.s3.objects[bucket, f"{output[len(bucket) + 6 :]}{name}.out"] = "\n".join(
+            lines
+        ).encode()
+        job["output"] = output
+
+
+class FakeBatchJobs:
+    """A Bedrock client that runs batch inference jobs against a fake S3."""
+
+    def __init__(self, s3: FakeS3, duration: float, error_every: int) -> None:
+        """
+        Set up the client.
+
+        Args:
+        ----
+            s3: The S3 client the jobs read from and write to.
+            duration: The number of seconds each job runs for.
+            error_every: Fail every nth record in a job, or 0 to not fail any.
+
+        """
+        self.s3 = s3
+        self.duration = duration
+        self.error_every = error_every
+        self.jobs: dict[str, dict[str, Any]] = {}
+
+    def create_model_invocation_job(self, **kwargs: Any) -> dict[str, Any]:  # noqa: ANN401 Matches boto3
+        """Submit a job."""
+        arn = f"arn:aws:bedrock:us-east-1:123456789012:model-invocation-job/{len(self.jobs):012d}"
+        self.jobs[arn] = {**kwargs, "started": time.monotonic()}
+        return {"jobArn": arn}
+
+    def get_model_invocation_job(self, jobIdentifier: str) -> dict[str, Any]:  # noqa: N803 Matches boto3
+        """Check on a job, writing its output once it has run for long enough."""
+        job = self.jobs[jobIdentifier]
+        if time.monotonic() - job["started"] < self.duration:
+            return {"status": "InProgress"}
+        if "status" not in job:
+            self._write_output(jobIdentifier, job)
+        return {"status": job["status"]}
+
+    def _write_output(self, arn: str, job: dict[str, Any]) -> None:
+        """Embed each record in the job's input file."""
+        bucket, key = job["inputDataConfig"]["s3InputDataConfig"]["s3Uri"][5:].split(
+            "/", 1
+        )
+        output = job["outputDataConfig"]["s3OutputDataConfig"]["s3Uri"][5:].split(
+            "/", 1
+        )[1]
+        lines = []
+        errors = 0
+        for number, line in enumerate(self.s3.objects[bucket, key].splitlines(), 1):
+            record = json.loads(line)
+            if self.error_every and number % self.error_every == 0:
+                record["error"] = {"errorCode": 400, "errorMessage": "Bad input"}
+                errors += 1
+            else:
+                record["modelOutput"] = {"embedding": [0.1] * 1024}
+            lines.append(json.dumps(record))
+        output += f"{arn.rsplit('/', 1)[-1]}/{key.rsplit('/', 1)[-1]}.out"
+        self.s3.objects[bucket, output] = "\n".join(lines).encode()
+        job["records"] = len(lines) - errors
+        job["status"] = "PartiallyCompleted" if errors else "Completed"
+
+
+def tickets(count: int) -> list[SimpleNamespace]:
+    """
+    Build a batch of tickets.
+
+    Args:
+    ----
+        count: The number of tickets.
+
+    Returns:
+    -------
+        The tickets, with the attributes the backfill uses.
+
+    """
+    return [
+        SimpleNamespace(
+            id=number,
+            raw_subject=f"Locked out of the portal ({number})",
+            description=TEXT,
+            created_at="2025-01-06T09:12:00+00:00",
+            updated_at="2025-01-07T09:12:00+00:00",
+            via=SimpleNamespace(channel="email"),
+            group_id=123,
+        )
+        for number in range(1, count + 1)
+    ]
+
+
+def measure_cache(
+    backfill: Any,  # noqa: ANN401 The script is imported once the clients are patched
+    clients: dict[str, Any],
+    batch: list[SimpleNamespace],
+) -> dict[str, Any]:
+    """
+    Run the pipeline with an empty embedding cache, then run it again.
+
+    Args:
+    ----
+        backfill: The backfill module.
+        clients: The fake AWS clients.
+        batch: The tickets.
+
+    Returns:
+    -------
+        The throughput and number of tickets sent to Bedrock for each run, and
+        the cache hits and misses.
+
+    """
+    report = {}
+    stages = backfill.backfill_stages()
+    with tempfile.TemporaryDirectory() as tmp:
+        backfill.EMBED_CACHE = backfill.EmbeddingCache(
+            str(Path(tmp) / "embeddings.db"), backfill.EMBEDDING_CACHE_SIZE
+        )
+        for run in ("cold", "warm"):
+            clients["bedrock-runtime"].calls = 0
+            jobs = list(clients["bedrock"].jobs.values())
+            started = time.perf_counter()
+            backfill.Pipeline(stages, backfill.QUEUE_SIZE, lambda _: None).run(batch)
+            report[f"{run}_cache_per_sec"] = len(batch) / (
+                time.perf_counter() - started
+            )
+            report[f"{run}_cache_embedded"] = clients["bedrock-runtime"].calls + sum(
+                job["records"]
+                for job in list(clients["bedrock"].jobs.values())[len(jobs) :]
+            )
+        report["cache_hits"] = backfill.EMBED_CACHE.hits
+        report["cache_misses"] = backfill.EMBED_CACHE.misses
+        backfill.EMBED_CACHE.close()
+        backfill.EMBED_CACHE = None
+    return report
+
+
+def main() -> None:
+    """Run the benchmark and print a report."""
+    parser = argparse.ArgumentParser(description="Benchmark the backfill pipeline.")
+    parser.add_argument("--tickets", type=int, default=200, help="tickets per run")
+    parser.add_argument(
+        "--redact-ms", type=float, default=40, help="Comprehend latency"
+    )
+    parser.add_argument("--embed-ms", type=float, default=60, help="Bedrock latency")
+    parser.add_argument("--insert-ms", type=float, default=20, help="RDS latency")
+    parser.add_argument(
+        "--row-ms", type=float, default=0.5, help="RDS latency per extra row"
+    )
+    parser.add_argument(
+        "--redact-mode", choices=["sync", "batch"], default="sync", help="REDACT_MODE"
+    )
+    parser.add_argument(
+        "--embed-mode", choices=["sync", "batch"], default="sync", help="EMBED_MODE"
+    )
+    parser.add_argument("--job-seconds", type=float, default=1, help="job duration")
+    parser.add_argument(
+        "--job-error-every",
+        type=int,
+        default=0,
+        help="fail every nth record in each job",
+    )
+    parser.add_argument("--json", action="store_true", help="print JSON output")
+    args = parser.parse_args()
+
+    s3 = FakeS3()
+    clients = {
+        "bedrock": FakeBatchJobs(s3, args.job_seconds, args.job_error_every),
+        "bedrock-runtime": FakeClient(args.embed_ms / 1000),
+        "comprehend": FakeComprehend(
+            args.redact_ms / 1000, s3, args.job_seconds, args.job_error_every
+        ),
+        "rds-data": FakeClient(args.insert_ms / 1000, args.row_ms / 1000),
+        "s3": s3,
+    }
+    os.environ.update(
+        {
+            "DB_SECRET_ARN": "arn",
+            "ZENDESK_PARAM": "zendesk",
+            "ZENDESK_SUBDOMAIN": "x",
+            "REDACT_MODE": args.redact_mode,
+            "EMBED_MODE": args.embed_mode,
+            "BATCH_BUCKET": "data",
+            "REDACT_BATCH_ROLE_ARN": "arn:aws:iam::123456789012:role/comprehend",
+            "EMBED_BATCH_ROLE_ARN": "arn:aws:iam::123456789012:role/bedrock",
+            "BATCH_POLL_SECONDS": "0.05",
+        }
+    )
+    os.environ.setdefault("REDACT_BATCH_SIZE", str(args.tickets // 2))
+    os.environ.setdefault("EMBED_BATCH_SIZE", str(args.tickets // 2))
+    with mock.patch("boto3.client", lambda name: clients.get(name, FakeClient(0))):
+        import backfill
+
+    backfill.LOGGER.setLevel("WARNING")
+    batch = tickets(args.tickets)
+    stages = backfill.backfill_stages()
+
+    started = time.perf_counter()
+    for seq, ticket in enumerate(batch):
+        job = backfill.Job(seq, ticket)
+        for stage in stages:
+            stage.run([job])
+    serial = time.perf_counter() - started
+
+    checkpoints: list[int] = []
+    clients["rds-data"].inserted.clear()
+    clients["bedrock-runtime"].calls = 0
+    clients["comprehend"].calls = 0
+    started = time.perf_counter()
+    backfill.Pipeline(
+        stages, backfill.QUEUE_SIZE, lambda ticket: checkpoints.append(ticket.id)
+    ).run(batch)
+    pipelined = time.perf_counter() - started
+    redacted = clients["comprehend"].calls
+    embedded = clients["bedrock-runtime"].calls
+
+    if sorted(clients["rds-data"].inserted) != [ticket.id for ticket in batch]:
+        raise RuntimeError("The pipeline didn't insert every ticket once")  # noqa: TRY003 This is a simple script.
+    if checkpoints != sorted(checkpoints) or checkpoints[-1] != batch[-1].id:
+        raise RuntimeError("The checkpoint didn't advance in order")  # noqa: TRY003 This is a simple script.
+
+    # Insert tickets that are ready to go, one per request and then in batches.
+    embedding = backfill.generate_embeddings("")
+
+    def ready(jobs: list[Any]) -> None:
+        for job in jobs:
+            job.text, job.embedding = TEXT, embedding
+
+    inserts = {}
+    for batch_size in (1, backfill.INSERT_BATCH_SIZE):
+        started = time.perf_counter()
+        backfill.Pipeline(
+            [
+                backfill.Stage("ready", ready, 1),
+                backfill.Stage(
+                    "insert", backfill.insert_stage, backfill.INSERT_WORKERS, batch_size
+                ),
+            ],
+            backfill.QUEUE_SIZE,
+            lambda _: None,
+        ).run(batch)
+        inserts[batch_size] = args.tickets / (time.perf_counter() - started)
+
+    report = {
+        "tickets": args.tickets,
+        "workers": {stage.name: stage.threads for stage in stages},
+        "serial_per_sec": args.tickets / serial,
+        "pipeline_per_sec": args.tickets / pipelined,
+        "speedup": serial / pipelined,
+        "checkpoints": len(checkpoints),
+        "redact_mode": backfill.REDACT_MODE,
+        "redact_jobs": len(clients["comprehend"].jobs),
+        "redacted_one_at_a_time": redacted,
+        "embed_mode": backfill.EMBED_MODE,
+        "embed_jobs": len(clients["bedrock"].jobs),
+        "embedded_one_at_a_time": embedded,
+        "insert_batch_size": backfill.INSERT_BATCH_SIZE,
+        "single_inserts_per_sec": inserts[1],
+        "batched_inserts_per_sec": inserts[backfill.INSERT_BATCH_SIZE],
+    }
+
+    report |= measure_cache(backfill, clients, batch)
+
+    if args.json:
+        print(json.dumps(report))
+        return
+
+    print(f"{report['tickets']} tickets, workers {report['workers']}")
+    print(f"    serial: {report['serial_per_sec']:8.1f} tickets/s")
+    print(f"  pipeline: {report['pipeline_per_sec']:8.1f} tickets/s")
+    print(f"   speedup: {report['speedup']:8.1f}x")
+    print(
+        f"   redacts: {report['redact_mode']} mode, {report['redact_jobs']} jobs, "
+        f"{report['redacted_one_at_a_time']} tickets redacted one at a time"
+    )
+    print(
+        f"    embeds: {report['embed_mode']} mode, {report['embed_jobs']} jobs, "
+        f"{report['embedded_one_at_a_time']} tickets embedded one at a time"
+    )
+    print(
+        f"   inserts: {report['single_inserts_per_sec']:8.1f} tickets/s one at a time"
+    )
+    print(
+        f"   inserts: {report['batched_inserts_per_sec']:8.1f} tickets/s "
+        f"in batches of {report['insert_batch_size']}"
+    )
+    for run in ("cold", "warm"):
+        print(
+            f"{run:>5} run: {report[f'{run}_cache_per_sec']:8.1f} tickets/s, "
+            f"{report[f'{run}_cache_embedded']} tickets sent to Bedrock"
+        )
+    print(f"    cache: {report['cache_hits']} hits, {report['cache_misses']} misses")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Bulk text preparation script package."""
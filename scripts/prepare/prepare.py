@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""Script to prepare the text of historical tickets in bulk."""
+
+__author__ = "Dave Hall <me@davehall.com.au>"
+__copyright__ = "Copyright 2026, Skwashd Services Pty Ltd https://gata.works"
+__license__ = "MIT"
+
+import argparse
+import collections
+import json
+import logging
+import os
+import time
+from collections.abc import Generator, Iterable
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any
+
+import handler
+
+logging.basicConfig(level=logging.INFO)
+LOGGER = logging.getLogger(__name__)
+
+# Tickets per task sent to a worker. Large enough that pickling the task costs
+# much less than preparing it, small enough to keep every worker busy.
+DEFAULT_CHUNK_SIZE = 500
+
+# Chunks waiting in each worker's queue. Bounds memory use, as we never read
+# more than this far ahead of the output.
+CHUNKS_PER_WORKER = 4
+
+PROGRESS_INTERVAL = 10  # seconds
+
+# The rules are compiled once in each worker, when it starts.
+WORKER_STATE: dict[str, Any] = {}
+
+
+## INPUT AND OUTPUT ##
+
+
+def read_jsonl(
+    path: Path, id_field: str, text_field: str, chunk_size: int
+) -> Generator[tuple[list[Any], list[Any]]]:
+    """
+    Read tickets from a JSON lines file a chunk at a time.
+
+    Args:
+    ----
+        path: The path to the file.
+        id_field: The name of the ticket ID field.
+        text_field: The name of the ticket text field.
+        chunk_size: The number of tickets in each chunk.
+
+    Yields:
+    ------
+        The IDs and texts of the tickets in each chunk.
+
+    """
+    ids: list[Any] = []
+    texts: list[Any] = []
+    with path.open(encoding="utf-8") as tickets:
+        for line in tickets:
+            if not line.strip():
+                continue
+            ticket = json.loads(line)
+            ids.append(ticket.get(id_field))
+            texts.append(ticket.get(text_field))
+            if len(texts) == chunk_size:
+                yield ids, texts
+                ids, texts = [], []
+    if texts:
+        yield ids, texts
+
+
+def read_parquet(
+    path: Path, id_field: str, text_field: str, chunk_size: int
+) -> Generator[tuple[list[Any], list[Any]]]:
+    """
+    Read tickets from a Parquet file a chunk at a time.
+
+    Only the ID and text columns are read.
+
+    Args:
+    ----
+        path: The path to the file.
+        id_field: The name of the ticket ID column.
+        text_field: The name of the ticket text column.
+        chunk_size: The number of tickets in each chunk.
+
+    Yields:
+    ------
+        The IDs and texts of the tickets in each chunk.
+
+    """
+    import pyarrow.parquet as pq
+
+    for batch in pq.ParquetFile(path).iter_batches(
+        batch_size=chunk_size, columns=[id_field, text_field]
+    ):
+        yield (
+            batch.column(id_field).to_pylist(),
+            batch.column(text_field).to_pylist(),
+        )
+
+
+class JsonlWriter:
+    """Write prepared tickets to a JSON lines file."""
+
+    def __init__(self, path: Path, id_field: str, text_field: str) -> None:
+        """
+        Open the file.
+
+        Args:
+        ----
+            path: The path to the file.
+            id_field: The name of the ticket ID field.
+            text_field: The name of the prepared text field.
+
+        """
+        self.id_field = id_field
+        self.text_field = text_field
+        self._file = path.open("w", encoding="utf-8")
+
+    def write(self, ids: list[Any], texts: list[str]) -> None:
+        """
+        Write a chunk of prepared tickets.
+
+        Args:
+        ----
+            ids: The ticket IDs.
+            texts: The prepared texts.
+
+        """
+        self._file.writelines(
+            json.dumps({self.id_field: ticket_id, self.text_field: text}) + "\n"
+            for ticket_id, text in zip(ids, texts, strict=True)
+        )
+
+    def close(self) -> None:
+        """Close the file."""
+        self._file.close()
+
+
+class ParquetWriter:
+    """Write prepared tickets to a Parquet file."""
+
+    def __init__(self, path: Path, id_field: str, text_field: str) -> None:
+        """
+        Set up the writer. The file is created with the first chunk.
+
+        Args:
+        ----
+            path: The path to the file.
+            id_field: The name of the ticket ID column.
+            text_field: The name of the prepared text column.
+
+        """
+        self.path = path
+        self.id_field = id_field
+        self.text_field = text_field
+        self._writer = None
+
+    def write(self, ids: list[Any], texts: list[str]) -> None:
+        """
+        Write a chunk of prepared tickets as a row group.
+
+        Args:
+        ----
+            ids: The ticket IDs.
+            texts: The prepared texts.
+
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.table({self.id_field: ids, self.text_field: texts})
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema)
+        self._writer.write_table(table)
+
+    def close(self) -> None:
+        """Close the file."""
+        if self._writer is not None:
+            self._writer.close()
+
+
+def is_parquet(path: Path) -> bool:
+    """
+    Check if a file is in Parquet format, based on its extension.
+
+    Args:
+    ----
+        path: The path to the file.
+
+    Returns:
+    -------
+        True if the file is a Parquet file, otherwise False for JSON lines.
+
+    """
+    return path.suffix.lower() in (".parquet", ".pq")
+
+
+## TEXT PROCESSING ##
+
+
+def init_worker(
+    rules: handler.TextCleanupRules, max_words: int, cache_path: Path | None
+) -> None:
+    """
+    Set up a worker process.
+
+    Args:
+    ----
+        rules: The compiled text cleanup rules.
+        max_words: The maximum number of words in each prepared text.
+        cache_path: The path to the prepared text cache shared by the workers.
+
+    """
+    WORKER_STATE["rules"] = rules
+    WORKER_STATE["max_words"] = max_words
+    WORKER_STATE["cache"] = (
+        handler.DiskPreparedTextCache(cache_path) if cache_path else None
+    )
+    # Build the expander now, rather than while the first chunk waits.
+    handler.contraction_expander()
+
+
+def prepare_chunk(texts: list[Any]) -> tuple[list[str], int, int]:
+    """
+    Prepare a chunk of ticket texts in a worker process.
+
+    Args:
+    ----
+        texts: The ticket texts. Anything that isn't a string is prepared as an
+            empty string.
+
+    Returns:
+    -------
+        The prepared texts, and the number of cache hits and misses.
+
+    """
+    rules = WORKER_STATE["rules"]
+    max_words = WORKER_STATE["max_words"]
+    cache = WORKER_STATE["cache"]
+    hits, misses = (cache.hits, cache.misses) if cache else (0, 0)
+    prepared = [
+        handler.prepare_text(text, rules, max_words, cache=cache)
+        if isinstance(text, str)
+        else ""
+        for text in texts
+    ]
+    if cache is None:
+        return prepared, 0, 0
+    # Commit now, as there is no way to clean up when the pool shuts down.
+    cache.flush()
+    return prepared, cache.hits - hits, cache.misses - misses
+
+
+def prepare_in_order(
+    executor: ProcessPoolExecutor,
+    chunks: Iterable[tuple[list[Any], list[Any]]],
+    window: int,
+) -> Generator[tuple[list[Any], list[Any], tuple[list[str], int, int]]]:
+    """
+    Prepare the chunks in parallel, yielding the results in input order.
+
+    Only `window` chunks are in flight at once, so the input is read no faster
+    than it is prepared.
+
+    Args:
+    ----
+        executor: The process pool.
+        chunks: The IDs and texts of each chunk.
+        window: The maximum number of chunks being prepared at once.
+
+    Yields:
+    ------
+        The IDs, original texts and result of each chunk.
+
+    """
+    pending: collections.deque[
+        tuple[list[Any], list[Any], Future[tuple[list[str], int, int]]]
+    ] = collections.deque()
+    for ids, texts in chunks:
+        pending.append((ids, texts, executor.submit(prepare_chunk, texts)))
+        if len(pending) >= window:
+            done_ids, done_texts, future = pending.popleft()
+            yield done_ids, done_texts, future.result()
+    while pending:
+        done_ids, done_texts, future = pending.popleft()
+        yield done_ids, done_texts, future.result()
+
+
+## LET'S DO THIS! ##
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    Parse the command line arguments.
+
+    Returns
+    -------
+        The arguments.
+
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("input", type=Path, help="JSON lines or Parquet export")
+    parser.add_argument("output", type=Path, help="JSON lines or Parquet output")
+    parser.add_argument("--id-field", default="id", help="ticket ID field")
+    parser.add_argument("--text-field", default="text", help="ticket text field")
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1, help="worker processes"
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="tickets per task"
+    )
+    parser.add_argument(
+        "--max-words",
+        type=int,
+        default=handler.MAX_WORDS,
+        help="stop preparing each text once it has this many words, 0 for no limit",
+    )
+    parser.add_argument(
+        "--cache", type=Path, help="SQLite file used to cache the prepared text"
+    )
+    parser.add_argument("--json", action="store_true", help="print a JSON report")
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Prepare the tickets and report the throughput."""
+    args = parse_args()
+
+    rules = handler.current_text_cleanup_rules()
+    LOGGER.info("Using text cleanup rules version %s", rules.version)
+
+    read = read_parquet if is_parquet(args.input) else read_jsonl
+    writer = (ParquetWriter if is_parquet(args.output) else JsonlWriter)(
+        args.output, args.id_field, args.text_field
+    )
+
+    tickets = chars_in = chars_out = cache_hits = cache_misses = 0
+    started = last_progress = time.monotonic()
+    with ProcessPoolExecutor(
+        max_workers=args.workers,
+        initializer=init_worker,
+        initargs=(rules, args.max_words, args.cache),
+    ) as executor:
+        try:
+            for ids, texts, (prepared, hits, misses) in prepare_in_order(
+                executor,
+                read(args.input, args.id_field, args.text_field, args.chunk_size),
+                args.workers * CHUNKS_PER_WORKER,
+            ):
+                writer.write(ids, prepared)
+                tickets += len(prepared)
+                chars_in += sum(len(text) for text in texts if isinstance(text, str))
+                chars_out += sum(len(text) for text in prepared)
+                cache_hits += hits
+                cache_misses += misses
+
+                if time.monotonic() - last_progress >= PROGRESS_INTERVAL:
+                    last_progress = time.monotonic()
+                    LOGGER.info(
+                        "Prepared %d tickets, %.0f tickets/s",
+                        tickets,
+                        tickets / (last_progress - started),
+                    )
+        finally:
+            writer.close()
+
+    elapsed = time.monotonic() - started
+    report = {
+        "tickets": tickets,
+        "workers": args.workers,
+        "seconds": elapsed,
+        "tickets_per_sec": tickets / elapsed if elapsed else 0.0,
+        "input_mb_per_sec": chars_in / elapsed / 1_000_000 if elapsed else 0.0,
+        "input_chars": chars_in,
+        "output_chars": chars_out,
+        "cache_hits": cache_hits,
+        "cache_misses": cache_misses,
+        "rules_version": rules.version,
+    }
+
+    if args.json:
+        print(json.dumps(report))
+        return
+
+    LOGGER.info(
+        "Prepared %d tickets in %.1fs using %d workers: %.0f tickets/s, %.1f MB/s. "
+        "%d characters in, %d out. %d cache hits, %d misses",
+        report["tickets"],
+        report["seconds"],
+        report["workers"],
+        report["tickets_per_sec"],
+        report["input_mb_per_sec"],
+        report["input_chars"],
+        report["output_chars"],
+        report["cache_hits"],
+        report["cache_misses"],
+    )
+
+
+if __name__ == "__main__":
+    main()
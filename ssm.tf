@@ -39,6 +39,19 @@ resource "aws_ssm_parameter" "images" {
   }
 }
 
+resource "aws_ssm_parameter" "text_cleanup_rules" {
+  name = "${local.ssm_base_path}text-cleanup-rules"
+  type = "String"
+
+  value = jsonencode({}) # The built in rules are used for anything the user doesn't set.
+
+  lifecycle {
+    ignore_changes = [
+      value
+    ]
+  }
+}
+
 resource "aws_ssm_parameter" "webhook_creds" {
   name   = "/${var.application_name}/${var.tags["environment"]}/webhook-creds"
   type   = "SecureString"
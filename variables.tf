@@ -106,6 +106,17 @@ variable "lambda_powertools_version" {
   default     = 0
 }
 
+variable "log_event_sample_rate" {
+  description = "Fraction of Lambda invocations that log the full event. Events are always logged when processing fails."
+  type        = number
+  default     = 0.01
+
+  validation {
+    condition     = var.log_event_sample_rate >= 0 && var.log_event_sample_rate <= 1
+    error_message = "The log event sample rate must be between 0 and 1."
+  }
+}
+
 variable "log_retention_days" {
   description = "Number of days to retain logs in CloudWatch Logs"
   type        = number
@@ -134,6 +145,17 @@ variable "override_image_tags" {
   })
 }
 
+variable "prepare_text_max_words" {
+  description = "Stop preparing ticket text once it has this many words. 384 words is roughly the 512 token limit of the routing model. 0 prepares all of the text."
+  type        = number
+  default     = 0
+
+  validation {
+    condition     = var.prepare_text_max_words >= 0 && floor(var.prepare_text_max_words) == var.prepare_text_max_words
+    error_message = "The maximum number of words must be a whole number that is 0 or more."
+  }
+}
+
 variable "role_namespace" {
   description = "Namespace/prefix for IAM roles. Prepended to the application name."
   type        = string
@@ -194,6 +216,20 @@ variable "vpc_endpoints" {
   }
 }
 
+variable "webhook_config" {
+  description = "Tuning options for the Zendesk webhook handler."
+  default     = {}
+
+  type = object({
+    allowed_channels    = optional(list(string), [])
+    allowed_event_types = optional(list(string), [])
+    batch_ingestion     = optional(bool, false)
+    denied_channels     = optional(list(string), [])
+    denied_event_types  = optional(list(string), [])
+    idempotency_ttl     = optional(number, 3600)
+  })
+}
+
 locals {
 
   admin_role_arn = one(data.aws_iam_roles.admin.arns)